@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+analytics.py
+────────────────────────────────────────────────────────────
+Per-assignment rollups behind the teacher UI dashboard (/dashboard).
+
+    analytics_daily     assignment_id, day → pushes, perfect pushes, points,
+                        students passing for the first time, unreviewed feedback
+    analytics_students  assignment_id, repo → pushes, first / last push,
+                        best points, first perfect push (passed_at, pushes_to_pass)
+
+Triggers on autograder_outputs (one row per graded push, see control_code)
+and feedback (insert / review / delete) keep both tables current in the
+writer's own transaction, so the dashboard reads a few dozen rows per
+assignment no matter how long the history is.  Archiving or deleting a
+push does not change its counts; deleting unreviewed feedback does.
+
+A push is "perfect" when its autograder points reach max_points > 0
+(autograder.py fills both columns).
+
+CLI:  python3 analytics.py --rebuild | --check
+"""
+
+import os, sys, heapq, sqlite3, argparse
+from datetime import datetime, timedelta
+
+import db, archive
+
+# ─────────────────────────── config ─────────────────────────────
+DAYS      = int(os.getenv("AGLLM_DASHBOARD_DAYS", "28"))     # timeline window
+TOP_N     = 10
+MAX_PUSH_BUCKET = 10                                         # "10+" pushes
+
+PERFECT = "({p}.max_points > 0 AND {p}.points >= {p}.max_points)"
+
+DDL = f"""
+CREATE TABLE IF NOT EXISTS analytics_daily (
+  assignment_id INTEGER NOT NULL,
+  day           TEXT    NOT NULL,            -- YYYY-MM-DD (UTC)
+  pushes        INTEGER NOT NULL DEFAULT 0,
+  perfect       INTEGER NOT NULL DEFAULT 0,
+  points        REAL    NOT NULL DEFAULT 0,
+  max_points    REAL    NOT NULL DEFAULT 0,
+  new_passes    INTEGER NOT NULL DEFAULT 0,  -- students whose first perfect push it was
+  unreviewed    INTEGER NOT NULL DEFAULT 0,  -- by feedback generation day
+  PRIMARY KEY (assignment_id, day)
+);
+CREATE TABLE IF NOT EXISTS analytics_students (
+  assignment_id  INTEGER NOT NULL,
+  repo_name      TEXT    NOT NULL,
+  pushes         INTEGER NOT NULL DEFAULT 0,
+  first_at       TEXT,
+  last_at        TEXT,
+  best_points    REAL,
+  max_points     REAL,
+  passed_at      TEXT,                       -- first perfect push
+  pushes_to_pass INTEGER,
+  PRIMARY KEY (assignment_id, repo_name)
+);
+-- slowest to pass: not yet passed first, then most pushes (see dashboard())
+CREATE INDEX IF NOT EXISTS idx_analytics_students_slow
+    ON analytics_students(assignment_id, passed_at IS NOT NULL,
+                          COALESCE(pushes_to_pass, pushes) DESC);
+
+CREATE TRIGGER IF NOT EXISTS analytics_push AFTER INSERT ON autograder_outputs BEGIN
+  INSERT INTO analytics_students(assignment_id, repo_name, pushes, first_at, last_at,
+                                 best_points, max_points, passed_at, pushes_to_pass)
+  SELECT s.assignment_id, s.student_repo, 1, s.submitted_at, s.submitted_at,
+         new.points, new.max_points,
+         CASE WHEN {PERFECT.format(p="new")} THEN s.submitted_at END,
+         CASE WHEN {PERFECT.format(p="new")} THEN 1 END
+    FROM submissions s WHERE s.id = new.submission_id
+  ON CONFLICT(assignment_id, repo_name) DO UPDATE SET
+         pushes         = pushes + 1,
+         first_at       = MIN(first_at, excluded.first_at),
+         last_at        = MAX(last_at, excluded.last_at),
+         best_points    = COALESCE(MAX(best_points, excluded.best_points),
+                                   best_points, excluded.best_points),
+         max_points     = COALESCE(excluded.max_points, max_points),
+         passed_at      = COALESCE(passed_at, excluded.passed_at),
+         pushes_to_pass = COALESCE(pushes_to_pass,
+                                   CASE WHEN excluded.passed_at IS NOT NULL
+                                        THEN pushes + 1 END);
+  INSERT INTO analytics_daily(assignment_id, day, pushes, perfect, points, max_points,
+                              new_passes)
+  SELECT s.assignment_id, substr(s.submitted_at, 1, 10), 1,
+         COALESCE({PERFECT.format(p="new")}, 0),
+         COALESCE(new.points, 0), COALESCE(new.max_points, 0),
+         COALESCE(st.pushes_to_pass = st.pushes, 0)
+    FROM submissions s
+    JOIN analytics_students st ON st.assignment_id = s.assignment_id
+                              AND st.repo_name = s.student_repo
+   WHERE s.id = new.submission_id
+  ON CONFLICT(assignment_id, day) DO UPDATE SET
+         pushes     = pushes + 1,
+         perfect    = perfect + excluded.perfect,
+         points     = points + excluded.points,
+         max_points = max_points + excluded.max_points,
+         new_passes = new_passes + excluded.new_passes;
+END;
+
+CREATE TRIGGER IF NOT EXISTS analytics_fb_ai AFTER INSERT ON feedback
+WHEN new.reviewed = 0 BEGIN
+  INSERT INTO analytics_daily(assignment_id, day, unreviewed)
+  SELECT assignment_id, substr(new.generated_at, 1, 10), 1
+    FROM submissions WHERE id = new.submission_id
+  ON CONFLICT(assignment_id, day) DO UPDATE SET unreviewed = unreviewed + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS analytics_fb_au AFTER UPDATE OF reviewed ON feedback
+WHEN (old.reviewed = 0) <> (new.reviewed = 0) BEGIN
+  INSERT INTO analytics_daily(assignment_id, day, unreviewed)
+  SELECT assignment_id, substr(new.generated_at, 1, 10),
+         CASE WHEN new.reviewed = 0 THEN 1 ELSE -1 END
+    FROM submissions WHERE id = new.submission_id
+  ON CONFLICT(assignment_id, day) DO UPDATE SET
+         unreviewed = unreviewed + excluded.unreviewed;
+END;
+CREATE TRIGGER IF NOT EXISTS analytics_fb_ad AFTER DELETE ON feedback
+WHEN old.reviewed = 0 BEGIN
+  UPDATE analytics_daily SET unreviewed = unreviewed - 1
+   WHERE assignment_id = (SELECT assignment_id FROM submissions WHERE id = old.submission_id)
+     AND day = substr(old.generated_at, 1, 10);
+END;
+"""
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    """Create tables + triggers; back-fill them the first time."""
+    new = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'analytics_daily'"
+                       ).fetchone() is None
+    conn.executescript(DDL)
+    if new:
+        rebuild(conn)
+    conn.commit()
+
+# ─────────────────────────── full rebuild ───────────────────────
+def _perfect(points, max_points) -> bool:
+    return bool(max_points) and max_points > 0 and points is not None and points >= max_points
+
+def compute(conn: sqlite3.Connection):
+    """From scratch, replaying pushes in insert order: (daily, students) dicts.
+
+    Archived pushes (archive.py) are merged in by autograder row id; a push
+    that is in both tiers (interrupted archive run) counts once."""
+    daily, students = {}, {}
+
+    def day_row(key):
+        return daily.setdefault(key, dict(pushes=0, perfect=0, points=0.0, max_points=0.0,
+                                          new_passes=0, unreviewed=0))
+
+    hot = conn.execute(
+        """SELECT a.id, s.assignment_id, s.student_repo, s.submitted_at, a.points, a.max_points
+             FROM autograder_outputs a JOIN submissions s ON s.id = a.submission_id
+         ORDER BY a.id""")
+    last = None
+    for ag_id, aid, repo, at, pts, max_pts in heapq.merge(hot, archive.pushes(),
+                                                          key=lambda r: r[0]):
+        if ag_id == last:                   # archived copy of a hot row
+            continue
+        last = ag_id
+        perfect = _perfect(pts, max_pts)
+        st = students.setdefault((aid, repo), dict(
+            pushes=0, first_at=at, last_at=at, best_points=None, max_points=None,
+            passed_at=None, pushes_to_pass=None))
+        st["pushes"] += 1
+        st["first_at"], st["last_at"] = min(st["first_at"], at), max(st["last_at"], at)
+        if pts is not None:
+            st["best_points"] = pts if st["best_points"] is None else max(st["best_points"], pts)
+        if max_pts is not None:
+            st["max_points"] = max_pts
+        d = day_row((aid, at[:10]))
+        d["pushes"] += 1
+        d["perfect"] += perfect
+        d["points"] += pts or 0
+        d["max_points"] += max_pts or 0
+        if perfect and st["passed_at"] is None:
+            st["passed_at"], st["pushes_to_pass"] = at, st["pushes"]
+            d["new_passes"] += 1
+
+    for aid, day, n in conn.execute(
+            """SELECT s.assignment_id, substr(f.generated_at, 1, 10), COUNT(*)
+                 FROM feedback f JOIN submissions s ON s.id = f.submission_id
+                WHERE f.reviewed = 0 GROUP BY 1, 2"""):
+        day_row((aid, day))["unreviewed"] = n
+    return daily, students
+
+def rebuild(conn: sqlite3.Connection) -> None:
+    daily, students = compute(conn)
+    conn.execute("DELETE FROM analytics_daily")
+    conn.execute("DELETE FROM analytics_students")
+    conn.executemany(
+        "INSERT INTO analytics_daily(assignment_id, day, pushes, perfect, points, max_points, "
+        "new_passes, unreviewed) VALUES (:aid, :day, :pushes, :perfect, :points, "
+        ":max_points, :new_passes, :unreviewed)",
+        [dict(d, aid=aid, day=day) for (aid, day), d in daily.items()])
+    conn.executemany(
+        "INSERT INTO analytics_students(assignment_id, repo_name, pushes, first_at, last_at, "
+        "best_points, max_points, passed_at, pushes_to_pass) VALUES (:aid, :repo, :pushes, "
+        ":first_at, :last_at, :best_points, :max_points, :passed_at, :pushes_to_pass)",
+        [dict(s, aid=aid, repo=repo) for (aid, repo), s in students.items()])
+
+def check(conn: sqlite3.Connection) -> list:
+    """Rollup rows that differ from a from-scratch computation."""
+    daily, students = compute(conn)
+    diffs = []
+    stored = {(r[0], r[1]): dict(zip(("pushes", "perfect", "points", "max_points",
+                                      "new_passes", "unreviewed"), r[2:]))
+              for r in conn.execute(
+                  "SELECT assignment_id, day, pushes, perfect, points, max_points, "
+                  "new_passes, unreviewed FROM analytics_daily")}
+    zero = dict(pushes=0, perfect=0, points=0, max_points=0, new_passes=0, unreviewed=0)
+    for key in set(daily) | set(stored):
+        if daily.get(key, zero) != stored.get(key, zero):
+            diffs.append(("daily", key, stored.get(key), daily.get(key)))
+    stored = {(r[0], r[1]): dict(zip(("pushes", "first_at", "last_at", "best_points",
+                                      "max_points", "passed_at", "pushes_to_pass"), r[2:]))
+              for r in conn.execute(
+                  "SELECT assignment_id, repo_name, pushes, first_at, last_at, best_points, "
+                  "max_points, passed_at, pushes_to_pass FROM analytics_students")}
+    for key in set(students) | set(stored):
+        if students.get(key) != stored.get(key):
+            diffs.append(("student", key, stored.get(key), students.get(key)))
+    return sorted(diffs, key=repr)
+
+# ─────────────────────────── dashboard ──────────────────────────
+def assignments(conn) -> list:
+    """[(assignment_id, description)] of assignments with at least one push."""
+    return conn.execute(
+        """SELECT d.assignment_id, COALESCE(a.description, '')
+             FROM (SELECT DISTINCT assignment_id FROM analytics_students) d
+        LEFT JOIN assignments a ON a.id = d.assignment_id
+         ORDER BY d.assignment_id""").fetchall()
+
+def dashboard(conn, assignment_id: int, days: int = DAYS, now: datetime = None) -> dict:
+    """Everything /dashboard shows for one assignment (reads only rollup rows)."""
+    now = now or datetime.utcnow()
+    since = (now - timedelta(days=days - 1)).date().isoformat()
+
+    students, passed, pushes, best, max_pts = conn.execute(
+        """SELECT COUNT(*), COALESCE(SUM(passed_at IS NOT NULL), 0), COALESCE(SUM(pushes), 0),
+                  COALESCE(SUM(best_points), 0), COALESCE(SUM(max_points), 0)
+             FROM analytics_students WHERE assignment_id = ?""",
+        (assignment_id,)).fetchone()
+
+    passed_before = conn.execute(
+        "SELECT COALESCE(SUM(new_passes), 0) FROM analytics_daily "
+        "WHERE assignment_id = ? AND day < ?", (assignment_id, since)).fetchone()[0]
+    timeline, cumulative = [], passed_before
+    for day, n, perfect, pts, mpts, new_passes in conn.execute(
+            """SELECT day, pushes, perfect, points, max_points, new_passes
+                 FROM analytics_daily
+                WHERE assignment_id = ? AND day >= ? ORDER BY day""",
+            (assignment_id, since)):
+        cumulative += new_passes
+        timeline.append(dict(day=day, pushes=n, perfect=perfect,
+                             pass_rate=perfect / n if n else None,
+                             mean_score=pts / mpts if mpts else None,
+                             passed=cumulative,
+                             passed_share=cumulative / students if students else 0))
+
+    buckets = {}
+    for n, count in conn.execute(
+            "SELECT MIN(pushes, ?), COUNT(*) FROM analytics_students "
+            "WHERE assignment_id = ? GROUP BY 1", (MAX_PUSH_BUCKET, assignment_id)):
+        buckets[n] = count
+    histogram = [dict(pushes=f"{n}+" if n == MAX_PUSH_BUCKET else str(n),
+                      students=buckets.get(n, 0))
+                 for n in range(1, max(buckets, default=0) + 1)]
+
+    cols = ("repo_name", "pushes", "first_at", "passed_at", "pushes_to_pass",
+            "best_points", "max_points")
+    slowest = [dict(zip(cols, r)) for r in conn.execute(
+        f"""SELECT {", ".join(cols)}
+             FROM analytics_students
+            WHERE assignment_id = ?
+         ORDER BY passed_at IS NOT NULL, COALESCE(pushes_to_pass, pushes) DESC
+            LIMIT ?""", (assignment_id, TOP_N))]
+    for s in slowest:
+        start = s["first_at"]
+        end = s["passed_at"] or now.isoformat()
+        try:
+            s["days"] = (datetime.fromisoformat(end.rstrip("Z"))
+                         - datetime.fromisoformat(start.rstrip("Z"))).total_seconds() / 86400
+        except (AttributeError, ValueError):
+            s["days"] = None
+
+    # review backlog by age of the feedback (one row per day that still has some)
+    ages = [("< 1 day", 1), ("1–3 days", 3), ("3–7 days", 7), ("> 7 days", None)]
+    backlog = {label: 0 for label, _ in ages}
+    oldest = None
+    for day, n in conn.execute(
+            "SELECT day, unreviewed FROM analytics_daily "
+            "WHERE assignment_id = ? AND unreviewed > 0 ORDER BY day", (assignment_id,)):
+        age = (now.date() - datetime.fromisoformat(day).date()).days
+        oldest = oldest if oldest is not None else age
+        for label, limit in ages:
+            if limit is None or age < limit:
+                backlog[label] += n
+                break
+
+    return dict(assignment_id=assignment_id, students=students, passed=passed,
+                pushes=pushes, mean_score=best / max_pts if max_pts else None,
+                timeline=timeline, histogram=histogram, slowest=slowest,
+                backlog=list(backlog.items()), unreviewed=sum(backlog.values()),
+                oldest_days=oldest, days=days)
+
+# ─────────────────────────── CLI ────────────────────────────────
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Cohort analytics rollups.")
+    g = ap.add_mutually_exclusive_group(required=True)
+    g.add_argument("--rebuild", action="store_true", help="recompute from scratch")
+    g.add_argument("--check", action="store_true",
+                   help="compare stored rollups with a recomputation")
+    args = ap.parse_args()
+
+    conn = db.connect()
+    ensure_schema(conn)
+    if args.rebuild:
+        rebuild(conn)
+        conn.commit()
+        print("✅ analytics rebuilt")
+    else:
+        diffs = check(conn)
+        for kind, key, stored, fresh in diffs[:20]:
+            print(f"❌ {kind} {key}: stored {stored} ≠ computed {fresh}")
+        print("✅ analytics consistent" if not diffs else f"{len(diffs)} mismatch(es)")
+        conn.close()
+        sys.exit(1 if diffs else 0)
+    conn.close()
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+archive.py
+────────────────────────────────────────────────────────────
+Cold tier for old, fully reviewed submissions.
+
+    $AGLLM_ARCHIVE_DB  (default: agllmdatabase.archive.db next to $AGLLM_DB)
+    archived_submissions   id, repo, assignment, dates, list columns
+                           + record = zlib(JSON) of every row of the push
+    archived_pushes        autograder score rows (analytics replay)
+
+A submission is moved when all of its feedback is reviewed and it is
+older than $AGLLM_ARCHIVE_DAYS or not among the repo's latest
+$AGLLM_ARCHIVE_KEEP pushes.  A repo's newest push always stays hot
+(diff_prompt needs it).  Each batch is first committed to the archive,
+then deleted from the hot tables.  If a crash happens between the two
+steps, the rows are in both places; readers prefer the hot copy and the
+next run replaces the archived one.  Blobs no longer referenced are
+dropped, and the hot file shrinks with PRAGMA incremental_vacuum.
+
+Reads stay transparent: search_db (listing, --show) and database_retrieve
+(markdown, --export) merge archived records by submission id, and
+analytics.compute() replays archived pushes; wherever both tiers are
+merged a row counts once and the hot copy wins.  Kept hot on purpose:
+sim_vectors (teacher comments stay in the similarity context),
+submission_flags and the near_dupes signatures; similarity and near_dupes
+rebuilds re-index archived records too.  Full-text search covers the hot
+tier only.
+
+CLI:  python3 archive.py [--days N] [--keep N] [--dry-run]   # archive + vacuum
+      python3 archive.py --status
+      python3 archive.py --show SID                          # one archived record
+"""
+
+import os, json, zlib, sqlite3, argparse
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import db, blobstore
+
+# ─────────────────────────── config ─────────────────────────────
+ARCHIVE_DB    = os.getenv("AGLLM_ARCHIVE_DB",
+                          str(Path(db.DB_PATH).with_suffix(".archive.db")))
+ARCHIVE_DAYS  = float(os.getenv("AGLLM_ARCHIVE_DAYS", "180"))
+ARCHIVE_KEEP  = int(os.getenv("AGLLM_ARCHIVE_KEEP", "20"))      # 0 = age rule only
+BATCH         = int(os.getenv("AGLLM_ARCHIVE_BATCH", "200"))    # submissions per commit
+VACUUM_PAGES  = 2000                                             # per incremental step
+PREVIEW       = 240                                              # chars kept uncompressed
+
+DDL = """
+CREATE TABLE IF NOT EXISTS archived_submissions (
+  id               INTEGER PRIMARY KEY,     -- the original submissions.id
+  student_repo     TEXT    NOT NULL,
+  assignment_id    INTEGER NOT NULL,
+  submitted_at     TEXT    NOT NULL,
+  archived_at      TEXT    NOT NULL,
+  files            INTEGER NOT NULL,
+  size             INTEGER NOT NULL,        -- uncompressed code bytes
+  feedback_id      INTEGER,                 -- latest feedback row
+  feedback_preview TEXT,
+  output_preview   TEXT,
+  autograder_id    INTEGER,                 -- latest autograder_outputs row
+  points           REAL,
+  max_points       REAL,
+  record           BLOB    NOT NULL         -- zlib(JSON), see _record()
+);
+CREATE INDEX IF NOT EXISTS idx_archived_repo ON archived_submissions(student_repo, id);
+
+CREATE TABLE IF NOT EXISTS archived_pushes (   -- one row per autograder_outputs row
+  autograder_id    INTEGER PRIMARY KEY,
+  submission_id    INTEGER NOT NULL,
+  assignment_id    INTEGER NOT NULL,
+  student_repo     TEXT    NOT NULL,
+  submitted_at     TEXT    NOT NULL,
+  points           REAL,
+  max_points       REAL
+);
+"""
+
+# child tables moved with their submission (name → ORDER BY)
+CHILDREN = {
+    "feedback":           "id",
+    "autograder_outputs": "id",
+    "autograder_results": "id",
+    "prompt_omissions":   "rowid",
+    "run_metrics":        "rowid",
+}
+
+def connect(create: bool = False) -> sqlite3.Connection:
+    """The archive database, or None when it does not exist (and create=False)."""
+    if not create and not os.path.exists(ARCHIVE_DB):
+        return None
+    conn = sqlite3.connect(ARCHIVE_DB, timeout=db.BUSY_TIMEOUT_MS / 1000)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.executescript(DDL)
+    return conn
+
+# ─────────────────────────── records ────────────────────────────
+def _table_exists(conn, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                        (name,)).fetchone() is not None
+
+def _rows(conn, table: str, ids: list, order: str) -> dict:
+    """{submission_id: [row dict]} for every column of `table`."""
+    out = {}
+    if not _table_exists(conn, table):
+        return out
+    marks = ",".join("?" * len(ids))
+    cur = conn.execute(f"SELECT * FROM {table} WHERE submission_id IN ({marks}) "
+                       f"ORDER BY submission_id, {order}", ids)
+    cols = [d[0] for d in cur.description]
+    for row in cur:
+        rec = dict(zip(cols, row))
+        out.setdefault(rec["submission_id"], []).append(rec)
+    return out
+
+def _record(conn, ids: list) -> list:
+    """Full JSON-able records (submission + files + every child row) for ids."""
+    cur = conn.execute(f"SELECT id, student_repo, assignment_id, code, submitted_at "
+                       f"FROM submissions WHERE id IN ({','.join('?' * len(ids))}) "
+                       f"ORDER BY id", ids)
+    subs = [dict(zip(("id", "student_repo", "assignment_id", "code", "submitted_at"), r))
+            for r in cur]
+    children = {t: _rows(conn, t, ids, order) for t, order in CHILDREN.items()}
+    out = []
+    for s in subs:
+        rec = {"submission": s,
+               "files": [{"filename": n, "code": t}
+                         for n, t in blobstore.submission_files(conn, s["id"])]}
+        for t in CHILDREN:
+            rec[t] = children[t].get(s["id"], [])
+        out.append(rec)
+    return out
+
+def encode(rec: dict) -> bytes:
+    return zlib.compress(json.dumps(rec, ensure_ascii=False).encode("utf-8"), 9)
+
+def decode(data) -> dict:
+    return json.loads(zlib.decompress(data))
+
+# ─────────────────────────── policy ─────────────────────────────
+def eligible(conn, days: float = ARCHIVE_DAYS, keep: int = ARCHIVE_KEEP,
+             limit: int = BATCH, now: datetime = None) -> list:
+    """Submission ids to move next (oldest first)."""
+    cutoff = ((now or datetime.utcnow()) - timedelta(days=days)).isoformat()
+    return [r[0] for r in conn.execute(
+        """WITH ranked AS (
+               SELECT id, submitted_at,
+                      ROW_NUMBER() OVER (PARTITION BY student_repo ORDER BY id DESC) AS rn
+                 FROM submissions)
+           SELECT r.id FROM ranked r
+            WHERE r.rn > 1
+              AND (r.submitted_at < ? OR (? > 0 AND r.rn > ?))
+              AND EXISTS (SELECT 1 FROM feedback f WHERE f.submission_id = r.id)
+              AND NOT EXISTS (SELECT 1 FROM feedback f
+                               WHERE f.submission_id = r.id
+                                 AND (f.reviewed = 0 OR f.status <> 'done'))
+         ORDER BY r.id LIMIT ?""", (cutoff, keep, keep, limit))]
+
+# ─────────────────────────── move ───────────────────────────────
+def _summary_row(rec: dict, now: str) -> tuple:
+    s, fb, ag = rec["submission"], rec["feedback"], rec["autograder_outputs"]
+    last_fb, last_ag = (fb[-1] if fb else {}), (ag[-1] if ag else {})
+    return (s["id"], s["student_repo"], s["assignment_id"], s["submitted_at"], now,
+            len(rec["files"]), sum(len(f["code"].encode("utf-8")) for f in rec["files"]),
+            last_fb.get("id"), (last_fb.get("feedback_text") or "")[:PREVIEW],
+            (last_ag.get("output") or "")[:PREVIEW], last_ag.get("id"),
+            last_ag.get("points"), last_ag.get("max_points"), encode(rec))
+
+def _delete(cur, ids: list) -> int:
+    """Remove the submissions from the hot tables; returns orphaned blobs dropped."""
+    marks = ",".join("?" * len(ids))
+    hashes = [r[0] for r in cur.execute(
+        f"SELECT DISTINCT blob_hash FROM code_files WHERE submission_id IN ({marks}) "
+        f"AND blob_hash IS NOT NULL", ids)]
+    for t in CHILDREN:
+        if _table_exists(cur.connection, t):
+            cur.execute(f"DELETE FROM {t} WHERE submission_id IN ({marks})", ids)
+    cur.execute(f"DELETE FROM code_files WHERE submission_id IN ({marks})", ids)
+    cur.execute(f"DELETE FROM submissions WHERE id IN ({marks})", ids)
+    dropped = 0
+    # safe against grading: control_code stores and links a push's blobs in
+    # one transaction, so a blob is never unreferenced between the two
+    for h in hashes:                     # FTS trigger removes the code index row
+        dropped += cur.execute(
+            "DELETE FROM blobs WHERE hash = ? AND NOT EXISTS "
+            "(SELECT 1 FROM code_files WHERE blob_hash = ?)", (h, h)).rowcount
+    return dropped
+
+def run(conn: sqlite3.Connection, days: float = ARCHIVE_DAYS, keep: int = ARCHIVE_KEEP,
+        dry_run: bool = False, verbose: bool = False) -> dict:
+    """Move every eligible submission in batches; returns counters."""
+    stats = {"submissions": 0, "blobs": 0, "bytes": 0}
+    if dry_run:
+        stats["submissions"] = len(eligible(conn, days, keep, limit=-1))
+        return stats
+    arc = connect(create=True)
+    try:
+        while True:
+            ids = eligible(conn, days, keep)
+            if not ids:
+                break
+            now = datetime.utcnow().isoformat() + "Z"
+            recs = _record(conn, ids)
+            rows = [_summary_row(rec, now) for rec in recs]
+            with arc:                                # 1. archive copy is durable …
+                arc.executemany(
+                    "INSERT OR REPLACE INTO archived_submissions VALUES "
+                    "(?,?,?,?,?,?,?,?,?,?,?,?,?,?)", rows)
+                arc.executemany(
+                    "INSERT OR REPLACE INTO archived_pushes VALUES (?,?,?,?,?,?,?)",
+                    [(a["id"], s["id"], s["assignment_id"], s["student_repo"],
+                      s["submitted_at"], a.get("points"), a.get("max_points"))
+                     for rec in recs for s in (rec["submission"],)
+                     for a in rec["autograder_outputs"]])
+            conn.execute("BEGIN IMMEDIATE")          # 2. … before the hot rows go
+            try:
+                stats["blobs"] += _delete(conn.cursor(), ids)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            stats["submissions"] += len(ids)
+            stats["bytes"] += sum(len(r[-1]) for r in rows)
+            if verbose:
+                print(f"📦  archived {stats['submissions']} submission(s) …")
+    finally:
+        arc.close()
+    return stats
+
+def vacuum(conn: sqlite3.Connection, verbose: bool = False) -> int:
+    """Return free pages to the OS in small steps; returns pages released.
+
+    The first call on a database created without auto_vacuum switches it
+    to INCREMENTAL, which needs one full VACUUM."""
+    if conn.in_transaction:
+        conn.commit()
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        if verbose:
+            print("🧹  switching to auto_vacuum=INCREMENTAL (one full VACUUM) …")
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        before = conn.execute("PRAGMA page_count").fetchone()[0]
+        conn.execute("VACUUM")
+        return before - conn.execute("PRAGMA page_count").fetchone()[0]
+    released = 0
+    while True:
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if not free:
+            break
+        conn.execute(f"PRAGMA incremental_vacuum({min(free, VACUUM_PAGES)})").fetchall()
+        released += min(free, VACUUM_PAGES)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return released
+
+# ─────────────────────────── reads ──────────────────────────────
+def _where(repo=None, assignment=None, since=None, until=None, reviewed=None,
+           student_repo=None):
+    sql, args = ["1 = 1"], []
+    if student_repo:
+        sql.append("student_repo = ?"); args.append(student_repo)
+    if repo:
+        sql.append("student_repo GLOB ?"); args.append(repo)
+    if assignment is not None:
+        sql.append("assignment_id = ?"); args.append(assignment)
+    if since:
+        sql.append("submitted_at >= ?"); args.append(since)
+    if until:
+        sql.append("submitted_at < ?"); args.append(until)
+    if reviewed is False:                # archived feedback is always reviewed
+        sql.append("0")
+    return " AND ".join(sql), args
+
+def ids(repo: str) -> set:
+    """Archived submission ids of a repo."""
+    arc = connect()
+    if arc is None:
+        return set()
+    try:
+        return {r[0] for r in arc.execute(
+            "SELECT id FROM archived_submissions WHERE student_repo = ?", (repo,))}
+    finally:
+        arc.close()
+
+def page_rows(repo: str, limit: int):
+    """search_db.fetch_page columns for a repo's newest `limit` archived pushes."""
+    arc = connect()
+    if arc is None:
+        return []
+    try:
+        return arc.execute(
+            """SELECT id, assignment_id, submitted_at, files, size, feedback_id, 1,
+                      feedback_preview, output_preview
+                 FROM archived_submissions WHERE student_repo = ?
+             ORDER BY id DESC LIMIT ?""", (repo, limit)).fetchall()
+    finally:
+        arc.close()
+
+def load(submission_id: int) -> dict:
+    """The archived record of one submission, or None."""
+    arc = connect()
+    if arc is None:
+        return None
+    try:
+        row = arc.execute("SELECT record FROM archived_submissions WHERE id = ?",
+                          (submission_id,)).fetchone()
+    finally:
+        arc.close()
+    return decode(row[0]) if row else None
+
+def records(**filters):
+    """Archived records matching database_retrieve-style filters (repo = glob,
+    student_repo = exact name), in id order."""
+    arc = connect()
+    if arc is None:
+        return
+    where, args = _where(**filters)
+    try:
+        for (data,) in arc.execute(
+                f"SELECT record FROM archived_submissions WHERE {where} ORDER BY id", args):
+            yield decode(data)
+    finally:
+        arc.close()
+
+def pushes():
+    """(autograder_id, assignment_id, repo, submitted_at, points, max_points) in
+    autograder_id order – archived input for analytics.compute()."""
+    arc = connect()
+    if arc is None:
+        return
+    try:
+        yield from arc.execute(
+            """SELECT autograder_id, assignment_id, student_repo, submitted_at, points,
+                      max_points
+                 FROM archived_pushes ORDER BY autograder_id""")
+    finally:
+        arc.close()
+
+# ─────────────────────────── CLI ────────────────────────────────
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Move old reviewed submissions to the archive.")
+    g = ap.add_mutually_exclusive_group()
+    g.add_argument("--status", action="store_true", help="hot / archived counts and sizes")
+    g.add_argument("--show", type=int, metavar="SID", help="print one archived record")
+    ap.add_argument("--days", type=float, default=ARCHIVE_DAYS,
+                    help="archive pushes older than this (default %(default)s)")
+    ap.add_argument("--keep", type=int, default=ARCHIVE_KEEP,
+                    help="…or beyond each repo's newest N (default %(default)s, 0 = off)")
+    ap.add_argument("--dry-run", action="store_true", help="only count what would move")
+    ap.add_argument("--no-vacuum", action="store_true")
+    args = ap.parse_args()
+
+    if args.show:
+        rec = load(args.show)
+        print(json.dumps(rec, indent=2, ensure_ascii=False) if rec
+              else f"submission {args.show} is not archived")
+    elif args.status:
+        conn = db.connect()
+        hot = conn.execute("SELECT COUNT(*) FROM submissions").fetchone()[0]
+        pages, size, free = (conn.execute(f"PRAGMA {p}").fetchone()[0]
+                             for p in ("page_count", "page_size", "freelist_count"))
+        print(f"hot      {hot:>8} submissions  {pages * size / 2**20:8.1f} MiB "
+              f"({free} free pages)  {db.DB_PATH}")
+        arc = connect()
+        if arc is not None:
+            n = arc.execute("SELECT COUNT(*) FROM archived_submissions").fetchone()[0]
+            print(f"archived {n:>8} submissions  {os.path.getsize(ARCHIVE_DB) / 2**20:8.1f} MiB"
+                  f"  {ARCHIVE_DB}")
+        conn.close()
+    else:
+        conn = db.connect()
+        st = run(conn, args.days, args.keep, args.dry_run, verbose=True)
+        if args.dry_run:
+            print(f"would archive {st['submissions']} submission(s)")
+        else:
+            print(f"✅ archived {st['submissions']} submission(s) "
+                  f"({st['bytes'] / 1024:.0f} KiB compressed), dropped {st['blobs']} blob(s)")
+            if not args.no_vacuum:
+                print(f"🧹  released {vacuum(conn, verbose=True)} page(s)")
+        conn.close()
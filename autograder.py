@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+autograder.py
+────────────────────────────────────────────────────────────
+Structured results parsed from ~/logs/autograder_output.txt.
+
+    autograder_results   submission_id, test, status, points, max_points, excerpt
+    autograder_outputs   + points / max_points of the whole run
+
+parse() understands
+  • education/autograding@v1 logs    📝 <test> … ✅ <test> | ❌ <test> <error>
+                                      (classroom.yml tees them into the file)
+  • classroom-resources grader `result` outputs (JSON, raw or base64, one per line)
+  • the "Points X/Y" / "All tests passed" trailer classroom.yml appends
+
+control_code records the rows at insert time and puts only the failing
+tests' excerpts into the prompt (prompt_section); teacher_ui shows them
+on each card.  Per-test points come from the grader JSON, or from
+.github/classroom/autograding.json when the checkout has one.
+
+CLI:  python3 autograder.py <autograder_output.txt>   # show what parses
+      python3 autograder.py --top-failing [DAYS]       # most failed tests
+      python3 autograder.py --backfill                 # parse stored outputs
+"""
+
+import os, re, json, base64, sqlite3, argparse, binascii
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import db
+
+# ─────────────────────────── config ─────────────────────────────
+EXCERPT_LINES = int(os.getenv("AGLLM_AUTOGRADER_EXCERPT_LINES", "20"))   # tail kept
+EXCERPT_CHARS = 2000
+CONFIG_PATH   = Path(".github/classroom/autograding.json")   # relative to the checkout
+
+DDL = """
+CREATE TABLE IF NOT EXISTS autograder_results (
+  id            INTEGER PRIMARY KEY,
+  submission_id INTEGER NOT NULL REFERENCES submissions(id),
+  test          TEXT    NOT NULL,
+  status        TEXT    NOT NULL,        -- pass | fail | error
+  points        REAL,
+  max_points    REAL,
+  excerpt       TEXT,                    -- failing tests only
+  recorded_at   TEXT    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_autograder_results_sub
+    ON autograder_results(submission_id);
+CREATE INDEX IF NOT EXISTS idx_autograder_results_recent
+    ON autograder_results(recorded_at, test, status);
+"""
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    conn.executescript(DDL)
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(autograder_outputs)")}
+    for name in ("points", "max_points"):
+        if cols and name not in cols:
+            conn.execute(f"ALTER TABLE autograder_outputs ADD COLUMN {name} REAL")
+    conn.commit()
+
+# ─────────────────────────── parsing ────────────────────────────
+@dataclass
+class TestResult:
+    name: str
+    status: str                      # pass | fail | error
+    points: float = None
+    max_points: float = None
+    excerpt: str = ""
+
+@dataclass
+class Report:
+    tests: list = field(default_factory=list)
+    points: float = None
+    max_points: float = None
+    all_passed: bool = False         # "All tests passed" trailer
+
+    @property
+    def failing(self) -> list:
+        return [t for t in self.tests if t.status != "pass"]
+
+    @property
+    def perfect(self) -> bool:
+        if self.all_passed:
+            return True
+        if self.points is not None and self.max_points is not None:
+            return self.points == self.max_points
+        return bool(self.tests) and not self.failing
+
+_ANSI_RE   = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+_POINTS_RE = re.compile(r"Points\s+(\d+(?:\.\d+)?)\s*/\s*(\d+(?:\.\d+)?)", re.I)
+_START_RE  = re.compile(r"^📝\s*(.+?)\s*$")
+_END_RE    = re.compile(r"^(✅|❌)\s*(.+?)\s*$")
+_STATUSES  = {"pass": "pass", "passed": "pass", "fail": "fail", "failed": "fail",
+              "error": "error"}
+
+def _excerpt(lines) -> str:
+    lines = [l.rstrip() for l in lines]
+    while lines and not lines[0].strip():
+        lines.pop(0)
+    while lines and not lines[-1].strip():
+        lines.pop()
+    text = "\n".join(lines[-EXCERPT_LINES:])
+    return text[-EXCERPT_CHARS:]
+
+def _grader_json(line: str):
+    """A classroom-resources grader result on one line, or None."""
+    s = line.strip()
+    if not s.startswith(("{", "eyJ")):              # base64 of '{"'
+        return None
+    try:
+        obj = json.loads(s if s.startswith("{") else base64.b64decode(s, validate=True))
+    except (ValueError, binascii.Error):
+        return None
+    return obj if isinstance(obj, dict) and isinstance(obj.get("tests"), list) else None
+
+def _number(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+def parse(text: str, points_map: dict = None) -> Report:
+    """Autograder log → Report (tests in log order; unknown formats give no tests)."""
+    report = Report()
+    tests = {}
+    current, buf, tail_of = None, [], None
+
+    def close_tail():
+        if tail_of is not None and tail_of.status != "pass":
+            tail_of.excerpt = _excerpt(tail_of.excerpt.splitlines() + buf)
+
+    for raw in (text or "").splitlines():
+        line = _ANSI_RE.sub("", raw)
+        if (m := _START_RE.match(line.strip())):
+            close_tail()
+            current, buf, tail_of = m.group(1), [], None
+            continue
+        if (m := _END_RE.match(line.strip())):
+            close_tail()
+            mark, name = m.groups()
+            status = "pass" if mark == "✅" else "fail"
+            t = tests[name] = TestResult(name, status)
+            if status == "fail":
+                t.excerpt = _excerpt(buf) if name == current else ""
+            current, buf, tail_of = None, [], t
+            continue
+        if (m := _POINTS_RE.search(line)):
+            close_tail()
+            report.points, report.max_points = float(m.group(1)), float(m.group(2))
+            tail_of, buf = None, []
+            continue
+        if "All tests passed" in line:
+            close_tail()
+            report.all_passed = True
+            tail_of, buf = None, []
+            continue
+        if (obj := _grader_json(line)):
+            close_tail()
+            tail_of, buf = None, []
+            for t in obj["tests"]:
+                name = str(t.get("name") or "test")
+                status = _STATUSES.get(str(t.get("status", "")).lower(), "error")
+                max_pts = t.get("max_score",
+                                obj.get("max_score") if len(obj["tests"]) == 1 else None)
+                tests[name] = TestResult(
+                    name, status, _number(t.get("score")), _number(max_pts),
+                    "" if status == "pass" else _excerpt(str(t.get("message") or "")
+                                                         .splitlines()))
+            continue
+        if line.startswith(("✨", "🏆")):
+            continue
+        buf.append(line)
+    close_tail()
+
+    for t in tests.values():
+        if points_map and t.name in points_map and t.max_points is None:
+            t.max_points = points_map[t.name]
+            t.points = t.max_points if t.status == "pass" else 0.0
+    report.tests = list(tests.values())
+    if report.points is None and report.tests and all(t.max_points is not None
+                                                      for t in report.tests):
+        report.points = sum(t.points or 0 for t in report.tests)
+        report.max_points = sum(t.max_points for t in report.tests)
+    return report
+
+def load_points(checkout: Path) -> dict:
+    """{test name: points} from the checkout's autograding.json (if any)."""
+    path = Path(checkout) / CONFIG_PATH
+    try:
+        tests = json.loads(path.read_text(encoding="utf-8")).get("tests", [])
+    except (OSError, ValueError, AttributeError):
+        return {}
+    return {t["name"]: float(t.get("points") or 0) for t in tests
+            if isinstance(t, dict) and "name" in t}
+
+def _fmt(v) -> str:
+    return f"{v:g}" if v is not None else "?"
+
+def prompt_section(report: Report, raw: str) -> str:
+    """Autograder block for the prompt: failing tests' excerpts only."""
+    if not report.tests:
+        return raw                          # unrecognised log – pass it through
+    out = []
+    if report.points is not None:
+        out.append(f"Points {_fmt(report.points)}/{_fmt(report.max_points)}")
+    failing = report.failing
+    out.append(f"{len(report.tests) - len(failing)} of {len(report.tests)} tests passed.")
+    passed = [t.name for t in report.tests if t.status == "pass"]
+    if passed:
+        out.append("Passing: " + ", ".join(passed))
+    for t in failing:
+        pts = f" ({_fmt(t.points)}/{_fmt(t.max_points)} points)" if t.max_points else ""
+        out.append(f"\n❌ {t.name}{pts}")
+        if t.excerpt:
+            out.append(f"```\n{t.excerpt}\n```")
+    return "\n".join(out)
+
+# ─────────────────────────── storage ────────────────────────────
+def record(cur, submission_id: int, report: Report, ts: str) -> None:
+    cur.executemany(
+        "INSERT INTO autograder_results(submission_id, test, status, points, max_points, "
+        "excerpt, recorded_at) VALUES (?,?,?,?,?,?,?)",
+        [(submission_id, t.name, t.status, t.points, t.max_points, t.excerpt or None, ts)
+         for t in report.tests])
+
+def results_for(cur, submission_ids) -> dict:
+    """{submission_id: Report} rebuilt from the stored rows (one query each table)."""
+    ids = list(submission_ids)
+    if not ids:
+        return {}
+    marks = ",".join("?" * len(ids))
+    out = {}
+    for sid, pts, max_pts in cur.execute(
+            f"SELECT submission_id, points, max_points FROM autograder_outputs "
+            f"WHERE submission_id IN ({marks}) ORDER BY id", ids):
+        out[sid] = Report(points=pts, max_points=max_pts)
+    for sid, name, status, pts, max_pts, excerpt in cur.execute(
+            f"SELECT submission_id, test, status, points, max_points, excerpt "
+            f"FROM autograder_results WHERE submission_id IN ({marks}) ORDER BY id", ids):
+        out.setdefault(sid, Report()).tests.append(
+            TestResult(name, status, pts, max_pts, excerpt or ""))
+    return {sid: r for sid, r in out.items() if r.tests or r.max_points is not None}
+
+def top_failing(conn, days: float = 7, limit: int = 10) -> list:
+    """[(test, failures, runs)] over the last `days`, most failures first."""
+    since = (datetime.utcnow() - timedelta(days=days)).isoformat()
+    return conn.execute(
+        """SELECT test, SUM(status <> 'pass') AS failures, COUNT(*) AS runs
+             FROM autograder_results
+            WHERE recorded_at >= ?
+         GROUP BY test
+           HAVING failures > 0
+         ORDER BY failures DESC, test
+            LIMIT ?""", (since, limit)).fetchall()
+
+def backfill(conn: sqlite3.Connection) -> int:
+    """Parse stored outputs that have no structured rows yet (does not commit)."""
+    rows = conn.execute(
+        """SELECT a.id, a.submission_id, a.output, a.generated_at
+             FROM autograder_outputs a
+            WHERE a.points IS NULL
+              AND NOT EXISTS (SELECT 1 FROM autograder_results r
+                               WHERE r.submission_id = a.submission_id)""").fetchall()
+    cur = conn.cursor()
+    for aid, sid, output, ts in rows:
+        report = parse(output)
+        cur.execute("UPDATE autograder_outputs SET points = ?, max_points = ? WHERE id = ?",
+                    (report.points, report.max_points, aid))
+        record(cur, sid, report, ts)
+    return len(rows)
+
+# ─────────────────────────── CLI ────────────────────────────────
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Autograder output parser.")
+    g = ap.add_mutually_exclusive_group(required=True)
+    g.add_argument("file", nargs="?", type=Path, help="autograder_output.txt to parse")
+    g.add_argument("--top-failing", type=float, nargs="?", const=7, metavar="DAYS")
+    g.add_argument("--backfill", action="store_true")
+    args = ap.parse_args()
+
+    if args.file:
+        rep = parse(args.file.read_text(encoding="utf-8", errors="replace"))
+        print(f"points {_fmt(rep.points)}/{_fmt(rep.max_points)}  perfect={rep.perfect}")
+        for t in rep.tests:
+            print(f"  {'✅' if t.status == 'pass' else '❌'} {t.name}"
+                  f"  {_fmt(t.points)}/{_fmt(t.max_points)}")
+            if t.excerpt:
+                print("     " + t.excerpt.replace("\n", "\n     "))
+    else:
+        conn = db.connect()
+        ensure_schema(conn)
+        if args.backfill:
+            n = backfill(conn)
+            conn.commit()
+            print(f"✅ parsed {n} stored output(s)")
+        else:
+            for test, fails, runs in top_failing(conn, args.top_failing):
+                print(f"{fails:>6} / {runs:<6} {test}")
+        conn.close()
@@ -0,0 +1,15 @@
+"""
+bench
+────────────────────────────────────────────────────────────
+Load and latency benchmarks for AGLLM.
+
+    cohort.py       synthetic N repos × M submissions × K files + history
+    fake_ollama.py  stand-in Ollama HTTP server (latency / token rate knobs)
+    scenarios.py    timed grading, teacher UI, search, export and LLM pool scenarios
+
+Run from the repo root (everything happens in a throw-away directory):
+
+    python3 -m bench run --repos 200 --subs 10 --files 6 -o bench.json
+    python3 -m bench compare old.json new.json       # exit 1 on regressions
+    python3 -m bench ollama --port 11434 --tps 40    # fake server only
+"""
@@ -0,0 +1,148 @@
+"""
+python3 -m bench run | compare | ollama   (see bench/__init__.py)
+"""
+
+import os, sys, json, time, sqlite3, argparse, platform, tempfile, subprocess
+from datetime import datetime
+from pathlib import Path
+
+# `python3 -m bench` puts the repo root first on sys.path, where the
+# CloudLab profile.py shadows the stdlib `profile` (pygments' plugin lookup
+# can load packages that import cProfile).  The AGLLM modules still resolve
+# from the end of the path.
+if sys.path and Path(sys.path[0] or os.curdir).resolve() == Path(__file__).resolve().parents[1]:
+    sys.path.append(sys.path.pop(0))
+
+def _sandbox(work: Path, ollama_address: str) -> None:
+    """Point every AGLLM module at the bench sandbox (before they are imported)."""
+    os.environ.update({
+        "HOME": str(work),
+        "AGLLM_DB": str(work / "agllmdatabase.db"),
+        "AGLLM_SPOOL_DIR": str(work / "spool"),
+        "OLLAMA_HOST": ollama_address,
+        "OLLAMA_RETRIES": "1",
+        "OLLAMA_BACKOFF": "0.05",
+    })
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=Path(__file__).parent).stdout.strip()
+    except OSError:
+        return ""
+
+def run(args) -> dict:
+    from bench.fake_ollama import FakeOllama
+
+    work = Path(args.workdir or tempfile.mkdtemp(prefix="agllm-bench-"))
+    work.mkdir(parents=True, exist_ok=True)
+    fake = FakeOllama(load_ms=args.load_ms, tps=args.tps, tokens=args.tokens).start()
+    _sandbox(work, fake.address)
+
+    import db
+    from bench import cohort, scenarios
+
+    conn = db.connect()
+    t = time.perf_counter()
+    counts = cohort.generate(conn, args.repos, args.subs, args.files,
+                             functions=args.functions, seed=args.seed)
+    gen_s = time.perf_counter() - t
+    conn.close()
+    print(f"🏗️  cohort {counts} in {gen_s:.1f}s → {work}", file=sys.stderr)
+
+    results = {}
+    for group, fn in (("grading", lambda: scenarios.grading(
+                            work, args.repeat, args.files, args.functions, args.seed)),
+                      ("teacher_ui", lambda: scenarios.teacher_routes(args.repeat)),
+                      ("queries", lambda: scenarios.queries(args.repeat)),
+                      ("pool", lambda: scenarios.pool(args.repeat))):
+        if args.only and group not in args.only:
+            continue
+        print(f"⏱️  {group} …", file=sys.stderr)
+        results.update(fn())
+    fake.stop()
+
+    return {
+        "meta": {
+            "when": datetime.utcnow().isoformat() + "Z", "git": _git_rev(),
+            "python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+            "machine": platform.machine(), "cpus": os.cpu_count(),
+            "params": {k: v for k, v in vars(args).items() if k not in ("func", "output")},
+            "cohort": counts, "generate_s": round(gen_s, 3),
+            "db_bytes": os.path.getsize(work / "agllmdatabase.db"),
+            "llm_requests": fake.requests,
+        },
+        "scenarios": results,
+    }
+
+def compare(old: dict, new: dict, threshold: float, min_ms: float) -> int:
+    """Print a median-to-median table; return the number of regressions."""
+    bad = 0
+    print(f"{'scenario':<22}{'old ms':>10}{'new ms':>10}{'ratio':>8}")
+    for name in sorted(set(old["scenarios"]) | set(new["scenarios"])):
+        o = old["scenarios"].get(name, {}).get("median_ms")
+        n = new["scenarios"].get(name, {}).get("median_ms")
+        if o is None or n is None:
+            print(f"{name:<22}{o or '—':>10}{n or '—':>10}")
+            continue
+        ratio = n / o if o else float("inf")
+        flag = ratio > threshold and n - o > min_ms
+        bad += flag
+        print(f"{name:<22}{o:>10.2f}{n:>10.2f}{ratio:>8.2f}{'  ❌' if flag else ''}")
+    return bad
+
+def main() -> None:
+    ap = argparse.ArgumentParser(prog="python3 -m bench", description="AGLLM benchmarks.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    r = sub.add_parser("run", help="generate a cohort and time all scenarios")
+    r.add_argument("--repos", type=int, default=50)
+    r.add_argument("--subs", type=int, default=5, help="submissions per repo")
+    r.add_argument("--files", type=int, default=4, help="files per submission")
+    r.add_argument("--functions", type=int, default=8, help="functions per file")
+    r.add_argument("--repeat", type=int, default=20)
+    r.add_argument("--seed", type=int, default=0)
+    r.add_argument("--only", nargs="+", choices=("grading", "teacher_ui", "queries",
+                                                          "pool"))
+    r.add_argument("--load-ms", type=float, default=0, help="fake model load latency")
+    r.add_argument("--tps", type=float, default=5000, help="fake output tokens/sec")
+    r.add_argument("--tokens", type=int, default=120, help="fake output tokens")
+    r.add_argument("--workdir", help="keep the sandbox here (default: temp dir)")
+    r.add_argument("-o", "--output", default="-", help="results JSON (default stdout)")
+
+    c = sub.add_parser("compare", help="diff two result files")
+    c.add_argument("old", type=Path)
+    c.add_argument("new", type=Path)
+    c.add_argument("--threshold", type=float, default=1.25, help="max new/old median ratio")
+    c.add_argument("--min-ms", type=float, default=1.0, help="ignore smaller differences")
+
+    o = sub.add_parser("ollama", help="serve the fake Ollama until Ctrl-C")
+    o.add_argument("--port", type=int, default=11434)
+    o.add_argument("--load-ms", type=float, default=0)
+    o.add_argument("--tps", type=float, default=40)
+    o.add_argument("--tokens", type=int, default=120)
+    o.add_argument("--fail-every", type=int, default=0, help="answer every Nth call with 503")
+    args = ap.parse_args()
+
+    if args.cmd == "run":
+        out = json.dumps(run(args), indent=2)
+        if args.output == "-":
+            print(out)
+        else:
+            Path(args.output).write_text(out + "\n", encoding="utf-8")
+    elif args.cmd == "compare":
+        bad = compare(json.loads(args.old.read_text()), json.loads(args.new.read_text()),
+                      args.threshold, args.min_ms)
+        sys.exit(1 if bad else 0)
+    else:
+        from bench.fake_ollama import FakeOllama
+        fake = FakeOllama(port=args.port, load_ms=args.load_ms, tps=args.tps,
+                          tokens=args.tokens, fail_every=args.fail_every)
+        print(f"🤖 fake Ollama on {fake.address}")
+        try:
+            fake.server.serve_forever()
+        except KeyboardInterrupt:
+            fake.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Synthetic cohort: N repos × M submissions × K files plus feedback history.
+
+Files are generated Python modules; each push edits a few of them, so the
+blob store, incremental prompts and the similarity index see the same
+kind of churn as a real class.  Rows go through the normal write paths
+(blobstore, FTS triggers, repo_summary, similarity), so generation time
+is itself a rough measure of ingest cost.
+"""
+
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import autograder, blobstore, create_database, migrations, near_dupes, repo_summary, similarity
+
+IDENTS   = ("total", "items", "node", "left", "right", "count", "result", "buf",
+            "index", "value", "stack", "queue", "head", "tail", "depth", "key")
+COMMENTS = (
+    "Good structure. Watch the recursion depth on large inputs.",
+    "Possible memory leak: the cache never shrinks.",
+    "Think about the edge case where the list is empty.",
+    "Nice use of helper functions; add a test for the negative case.",
+    "Off-by-one in the loop bound — check the last element.",
+    "Please avoid global state; pass values explicitly.",
+)
+FEEDBACK = (
+    "What happens to your loop when the input is empty? ",
+    "Which test exercises the error path? ",
+    "Could this function be split so that each part is testable? ",
+    "How does the running time grow as the input doubles? ",
+)
+
+def make_function(rng: random.Random, i: int) -> str:
+    a, b, c = rng.sample(IDENTS, 3)
+    body = [f"def {a}_{i}({b}, {c}=0):",
+            f'    """Helper {i} for {a}."""']
+    for j in range(rng.randint(3, 12)):
+        op = rng.choice(("+", "-", "*", "//"))
+        body.append(f"    {b} = {b} {op} ({c} + {j})")
+        if rng.random() < 0.3:
+            body.append(f"    if {b} > {rng.randint(10, 999)}:\n        return {b}")
+    body.append(f"    return {b}")
+    return "\n".join(body) + "\n"
+
+def make_file(rng: random.Random, functions: int) -> str:
+    return "import os\nimport sys\n\n\n" + "\n\n".join(
+        make_function(rng, i) for i in range(functions))
+
+def mutate(rng: random.Random, text: str) -> str:
+    lines = text.splitlines()
+    for _ in range(rng.randint(1, 4)):
+        k = rng.randrange(len(lines))
+        lines[k] = lines[k] + f"  # rev {rng.randint(0, 9999)}"
+    return "\n".join(lines) + "\n"
+
+def autograder_log(rng: random.Random, tests: int = 5) -> str:
+    """education/autograding-style log: 📝 / ✅ / ❌ blocks + Points trailer."""
+    out, passed = [], 0
+    for k in range(tests):
+        name = f"test_{IDENTS[k % len(IDENTS)]}"
+        out.append(f"📝 {name}\n")
+        if rng.random() < 0.7:
+            passed += 1
+            out.append(f"ok\n✅ {name}\n")
+        else:
+            out.append(f"Traceback (most recent call last):\n  File \"main.py\", line "
+                       f"{rng.randint(1, 99)}\nAssertionError\n❌ {name}\n")
+    out.append(f"Points {passed * 2}/{tests * 2}\n")
+    return "".join(out)
+
+def repo_files(rng: random.Random, files: int, functions: int):
+    return [(f"src/module_{k}.py" if k else "main.py", make_file(rng, functions))
+            for k in range(files)]
+
+def generate(conn, repos: int = 50, subs: int = 5, files: int = 4, *,
+             functions: int = 8, change_rate: float = 0.3, unreviewed: int = 1,
+             assignment: int = 101, seed: int = 0) -> dict:
+    """Fresh schema + cohort in `conn`; returns row counts."""
+    rng = random.Random(seed)
+    create_database.reset(conn)
+    migrations.migrate(conn)
+    cur = conn.cursor()
+    cur.execute("INSERT INTO assignments VALUES(?, 'Benchmark')", (assignment,))
+    t0 = datetime(2025, 1, 6, 9, 0)
+
+    for r in range(repos):
+        repo = f"hw{assignment}-student{r:04d}"
+        cur.execute("INSERT INTO students VALUES(?, '{}')", (repo,))
+        current = repo_files(rng, files, functions)
+        for s in range(subs):
+            if s:
+                current = [(n, mutate(rng, t) if rng.random() < change_rate else t)
+                           for n, t in current]
+            at = (t0 + timedelta(hours=r % 72, minutes=s * 37)).isoformat() + "Z"
+            sid = cur.execute(
+                "INSERT INTO submissions(student_repo, assignment_id, code, submitted_at) "
+                "VALUES (?,?,NULL,?)", (repo, assignment, at)).lastrowid
+            for name, text in current:
+                blobstore.add_code_file(cur, sid, name, text)
+            output = autograder_log(rng)
+            report = autograder.parse(output)
+            cur.execute(
+                "INSERT INTO autograder_outputs(submission_id, output, generated_at, "
+                "points, max_points) VALUES (?,?,?,?,?)",
+                (sid, output, at, report.points, report.max_points))
+            autograder.record(cur, sid, report, at)
+            reviewed = s < subs - unreviewed
+            cur.execute(
+                """INSERT INTO feedback(submission_id, repo_name, feedback_text, generated_at,
+                                        reviewed, teacher_comments, reviewed_at)
+                   VALUES (?,?,?,?,?,?,?)""",
+                (sid, repo, "".join(rng.choice(FEEDBACK) for _ in range(rng.randint(4, 12))),
+                 at, int(reviewed), rng.choice(COMMENTS) if reviewed else None,
+                 at if reviewed else None))
+        conn.commit()
+
+    repo_summary.rebuild(conn)
+    similarity.rebuild(conn)
+    near_dupes.rebuild(conn)
+    conn.commit()
+    return {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+            for t in ("submissions", "code_files", "blobs", "feedback", "sim_vectors")}
+
+def write_checkout(logs_dir: Path, files, autograder: str = "Points 7/10\n",
+                   readme: str = "# Benchmark assignment\n") -> Path:
+    """A ~/logs-shaped directory that control_code.grade() accepts."""
+    code = Path(logs_dir) / "studentcode"
+    for name, text in files:
+        p = code / name
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(text, encoding="utf-8")
+    (Path(logs_dir) / "autograder_output.txt").write_text(autograder, encoding="utf-8")
+    (Path(logs_dir) / "README.md").write_text(readme, encoding="utf-8")
+    return Path(logs_dir)
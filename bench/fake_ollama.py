@@ -0,0 +1,123 @@
+"""
+Stand-in for the Ollama daemon: POST /api/generate and GET /api/tags.
+
+Each generation sleeps `load_ms` + prompt_tokens / `prompt_tps` +
+`tokens` / `tps` and returns the same counters and durations as Ollama,
+so llm_client and control_code see realistic timings.  `"stream": true`
+is answered with NDJSON chunks, one per word.  `parallel` caps concurrent
+generations like $OLLAMA_NUM_PARALLEL (0 = unlimited).
+"""
+
+import json, time, threading, http.server
+
+WORDS = ("Consider", "what", "happens", "when", "the", "input", "is", "empty", "—",
+         "does", "your", "loop", "still", "terminate", "?", "Which", "test", "covers",
+         "that", "edge", "case", "?")
+
+class FakeOllama:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, *, load_ms: float = 0,
+                 prompt_tps: float = 2000, tps: float = 40, tokens: int = 120,
+                 fail_every: int = 0, parallel: int = 0):
+        self.load_ms, self.prompt_tps, self.tps = load_ms, prompt_tps, tps
+        self.tokens, self.fail_every = tokens, fail_every
+        self._slots = threading.BoundedSemaphore(parallel) if parallel else None
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.server = http.server.ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def address(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self) -> "FakeOllama":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ──────────────────────── request handling ────────────────────
+    def _handler(self):
+        fake = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, ctype="application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path != "/api/tags":
+                    return self._send(404, b"{}")
+                self._send(200, json.dumps({"models": [{"name": "bench"}]}).encode())
+
+            def do_POST(self):
+                if self.path != "/api/generate":
+                    return self._send(404, b"{}")
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with fake._lock:
+                    fake.requests += 1
+                    n = fake.requests
+                if fake.fail_every and n % fake.fail_every == 0:
+                    return self._send(503, b'{"error":"busy"}')
+                if fake._slots is None:
+                    return fake._generate(self, body)
+                with fake._slots:
+                    fake._generate(self, body)
+
+        return Handler
+
+    def _generate(self, h, body: dict) -> None:
+        prompt_tokens = max(1, len(body.get("prompt", "")) // 4)
+        load_s = self.load_ms / 1000
+        prompt_s = prompt_tokens / self.prompt_tps
+        eval_s = self.tokens / self.tps
+        words = [WORDS[i % len(WORDS)] for i in range(self.tokens)]
+        stats = {
+            "model": body.get("model", ""), "done": True,
+            "prompt_eval_count": prompt_tokens, "eval_count": self.tokens,
+            "load_duration": int(load_s * 1e9),
+            "prompt_eval_duration": int(prompt_s * 1e9),
+            "eval_duration": int(eval_s * 1e9),
+            "total_duration": int((load_s + prompt_s + eval_s) * 1e9),
+        }
+        time.sleep(load_s + prompt_s)
+        if not body.get("stream", True):
+            time.sleep(eval_s)
+            out = dict(stats, response=" ".join(words))
+            return h._send(200, json.dumps(out).encode())
+
+        h.send_response(200)
+        h.send_header("Content-Type", "application/x-ndjson")
+        h.send_header("Transfer-Encoding", "chunked")
+        h.end_headers()
+
+        def chunk(obj):
+            data = (json.dumps(obj) + "\n").encode()
+            h.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            h.wfile.flush()
+
+        for i, w in enumerate(words):
+            time.sleep(1 / self.tps)
+            chunk({"model": stats["model"], "response": (" " if i else "") + w,
+                   "done": False})
+        chunk(dict(stats, response=""))
+        h.wfile.write(b"0\r\n\r\n")
@@ -0,0 +1,154 @@
+"""
+Timed scenarios against a generated cohort.
+
+Every scenario is a zero-argument callable run `repeat` times; the JSON
+result keeps min / median / p95 / mean wall time in milliseconds.  The
+environment ($AGLLM_DB, $OLLAMA_HOST, $HOME) must point at the bench
+sandbox before this module is imported (bench/__main__.py does that).
+"""
+
+import os, io, time, random, statistics
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import control_code, database_retrieve, db, llm_pool, search_db, search_index, teacher_ui
+from bench import cohort
+from bench.fake_ollama import FakeOllama
+
+def timed(fn, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - t) * 1000)
+    runs.sort()
+    return {"n": repeat,
+            "min_ms": round(runs[0], 3),
+            "median_ms": round(statistics.median(runs), 3),
+            "p95_ms": round(runs[min(len(runs) - 1, int(len(runs) * 0.95))], 3),
+            "mean_ms": round(statistics.fmean(runs), 3)}
+
+def _quiet(fn):
+    def run():
+        with redirect_stdout(io.StringIO()):
+            return fn()
+    return run
+
+# ─────────────────────────── scenario groups ────────────────────
+def grading(work: Path, repeat: int, files: int, functions: int, seed: int) -> dict:
+    """control_code.grade() end to end (fake LLM): new repo, cached, follow-up."""
+    rng = random.Random(seed + 1)
+    counter = iter(range(10 ** 6))
+    state = {}
+
+    def new_repo():
+        i = next(counter)
+        state["files"] = cohort.repo_files(rng, files, functions)
+        state["logs"] = cohort.write_checkout(work / f"logs{i}", state["files"])
+        state["repo"] = f"bench-new{i:04d}"
+        control_code.grade(state["repo"], state["logs"])
+
+    def cached():
+        control_code.grade(state["repo"], state["logs"])
+
+    def follow_up():
+        name, text = state["files"][0]
+        state["files"][0] = (name, cohort.mutate(rng, text))
+        cohort.write_checkout(state["logs"], state["files"][:1])
+        control_code.grade(state["repo"], state["logs"])
+
+    out = {}
+    for name, fn in (("grade.new_repo", new_repo), ("grade.cached", cached),
+                     ("grade.follow_up", follow_up)):
+        out[name] = timed(_quiet(fn), repeat)
+    return out
+
+def teacher_routes(repeat: int) -> dict:
+    """Flask test client against the main teacher_ui routes."""
+    client = teacher_ui.create_app().test_client()
+    repo = db.query_one("SELECT repo_name FROM repo_summary ORDER BY unreviewed DESC, "
+                        "repo_name LIMIT 1")[0]
+    sid = db.query_one("SELECT MAX(id) FROM submissions WHERE student_repo = ?",
+                       (repo,))[0]
+    first = client.get(f"/repo/{repo}")
+    files = client.get(f"/submission/{sid}/files")
+    etag = files.headers.get("ETag", "")
+    fids = iter(r[0] for r in db.query("SELECT id FROM feedback WHERE reviewed = 0"))
+
+    def ok(resp, *codes):
+        assert resp.status_code in (codes or (200,)), resp.status_code
+        return resp
+
+    def review():
+        fid = next(fids, None)
+        if fid is not None:
+            ok(client.post(f"/review/{fid}", data={"teacher_comments": "bench: edge case"}),
+               302)
+
+    scenarios = {
+        "ui.home":        lambda: ok(client.get("/")),
+        "ui.repo":        lambda: ok(client.get(f"/repo/{repo}")),
+        "ui.files":       lambda: ok(client.get(f"/submission/{sid}/files")),
+        "ui.files_304":   lambda: ok(client.get(f"/submission/{sid}/files",
+                                                headers={"If-None-Match": etag}), 304),
+        "ui.search":      lambda: ok(client.get("/search?q=recursion+depth")),
+        "ui.metrics":     lambda: ok(client.get("/metrics")),
+        "ui.dashboard":   lambda: ok(client.get("/dashboard")),
+        "ui.review":      review,
+    }
+    assert first.status_code == 200
+    return {name: timed(fn, repeat) for name, fn in scenarios.items()}
+
+def queries(repeat: int) -> dict:
+    """search_db / search_index / database_retrieve read paths."""
+    conn = db.connect()
+    repo, sid = conn.execute("SELECT student_repo, MAX(id) FROM submissions "
+                             "GROUP BY student_repo ORDER BY COUNT(*) DESC LIMIT 1").fetchone()
+    pattern = repo.split("-")[0] + "-*"
+
+    def search(text, **kw):
+        return lambda: search_index.search(conn, text, **kw)
+
+    out = {
+        "search_db.page":      timed(lambda: search_db.fetch_page(repo, 20, 0), repeat),
+        "search_db.show":      timed(lambda: search_db.fetch_submission(sid), repeat),
+        "search.feedback":     timed(search("recursion depth", scope="feedback"), repeat),
+        "search.code":         timed(search("import sys", scope="code", repo=pattern), repeat),
+        "search.all_deep":     timed(search("loop", offset=200), repeat),
+        "export.jsonl":        timed(lambda: database_retrieve.export(
+                                         os.devnull, "jsonl"), max(1, repeat // 5)),
+        "export.csv_no_code":  timed(lambda: database_retrieve.export(
+                                         os.devnull, "csv", with_code=False),
+                                     max(1, repeat // 5)),
+    }
+    conn.close()
+    return out
+
+def pool(repeat: int, requests: int = 8, tokens: int = 20, tps: float = 400) -> dict:
+    """llm_pool.Pool over 1 / 2 / 4 fake daemons that each run one generation
+    at a time: a burst of `requests` concurrent calls, plus failover."""
+    out = {}
+    for n in (1, 2, 4):
+        fakes = [FakeOllama(tokens=tokens, tps=tps, parallel=1).start() for _ in range(n)]
+        p = llm_pool.Pool([llm_pool.Backend(f.address, "bench", 1) for f in fakes],
+                          probe_secs=0)
+        with ThreadPoolExecutor(requests) as ex:
+            def burst():
+                list(ex.map(lambda _: p.generate("bench prompt"), range(requests)))
+            out[f"pool.burst_{n}_backend{'s' if n > 1 else ''}"] = timed(_quiet(burst), repeat)
+        for f in fakes:
+            f.stop()
+
+    # one of two daemons is gone: every call that lands on it fails over
+    live, dead = (FakeOllama(tokens=tokens, tps=tps).start() for _ in range(2))
+    dead.stop()
+    backends = [llm_pool.Backend(dead.address, "bench", 1), llm_pool.Backend(live.address,
+                                                                           "bench", 1)]
+    def failover():
+        for b in backends:
+            b.healthy = True                 # as if the prober had just passed it
+        llm_pool.Pool(backends, probe_secs=0).generate("bench prompt")
+    out["pool.failover"] = timed(_quiet(failover), repeat)
+    live.stop()
+    return out
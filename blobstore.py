@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+blobstore.py
+────────────────────────────────────────────────────────────
+Content-addressed storage for submitted source files.
+
+    blobs       hash (sha256 of the UTF-8 text) → optionally zlib'd bytes
+    code_files  filename + blob_hash  (code column left empty)
+
+An unchanged file is stored once no matter how many pushes contain it.
+`submissions.code` is no longer written; `submission_code()` rebuilds the
+legacy "File: …" blob from code_files on demand (old rows keep their text).
+
+CLI:  python3 blobstore.py --migrate   # move existing rows into blobs
+"""
+
+import os, zlib, sqlite3, hashlib, argparse
+
+import db
+
+# ─────────────────────────── config ─────────────────────────────
+COMPRESS      = os.getenv("AGLLM_BLOB_COMPRESS", "1") != "0"
+MIN_COMPRESS  = 256             # bytes; smaller blobs are stored raw
+
+DDL = """
+CREATE TABLE IF NOT EXISTS blobs (
+  hash       TEXT PRIMARY KEY,          -- sha256 hex of the UTF-8 text
+  size       INTEGER NOT NULL,          -- uncompressed length in bytes
+  compressed INTEGER NOT NULL DEFAULT 0,
+  data       BLOB    NOT NULL
+);
+"""
+
+# ─────────────────────────── schema ─────────────────────────────
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    conn.executescript(DDL)
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(code_files)")}
+    if cols and "blob_hash" not in cols:
+        conn.execute("ALTER TABLE code_files ADD COLUMN blob_hash TEXT REFERENCES blobs(hash)")
+    conn.commit()
+
+# ─────────────────────────── encode / decode ────────────────────
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def decode(data, compressed) -> str:
+    if data is None:
+        return None
+    if compressed:
+        data = zlib.decompress(data)
+    return bytes(data).decode("utf-8")
+
+def put(cur, text: str) -> str:
+    """Store `text` once, return its hash."""
+    h = text_hash(text)
+    if cur.execute("SELECT 1 FROM blobs WHERE hash = ?", (h,)).fetchone():
+        return h
+    raw = text.encode("utf-8")
+    data, compressed = raw, 0
+    if COMPRESS and len(raw) >= MIN_COMPRESS:
+        z = zlib.compress(raw, 6)
+        if len(z) < len(raw):
+            data, compressed = z, 1
+    cur.execute("INSERT INTO blobs(hash, size, compressed, data) VALUES (?,?,?,?)",
+                (h, len(raw), compressed, data))
+    return h
+
+def get(cur, h: str) -> str:
+    row = cur.execute("SELECT data, compressed FROM blobs WHERE hash = ?", (h,)).fetchone()
+    return decode(*row) if row else None
+
+def link_code_file(cur, submission_id: int, filename: str, h: str) -> None:
+    cur.execute(
+        "INSERT INTO code_files(submission_id, filename, code, blob_hash) VALUES (?,?,?,?)",
+        (submission_id, filename, "", h)
+    )
+
+def add_code_file(cur, submission_id: int, filename: str, text: str) -> str:
+    h = put(cur, text)
+    link_code_file(cur, submission_id, filename, h)
+    return h
+
+# ─────────────────────────── readers ────────────────────────────
+FILES_SQL = """
+    SELECT cf.filename, cf.code, b.data, b.compressed
+      FROM code_files cf
+ LEFT JOIN blobs b ON b.hash = cf.blob_hash
+     WHERE cf.submission_id = ?
+  ORDER BY cf.id
+"""
+
+def file_code(code, data, compressed) -> str:
+    """Text of one code_files row joined against blobs (legacy rows inline)."""
+    return decode(data, compressed) if data is not None else (code or "")
+
+def submission_files(cur, submission_id: int):
+    """[(filename, text), …] for one submission."""
+    return [(name, file_code(code, data, comp))
+            for name, code, data, comp in cur.execute(FILES_SQL, (submission_id,))]
+
+def submission_code(cur, submission_id: int, legacy: str = None) -> str:
+    """The legacy concatenated blob: stored text if present, else rebuilt."""
+    if legacy:
+        return legacy
+    return "".join(f"File: {name}\n{text}\n\n"
+                   for name, text in submission_files(cur, submission_id))
+
+# ─────────────────────────── migration ──────────────────────────
+def migrate(conn: sqlite3.Connection) -> tuple:
+    """Move inline code_files.code into blobs; drop derivable submissions.code."""
+    ensure_schema(conn)
+    cur = conn.cursor()
+    moved = 0
+    rows = conn.execute(
+        "SELECT id, code FROM code_files WHERE blob_hash IS NULL").fetchall()
+    for fid, code in rows:
+        cur.execute("UPDATE code_files SET blob_hash = ?, code = '' WHERE id = ?",
+                    (put(cur, code or ""), fid))
+        moved += 1
+    cleared = 0
+    for sid, legacy in conn.execute(
+            "SELECT id, code FROM submissions WHERE code IS NOT NULL").fetchall():
+        if submission_code(cur, sid) == legacy:
+            cur.execute("UPDATE submissions SET code = NULL WHERE id = ?", (sid,))
+            cleared += 1
+    conn.commit()
+    return moved, cleared
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Deduplicated code storage maintenance.")
+    ap.add_argument("--migrate", action="store_true",
+                    help="move existing code_files/submissions text into blobs")
+    args = ap.parse_args()
+
+    conn = db.connect()
+    ensure_schema(conn)
+    if args.migrate:
+        moved, cleared = migrate(conn)
+        print(f"✅ {moved} code_files rows moved to blobs, "
+              f"{cleared} submissions.code blobs now derived")
+    n, size, stored = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size),0), COALESCE(SUM(length(data)),0) FROM blobs"
+    ).fetchone()
+    print(f"{n} blobs, {size / 1024:.1f} KiB text in {stored / 1024:.1f} KiB on disk")
+    conn.close()
@@ -3,38 +3,62 @@
 control_code.py  v1.4
 ────────────────────────────────────────────────────────────
 • Collects student repo name from CLI
-• Reads *all* source files under ~/logs/studentcode  (language-agnostic)
-• Detects perfect autograder scores
-• Retrieves last 3 teacher-reviewed comments for the repo
-• Sends a retrieval-augmented prompt to Ollama (“ux1” model)
-• Writes markdown feedback to ~/logs/feedback.md
+• Streams the text files under ~/logs/studentcode  (language-agnostic,
+  binary/oversized/ignored files skipped – see ingest.py)
+  and packs the most relevant ones into a token budget (prompt_packer)
+• Parses the autograder log into per-test results (autograder.py); only
+  failing tests' excerpts go into the prompt
+• Runs the agllm.ini [rules] static checks (rules.py); a perfect score
+  with no findings gets templated feedback and skips the LLM entirely
+• MinHash-indexes the push against other students' code (near_dupes.py)
+• Adds teacher comments on the most similar reviewed submissions of any
+  repo to the prompt, within a token budget (similarity.py)
+• On follow-up pushes sends only the diff against the previous submission
+  plus its feedback (diff_prompt)
+• Sends a retrieval-augmented prompt to Ollama (“ux1” model) over HTTP,
+  unless an identical prompt was already answered (llm_cache)
+• Streams the answer into ~/logs/feedback.md and a 'streaming' feedback
+  row as it is generated (feedback_stream.py); failures keep the partial text
 • Persists rows into:
 
-    submissions      (legacy `code` column kept)
-    code_files       (one row per file)
-    autograder_outputs
-    feedback         (repo_name + reviewed flag)
+    submissions      (legacy `code` column now derived, see blobstore.py)
+    code_files       (one row per file → deduplicated `blobs`)
+    autograder_outputs  (+ autograder_results, one row per test)
+    feedback         (repo_name + reviewed flag + from_cache + status)
 
-SQLite path defaults to $HOME/agllmdatabase.db (overridable with $AGLLM_DB).
+Normally run by the job_queue.py worker via grade(); `control_code.py <repo>`
+still grades ~/logs synchronously.
+
+SQLite access goes through db.py ($AGLLM_DB, else $HOME/agllmdatabase.db).
+Ollama address comes from $OLLAMA_HOST, or $AGLLM_LLM_POOL for several
+daemons (see llm_client.py / llm_pool.py).
 """
 
-import os, sys, sqlite3, subprocess, shutil, re
+import os, sys, sqlite3, shutil
 from pathlib import Path
 from datetime import datetime
 
+import db, llm_cache, blobstore, prompt_packer, ingest, diff_prompt, repo_summary
+import autograder, feedback_stream, llm_pool, near_dupes, rules, search_index, similarity
+import metrics, migrations
+from llm_client import LLMError
+
 # ─────────────────────────── config ─────────────────────────────
-DB_PATH         = os.getenv("AGLLM_DB",
-                             os.path.join(os.getenv("HOME"), "agllmdatabase.db"))
 LOGS_DIR        = Path(os.getenv("HOME") or ".").joinpath("logs")
-STUDENT_CODE_DIR= LOGS_DIR / "studentcode"
-AUTO_FILE       = LOGS_DIR / "autograder_output.txt"
-README_FILE     = LOGS_DIR / "README.md"
-FEEDBACK_MD     = LOGS_DIR / "feedback.md"
+# relative to LOGS_DIR (or a job's spool copy of it, see job_queue.py)
+STUDENT_CODE_SUB= "studentcode"
+AUTO_NAME       = "autograder_output.txt"
+README_NAME     = "README.md"
+FEEDBACK_NAME   = "feedback.md"
 ASSIGNMENT_ID   = 101
 TEST_ID         = 1001          # reserved for future use
-OLLAMA_MODEL    = "ux1"
+OLLAMA_MODEL    = os.getenv("OLLAMA_MODEL", "ux1")
+
 
 # ─────────────────────────── helpers ────────────────────────────
+class GradingError(RuntimeError):
+    """A submission could not be graded (bad input, LLM or DB failure)."""
+
 def err(msg: str):
     print(f"❌ {msg}", file=sys.stderr)
     sys.exit(1)
@@ -48,146 +72,298 @@ def read_file(path: Path) -> str:
     print(f"Warning: could not decode {path.name}")
     return ""
 
-def run_ollama(prompt: str) -> str:
-    res = subprocess.run(
-        ["ollama", "run", OLLAMA_MODEL],
-        input=prompt,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
-    )
-    if res.returncode != 0:
-        err(f"Ollama error ⇒ {res.stderr.strip()}")
-    return res.stdout
+def run_ollama(prompt: str, spans: metrics.Spans = None, on_token=None) -> str:
+    """Generate feedback; with on_token the answer is streamed chunk by chunk."""
+    try:
+        res = llm_pool.default().generate(prompt, on_token=on_token,
+                                          options=prompt_packer.LLM_OPTIONS)
+    except LLMError as e:
+        raise GradingError(f"Ollama error ⇒ {e}")
+    print(f"🤖  {res.prompt_eval_count} prompt / {res.eval_count} output tokens, "
+          f"{res.total_duration / 1e9:.1f}s ({res.tokens_per_sec:.1f} tok/s) via {res.backend}")
+    if spans is not None:
+        spans.set("llm.prompt_eval_count", res.prompt_eval_count)
+        spans.set("llm.eval_count", res.eval_count)
+        spans.set("llm.tokens_per_sec", res.tokens_per_sec)
+        spans.set("llm.load_ms", res.load_duration / 1e6)
+    return res.text
 
 def is_perfect_score(text: str) -> bool:
     """True if autograder gave full marks."""
-    if "All tests passed" in text:
-        return True
-    m = re.search(r"Points\s+(\d+)\s*/\s*(\d+)", text, re.I)
-    return bool(m and m.group(1) == m.group(2))
+    return autograder.parse(text).perfect
 
 # ─────────────────────────── main flow ──────────────────────────
-def main() -> None:
-    # 0️⃣ repo name
-    if len(sys.argv) < 2:
-        err("Usage: control_code.py <repo_name>")
-    repo_name = sys.argv[1]
+def grade(repo_name: str, logs_dir: Path = LOGS_DIR) -> int:
+    """Grade the checkout in logs_dir; returns the new submission id."""
+    conn = db.get()                 # this thread's shared WAL connection
+    try:
+        return _grade(conn, repo_name, Path(logs_dir))
+    except BaseException:
+        conn.rollback()
+        raise
 
-    # 1️⃣ gather every file in studentcode/
-    if not STUDENT_CODE_DIR.is_dir():
-        err(f"{STUDENT_CODE_DIR} not found")
-    code_files = sorted(
-        p for p in STUDENT_CODE_DIR.rglob("*")
-        if p.is_file() and not p.name.startswith(".")
-    )
-    if not code_files:
-        err(f"No files found in {STUDENT_CODE_DIR}")
+def _grade(conn: sqlite3.Connection, repo_name: str, logs_dir: Path) -> int:
+    student_code_dir = logs_dir / STUDENT_CODE_SUB
+    auto_file        = logs_dir / AUTO_NAME
+    readme_file      = logs_dir / README_NAME
+    feedback_md      = logs_dir / FEEDBACK_NAME
+    spans            = metrics.Spans()
 
-    student_code_blob = ""
-    for p in code_files:
-        student_code_blob += f"File: {p.relative_to(STUDENT_CODE_DIR)}\n"
-        student_code_blob += read_file(p) + "\n\n"
+    if not student_code_dir.is_dir():
+        raise GradingError(f"{student_code_dir} not found")
 
-    autograder_out   = read_file(AUTO_FILE)   if AUTO_FILE.exists() else ""
-    professor_instr  = read_file(README_FILE) if README_FILE.exists() else ""
+    autograder_out   = read_file(auto_file)   if auto_file.exists() else ""
+    professor_instr  = read_file(readme_file) if readme_file.exists() else ""
 
-    perfect          = is_perfect_score(autograder_out)
+    report           = autograder.parse(autograder_out,
+                                        autograder.load_points(logs_dir)
+                                        or autograder.load_points(student_code_dir))
+    perfect          = report.perfect
+    autograder_text  = autograder.prompt_section(report, autograder_out)
 
-    # 2️⃣  DB connection (for history + later inserts)
+    # 1️⃣  DB schema (for blobs + history + later inserts)
     ts   = datetime.utcnow().isoformat() + "Z"
-    conn = sqlite3.connect(DB_PATH)
+    with spans.span("schema"):
+        migrations.migrate(conn)             # no-op once schema + back-fills are current
+        llm_cache.ensure_schema(conn)
+        blobstore.ensure_schema(conn)
+        prompt_packer.ensure_schema(conn)
+        repo_summary.ensure_schema(conn)
+        search_index.ensure_schema(conn)     # FTS triggers fire on the inserts below
+        similarity.ensure_schema(conn)
+        metrics.ensure_schema(conn)
     cur  = conn.cursor()
 
-    # pull last 3 reviewed teacher comments
-    past_fb = cur.execute(
-        """
-        SELECT teacher_comments
-          FROM feedback
-         WHERE repo_name = ? AND reviewed = 1
-     ORDER BY reviewed_at DESC
-         LIMIT 3
-        """,
-        (repo_name,),
-    ).fetchall()
-    prior_feedback = "\n\n".join(row[0] for row in past_fb if row[0]) or "None so far."
+    # 2️⃣ stream studentcode/ once: each text file is hashed and goes to the
+    #    prompt list; binary / oversized / ignored files are skipped
+    file_texts, file_hashes, skipped = [], [], []
+    with spans.span("ingest"):
+        for f in ingest.iter_files(student_code_dir, ingest.load_config(logs_dir)):
+            if f.text is None:
+                skipped.append(prompt_packer.Omission(f.name, f.skipped, f.size // 4))
+                continue
+            file_texts.append((f.name, f.text))
+            file_hashes.append((f.name, blobstore.text_hash(f.text)))
+    if not file_texts:
+        raise GradingError(f"No files found in {student_code_dir}")
+    spans.set("files", len(file_texts))
+    spans.set("files_skipped", len(skipped))
+    spans.set("code_bytes", sum(len(t) for _, t in file_texts))
+    if skipped:
+        print(f"🚫  Skipped {len(skipped)} file(s): "
+              + ", ".join(f"{o.filename} ({o.action})" for o in skipped[:5])
+              + (" …" if len(skipped) > 5 else ""))
+
+    # static checks declared in agllm.ini [rules] (rules.py)
+    with spans.span("rules"):
+        ruleset  = rules.load_rules(logs_dir)
+        findings = rules.check(file_texts, ruleset)
+    spans.set("rule_findings", len(findings))
+    if findings:
+        print(f"📏  {len(findings)} rule finding(s): "
+              + ", ".join(str(f) for f in findings[:3]) + (" …" if len(findings) > 3 else ""))
+
+    omitted, from_cache, prompt = [], False, None
+    if perfect and ruleset.short_circuit and not findings:
+        # nothing left for the model to judge – templated congratulations
+        feedback_text = rules.perfect_feedback(ruleset, report.points, report.max_points,
+                                               repo_name)
+        spans.set("short_circuit", True)
+        print("🏁  Perfect score, all rule checks passed — LLM skipped")
+    else:
+        prompt, omitted = _prompt(cur, spans, repo_name, file_texts, perfect,
+                                  autograder_text, rules.prompt_section(ruleset, findings),
+                                  professor_instr)
+        # 4️⃣ reuse the answer to an identical prompt
+        with spans.span("cache"):
+            cache_key     = llm_cache.cache_key(prompt, OLLAMA_MODEL,
+                                                {**llm_cache.modelfile_params(),
+                                                 **prompt_packer.LLM_OPTIONS})
+            feedback_text = llm_cache.get(conn, cache_key)
+        from_cache = feedback_text is not None
+        spans.set("cache_hit", from_cache)
+        if from_cache:
+            print("♻️  Identical prompt seen before — reusing cached feedback")
+    conn.commit()
+
+    try:
+        # 5️⃣  insert DB rows first: the feedback row is visible while generating
+        #     (status 'streaming', see feedback_stream.py)
+        with spans.span("db_insert"):
+            resumed = feedback_stream.resumable(cur, repo_name, file_hashes, autograder_out)
+            if resumed:
+                submission_id, feedback_id = resumed
+                print(f"⏯️  Resuming unfinished feedback #{feedback_id}")
+            else:
+                # submissions row (legacy blob is derived from code_files on demand)
+                cur.execute(
+                    """INSERT INTO submissions
+                         (student_repo, assignment_id, code, submitted_at)
+                       VALUES (?,?,NULL,?)""",
+                    (repo_name, ASSIGNMENT_ID, ts)
+                )
+                submission_id = cur.lastrowid
+
+                # code_files → blobs, stored in this transaction: a blob that
+                # exists now may be an orphan that archive.py is about to drop
+                for name, text in file_texts:
+                    blobstore.add_code_file(cur, submission_id, name, text)
+                prompt_packer.record(cur, submission_id, skipped + omitted)
+
+                # autograder output
+                cur.execute(
+                    "INSERT INTO autograder_outputs"
+                    "(submission_id, output, generated_at, points, max_points) "
+                    "VALUES (?,?,?,?,?)",
+                    (submission_id, autograder_out, ts, report.points, report.max_points)
+                )
+                autograder.record(cur, submission_id, report, ts)
+
+                # feedback (reviewed = 0)
+                cur.execute(
+                    """INSERT INTO feedback
+                           (submission_id, repo_name, feedback_text, generated_at,
+                            from_cache, status)
+                       VALUES (?,?,?,?,?,?)""",
+                    (submission_id, repo_name, feedback_text or "", ts, int(from_cache),
+                     "streaming" if feedback_text is None else "done")
+                )
+                feedback_id = cur.lastrowid
+                repo_summary.refresh(cur, repo_name)
+
+                # near-duplicates in other repos of this assignment
+                dupes = near_dupes.add(cur, submission_id, repo_name, ASSIGNMENT_ID,
+                                       file_texts)
+                if dupes and dupes[0][0] >= near_dupes.FLAG_SCORE:
+                    print(f"👯  {dupes[0][0]:.0%} similar to {dupes[0][2]} "
+                          f"(submission {dupes[0][1]})")
+        conn.commit()
+
+        # 6️⃣  call LLM, streaming into feedback.md and the feedback row
+        writer = feedback_stream.Writer(conn, feedback_id, feedback_md,
+                                        f"# Feedback for {repo_name}\n\n")
+        if feedback_text is None:
+            try:
+                with spans.span("llm"):
+                    feedback_text = run_ollama(prompt, spans,
+                                               writer if feedback_stream.STREAM else None)
+            except BaseException:
+                conn.rollback()
+                writer.close("partial")      # keep what was generated so far
+                print(f"✂️  Partial feedback kept ({len(writer.text)} chars)",
+                      file=sys.stderr)
+                raise
+            if writer.first_token_ms is not None:
+                spans.set("llm.first_token_ms", writer.first_token_ms)
+            llm_cache.put(conn, cache_key, OLLAMA_MODEL, feedback_text)
+
+        # 7️⃣ final markdown (for GitHub commit) + row
+        with spans.span("write_md"):
+            writer.close("done", feedback_text, from_cache)
+        print(f"📄  Feedback saved → {feedback_md}")
+
+        spans.total()
+        metrics.record(cur, submission_id, spans)
+        conn.commit()
+        print(f"✅ Data inserted into {os.path.basename(db.DB_PATH)}")
+        print(f"⏱️  {spans.summary()}")
+    except sqlite3.Error as e:
+        conn.rollback()
+        raise GradingError(f"SQLite error → {e}")
+    return submission_id
+
+def _prompt(cur, spans: metrics.Spans, repo_name: str, file_texts, perfect: bool,
+            autograder_text: str, static_checks: str, professor_instr: str):
+    """Retrieval-augmented prompt; returns (prompt, omitted files)."""
+    # latest teacher comments on this repo + those on the most similar
+    # reviewed submissions (any repo)
+    with spans.span("history"):
+        prior_feedback = similarity.context(cur, file_texts, repo_name) or "None so far."
 
     # 3️⃣  build prompt
+    checks_section = (f"\n**Automated Requirement Checks**\n{static_checks}\n"
+                      if static_checks else "")
     if perfect:
         system_note = (
             "The autograder awarded a perfect score. Congratulate the student "
-            "briefly. THEN examine Professor Instructions: ask guiding questions "
-            "only if the code violates a requirement (e.g. banned libraries, "
-            "time complexity). Otherwise add no further guidance."
+            "briefly. THEN examine Professor Instructions and the Automated "
+            "Requirement Checks: ask guiding questions only if the code violates "
+            "a requirement (e.g. banned libraries, time complexity). Otherwise "
+            "add no further guidance."
         )
     else:
         system_note = (
             "Provide question-based guided feedback; do not supply final answers."
         )
-    
-    prompt = f"""{system_note}
+
+    # most relevant files first, the rest summarized/dropped to fit budget
+    with spans.span("pack"):
+        student_code_blob, omitted = prompt_packer.pack(
+            file_texts,
+            other_sections=(system_note + autograder_text + static_checks
+                            + professor_instr + prior_feedback),
+            autograder_out=autograder_text,
+            readme=professor_instr,
+            failing=not perfect,
+        )
+    if omitted:
+        print(f"✂️  {len(omitted)} file(s) summarized/dropped to fit "
+              f"{prompt_packer.PROMPT_TOKENS} prompt tokens")
+
+    # follow-up push: changed hunks + outline of the rest + last feedback
+    with spans.span("diff"):
+        delta = diff_prompt.build(cur, repo_name, file_texts, student_code_blob)
+    if delta:
+        code_delta, previous_fb = delta
+        omitted = []
+        print("🔁  Incremental prompt — diff against previous submission")
+        prompt = f"""{system_note} {diff_prompt.FOLLOW_UP_NOTE}
+
+
+**Changes Since Previous Submission**
+{code_delta}
+
+**Autograder Output**
+{autograder_text}
+{checks_section}
+**Professor Instructions**
+{professor_instr}
+
+**Previous Feedback (last push)**
+{previous_fb}
+
+**Teacher Feedback on Similar Submissions (for context)**
+{prior_feedback}
+"""
+    else:
+        prompt = f"""{system_note}
    
     
 **Student Code**
 {student_code_blob}
 
 **Autograder Output**
-{autograder_out}
-
+{autograder_text}
+{checks_section}
 **Professor Instructions**
 {professor_instr}
 
-**Recent Teacher Feedback (for context)**
+**Teacher Feedback on Similar Submissions (for context)**
 {prior_feedback}
 """
-    # 4️⃣ call LLM
-    feedback_text = run_ollama(prompt)
+    spans.set("prompt_tokens", prompt_packer.estimate_tokens(prompt))
+    spans.set("incremental", bool(delta))
 
-    # 5️⃣ write markdown (for GitHub commit)
-    FEEDBACK_MD.write_text(f"# Feedback for {repo_name}\n\n{feedback_text}",
-                           encoding="utf-8")
-    print(f"📄  Feedback saved → {FEEDBACK_MD}")
+    return prompt, omitted
 
-    # 6️⃣  insert DB rows
+def main() -> None:
+    # 0️⃣ repo name
+    if len(sys.argv) < 2:
+        err("Usage: control_code.py <repo_name>")
     try:
-        # submissions row (legacy full blob)
-        cur.execute(
-            """INSERT INTO submissions
-                 (student_repo, assignment_id, code, submitted_at)
-               VALUES (?,?,?,?)""",
-            (repo_name, ASSIGNMENT_ID, student_code_blob, ts)
-        )
-        submission_id = cur.lastrowid
-
-        # code_files
-        for p in code_files:
-            cur.execute(
-                "INSERT INTO code_files(submission_id, filename, code) VALUES (?,?,?)",
-                (submission_id, str(p.relative_to(STUDENT_CODE_DIR)), read_file(p))
-            )
-
-        # autograder output
-        cur.execute(
-            "INSERT INTO autograder_outputs(submission_id, output, generated_at) "
-            "VALUES (?,?,?)",
-            (submission_id, autograder_out, ts)
-        )
-
-        # feedback (reviewed = 0)
-        cur.execute(
-            """INSERT INTO feedback
-                   (submission_id, repo_name, feedback_text, generated_at)
-               VALUES (?,?,?,?)""",
-            (submission_id, repo_name, feedback_text, ts)
-        )
-
-        conn.commit()
-        print("✅ Data inserted into agllmdatabase.db")
-    except sqlite3.Error as e:
-        conn.rollback()
-        err(f"SQLite error → {e}")
-    finally:
-        conn.close()
+        grade(sys.argv[1])
+    except GradingError as e:
+        err(str(e))
 
 if __name__ == "__main__":
     main()
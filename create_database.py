@@ -1,93 +1,83 @@
-import sqlite3, os
+import sqlite3, argparse
 from datetime import datetime
 
-DB = os.path.join(os.getenv("HOME"), "agllmdatabase.db")
+import db, migrations, repo_summary
 
-DDL = """
-PRAGMA foreign_keys = ON;
+DB = db.DB_PATH
 
+# --reset only: wipes every AGLLM table (the schema is rebuilt by migrations.py)
+RESET = """
+DROP TABLE IF EXISTS fts_feedback;
+DROP TABLE IF EXISTS fts_code;
+DROP VIEW  IF EXISTS blob_text;
 DROP TABLE IF EXISTS students;
 DROP TABLE IF EXISTS assignments;
 DROP TABLE IF EXISTS submissions;
 DROP TABLE IF EXISTS code_files;
 DROP TABLE IF EXISTS feedback;
 DROP TABLE IF EXISTS autograder_outputs;
-
-CREATE TABLE students (
-  student_repo TEXT PRIMARY KEY,
-  additional_data TEXT
-);
-
-CREATE TABLE assignments (
-  id INTEGER PRIMARY KEY,
-  description TEXT NOT NULL
-);
-
-CREATE TABLE submissions (
-  id            INTEGER PRIMARY KEY,
-  student_repo  TEXT    NOT NULL REFERENCES students(student_repo),
-  assignment_id INTEGER NOT NULL REFERENCES assignments(id),
-  code TEXT,                     -- legacy single-blob (optional)
-  submitted_at TEXT NOT NULL
-);
-
-CREATE TABLE code_files (
-  id            INTEGER PRIMARY KEY,
-  submission_id INTEGER NOT NULL REFERENCES submissions(id),
-  filename      TEXT NOT NULL,
-  code          TEXT NOT NULL
-);
-
-CREATE TABLE feedback (
-  id            INTEGER PRIMARY KEY,
-  submission_id INTEGER NOT NULL REFERENCES submissions(id),
-  repo_name     TEXT    NOT NULL,
-  feedback_text TEXT    NOT NULL,
-  generated_at  TEXT    NOT NULL,
-  reviewed      INTEGER NOT NULL DEFAULT 0,
-  teacher_comments TEXT,
-  reviewed_at   TEXT
-);
-
-CREATE TABLE autograder_outputs (
-  id INTEGER PRIMARY KEY,
-  submission_id INTEGER NOT NULL REFERENCES submissions(id),
-  output TEXT NOT NULL,
-  generated_at TEXT NOT NULL
-);
-
-CREATE INDEX idx_feedback_repo  ON feedback(repo_name, reviewed);
-CREATE INDEX idx_codefiles_sub  ON code_files(submission_id);
+DROP TABLE IF EXISTS llm_cache;
+DROP TABLE IF EXISTS blobs;
+DROP TABLE IF EXISTS prompt_omissions;
+DROP TABLE IF EXISTS jobs;
+DROP TABLE IF EXISTS repo_summary;
+DROP TABLE IF EXISTS submission_flags;
+DROP TABLE IF EXISTS summary_meta;
+DROP TABLE IF EXISTS rendered;
+DROP TABLE IF EXISTS sim_vectors;
+DROP TABLE IF EXISTS run_metrics;
+DROP TABLE IF EXISTS autograder_results;
+DROP TABLE IF EXISTS analytics_daily;
+DROP TABLE IF EXISTS analytics_students;
+DROP TABLE IF EXISTS llm_backends;
+DROP TABLE IF EXISTS dupe_signatures;
+DROP TABLE IF EXISTS dupe_buckets;
+DROP TABLE IF EXISTS dupe_starter;
+DROP TABLE IF EXISTS dupe_repos;
+DROP TABLE IF EXISTS schema_backfills;
+PRAGMA user_version = 0;
 """
 
-def build_demo():
-    conn = sqlite3.connect(DB)
-    conn.executescript(DDL)
-    cur = conn.cursor()
+def reset(conn: sqlite3.Connection) -> None:
+    conn.executescript(RESET)
 
-    # demo rows -----------------------------------------------------
-    cur.execute("INSERT INTO students VALUES('repo1','{\"name\":\"Sample\"}')")
-    cur.execute("INSERT INTO assignments VALUES(1,'Demo')")
-    now = datetime.utcnow().isoformat()+'Z'
+def build_demo(wipe: bool = False):
+    """Upgrade the schema in place; demo rows only go into an empty database."""
+    conn = db.connect()
+    if wipe:
+        reset(conn)
+    for ver in migrations.migrate(conn):
+        print(f"⬆️  schema v{ver}")
 
-    cur.execute("""INSERT INTO submissions
-        (student_repo,assignment_id,submitted_at,code)
-        VALUES('repo1',1,?, 'print(123)')""", (now,))
-    sub_id = cur.lastrowid
-    cur.executemany(
-        "INSERT INTO code_files(submission_id,filename,code) VALUES (?,?,?)",
-        [
-          (sub_id,'main.py','print("Hello")'),
-          (sub_id,'utils.py','def add(a,b): return a+b')
-        ]
-    )
-    cur.execute("""INSERT INTO feedback
-        (submission_id,repo_name,feedback_text,generated_at)
-        VALUES(?,?,?,?)""",
-        (sub_id,'repo1','Great start – think about edge cases.',now))
+    cur = conn.cursor()
+    if cur.execute("SELECT 1 FROM submissions LIMIT 1").fetchone() is None:
+        # demo rows -------------------------------------------------
+        cur.execute("INSERT OR IGNORE INTO students VALUES('repo1','{\"name\":\"Sample\"}')")
+        cur.execute("INSERT OR IGNORE INTO assignments VALUES(1,'Demo')")
+        now = datetime.utcnow().isoformat()+'Z'
 
-    conn.commit();  conn.close()
+        cur.execute("""INSERT INTO submissions
+            (student_repo,assignment_id,submitted_at,code)
+            VALUES('repo1',1,?, 'print(123)')""", (now,))
+        sub_id = cur.lastrowid
+        cur.executemany(
+            "INSERT INTO code_files(submission_id,filename,code) VALUES (?,?,?)",
+            [
+              (sub_id,'main.py','print("Hello")'),
+              (sub_id,'utils.py','def add(a,b): return a+b')
+            ]
+        )
+        cur.execute("""INSERT INTO feedback
+            (submission_id,repo_name,feedback_text,generated_at)
+            VALUES(?,?,?,?)""",
+            (sub_id,'repo1','Great start – think about edge cases.',now))
+        repo_summary.refresh(cur, 'repo1', sub_id)
+        conn.commit()
+    conn.close()
     print("DB ready →", DB)
 
 if __name__ == "__main__":
-    build_demo()
+    ap = argparse.ArgumentParser(description="Create / upgrade the AGLLM database.")
+    ap.add_argument("--reset", action="store_true",
+                    help="drop every table first (destroys all grading history)")
+    build_demo(ap.parse_args().reset)
@@ -1,20 +1,28 @@
 import sqlite3
 import os
+import io
+import csv
+import sys
+import gzip
+import json
+import heapq
 import argparse
 
+import archive, blobstore, db
+
 def generate_markdown(student_repo):
-    """Generate Markdown output for a specific student repository."""
-    db_path = os.path.join(os.getenv("HOME"), "agllmdatabase.db")  # Path to the database
+    """Generate Markdown output for a specific student repository (archived pushes included)."""
     output_file = os.path.expanduser(f"~/student_data_{student_repo}.md")  # Output file for markdown
     conn = None
 
     try:
-        conn = sqlite3.connect(db_path)
+        conn = db.connect()
         cursor = conn.cursor()
+        archived = list(archive.records(student_repo=student_repo))
 
         # Check if the student_repo exists
         cursor.execute("SELECT 1 FROM submissions WHERE student_repo = ? LIMIT 1", (student_repo,))
-        if not cursor.fetchone():
+        if not cursor.fetchone() and not archived:
             print(f"No data found for student repository: {student_repo}")
             return
 
@@ -27,7 +35,16 @@ def generate_markdown(student_repo):
                 FROM submissions
                 WHERE student_repo = ?
             """, (student_repo,))
-            submissions = cursor.fetchall()
+            submissions = [(sid, aid, blobstore.submission_code(conn, sid, code), at)
+                           for sid, aid, code, at in cursor.fetchall()]
+            hot = {sub[0] for sub in submissions}
+            archived = [rec for rec in archived if rec["submission"]["id"] not in hot]
+            for rec in archived:
+                sub = rec["submission"]
+                code = sub["code"] or "".join(f"File: {f['filename']}\n{f['code']}\n\n"
+                                              for f in rec["files"])
+                submissions.append((sub["id"], sub["assignment_id"], code, sub["submitted_at"]))
+            submissions.sort()
             file.write("## Submissions\n\n")
             for submission in submissions:
                 file.write(f"- **Submission ID**: {submission[0]}\n")
@@ -42,7 +59,9 @@ def generate_markdown(student_repo):
                 JOIN submissions s ON f.submission_id = s.id
                 WHERE s.student_repo = ?
             """, (student_repo,))
-            feedbacks = cursor.fetchall()
+            feedbacks = sorted(cursor.fetchall() + [
+                (f["id"], f["submission_id"], f["feedback_text"], f["generated_at"])
+                for rec in archived for f in rec["feedback"]])
             file.write("## Feedback\n\n")
             for feedback in feedbacks:
                 file.write(f"- **Feedback ID**: {feedback[0]}\n")
@@ -57,7 +76,9 @@ def generate_markdown(student_repo):
                 JOIN submissions s ON a.submission_id = s.id
                 WHERE s.student_repo = ?
             """, (student_repo,))
-            autograder_outputs = cursor.fetchall()
+            autograder_outputs = sorted(cursor.fetchall() + [
+                (a["id"], a["submission_id"], a["output"], a["generated_at"])
+                for rec in archived for a in rec["autograder_outputs"]])
             file.write("## Autograder Outputs\n\n")
             for output in autograder_outputs:
                 file.write(f"- **Output ID**: {output[0]}\n")
@@ -73,11 +94,204 @@ def generate_markdown(student_repo):
         if conn:
             conn.close()
 
+# ─────────────────────────── bulk export ────────────────────────
+# One pass over each table, every cursor ordered by submission id and
+# merged in Python: memory stays constant however large the cohort is.
+# Archived submissions (archive.py) are merged into the same id order.
+
+CSV_FIELDS = ["submission_id", "student_repo", "assignment_id", "submitted_at",
+              "feedback_id", "generated_at", "reviewed", "reviewed_at",
+              "teacher_comments", "feedback_text", "autograder_output", "code"]
+
+def _where(assignment=None, since=None, until=None, reviewed=None, repo=None):
+    sql, args = ["1 = 1"], []
+    if assignment is not None:
+        sql.append("s.assignment_id = ?"); args.append(assignment)
+    if since:
+        sql.append("s.submitted_at >= ?"); args.append(since)
+    if until:
+        sql.append("s.submitted_at < ?"); args.append(until)
+    if repo:
+        sql.append("s.student_repo GLOB ?"); args.append(repo)
+    if reviewed is not None:
+        sql.append("EXISTS (SELECT 1 FROM feedback r "
+                   "WHERE r.submission_id = s.id AND r.reviewed = ?)")
+        args.append(int(reviewed))
+    return " AND ".join(sql), args
+
+class _Follow:
+    """Child rows (first column = submission id) consumed in step with the parent."""
+
+    def __init__(self, cursor):
+        self.rows = iter(cursor)
+        self.head = next(self.rows, None)
+
+    def take(self, sid):
+        out = []
+        while self.head is not None and self.head[0] <= sid:
+            if self.head[0] == sid:
+                out.append(self.head[1:])
+            self.head = next(self.rows, None)
+        return out
+
+def _archived(rec, with_code):
+    """An archive.records() entry in iter_submissions() form."""
+    sub = rec["submission"]
+    out = {
+        "submission_id": sub["id"], "student_repo": sub["student_repo"],
+        "assignment_id": sub["assignment_id"], "submitted_at": sub["submitted_at"],
+        "feedback": [dict(id=f["id"], feedback_text=f["feedback_text"],
+                          generated_at=f["generated_at"], reviewed=bool(f["reviewed"]),
+                          reviewed_at=f["reviewed_at"], teacher_comments=f["teacher_comments"])
+                     for f in rec["feedback"]],
+        "autograder": [dict(output=a["output"], generated_at=a["generated_at"])
+                       for a in rec["autograder_outputs"]],
+    }
+    if with_code:
+        out["files"] = [dict(filename=f["filename"], code=f["code"]) for f in rec["files"]]
+        if not out["files"] and sub["code"]:
+            out["files"] = [dict(filename="submission.py", code=sub["code"])]
+    return out
+
+def iter_submissions(conn, with_code=True, **filters):
+    """Yield one dict per matching submission (hot and archived), in id order."""
+    cold = (_archived(rec, with_code) for rec in archive.records(**filters))
+    last = None
+    for rec in heapq.merge(_iter_hot(conn, with_code, **filters), cold,
+                           key=lambda r: r["submission_id"]):
+        if rec["submission_id"] != last:          # archived copy of a hot row: hot wins
+            last = rec["submission_id"]
+            yield rec
+
+def _iter_hot(conn, with_code=True, **filters):
+    where, args = _where(**filters)
+    subs = conn.execute(f"""
+        SELECT s.id, s.student_repo, s.assignment_id, s.submitted_at, s.code
+          FROM submissions s WHERE {where} ORDER BY s.id""", args)
+    fbs = _Follow(conn.execute(f"""
+        SELECT f.submission_id, f.id, f.feedback_text, f.generated_at, f.reviewed,
+               f.reviewed_at, f.teacher_comments
+          FROM feedback f JOIN submissions s ON s.id = f.submission_id
+         WHERE {where} ORDER BY f.submission_id, f.id""", args))
+    outs = _Follow(conn.execute(f"""
+        SELECT a.submission_id, a.output, a.generated_at
+          FROM autograder_outputs a JOIN submissions s ON s.id = a.submission_id
+         WHERE {where} ORDER BY a.submission_id, a.id""", args))
+    files = _Follow(conn.execute(f"""
+        SELECT cf.submission_id, cf.filename, cf.code, b.data, b.compressed
+          FROM code_files cf JOIN submissions s ON s.id = cf.submission_id
+     LEFT JOIN blobs b ON b.hash = cf.blob_hash
+         WHERE {where} ORDER BY cf.submission_id, cf.id""", args)) if with_code else None
+
+    for sid, repo, aid, at, legacy in subs:
+        rec = {
+            "submission_id": sid, "student_repo": repo,
+            "assignment_id": aid, "submitted_at": at,
+            "feedback": [dict(id=f[0], feedback_text=f[1], generated_at=f[2],
+                              reviewed=bool(f[3]), reviewed_at=f[4],
+                              teacher_comments=f[5]) for f in fbs.take(sid)],
+            "autograder": [dict(output=o[0], generated_at=o[1]) for o in outs.take(sid)],
+        }
+        if files is not None:
+            rec["files"] = [dict(filename=name, code=blobstore.file_code(code, data, comp))
+                            for name, code, data, comp in files.take(sid)]
+            if not rec["files"] and legacy:
+                rec["files"] = [dict(filename="submission.py", code=legacy)]
+        yield rec
+
+def _write_jsonl(out, records):
+    for rec in records:
+        out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+def _write_csv(out, records):
+    """One row per submission: latest feedback + latest autograder output."""
+    w = csv.DictWriter(out, fieldnames=CSV_FIELDS, extrasaction="ignore")
+    w.writeheader()
+    for rec in records:
+        fb = rec["feedback"][-1] if rec["feedback"] else {}
+        row = dict(rec, **{k: v for k, v in fb.items() if k != "id"},
+                   feedback_id=fb.get("id"),
+                   autograder_output=rec["autograder"][-1]["output"] if rec["autograder"] else "")
+        if fb:
+            row["reviewed"] = int(fb["reviewed"])
+        if "files" in rec:
+            row["code"] = "".join(f"File: {f['filename']}\n{f['code']}\n\n" for f in rec["files"])
+        w.writerow(row)
+
+def _write_md(out, records):
+    for rec in records:
+        out.write(f"## {rec['student_repo']} — submission {rec['submission_id']}\n\n")
+        out.write(f"- **Assignment ID**: {rec['assignment_id']}\n")
+        out.write(f"- **Submitted At**: {rec['submitted_at']}\n\n")
+        for f in rec.get("files", []):
+            out.write(f"### {f['filename']}\n```\n{f['code']}\n```\n\n")
+        for f in rec["feedback"]:
+            out.write(f"### Feedback {f['id']} ({f['generated_at']})\n\n{f['feedback_text']}\n\n")
+            if f["teacher_comments"]:
+                out.write(f"**Teacher comments** ({f['reviewed_at']}): {f['teacher_comments']}\n\n")
+        for o in rec["autograder"]:
+            out.write(f"### Autograder Output ({o['generated_at']})\n```\n{o['output']}\n```\n\n")
+
+WRITERS = {"jsonl": _write_jsonl, "csv": _write_csv, "md": _write_md}
+
+def export(path="-", fmt="jsonl", compress=None, with_code=True, **filters):
+    """Stream matching submissions to `path` ("-" = stdout); returns the count."""
+    compress = path.endswith(".gz") if compress is None else compress
+    if path == "-":
+        raw = sys.stdout.buffer
+    else:
+        raw = open(os.path.expanduser(path), "wb")
+    stream = gzip.GzipFile(fileobj=raw, mode="wb") if compress else raw
+    out = io.TextIOWrapper(stream, encoding="utf-8", newline="" if fmt == "csv" else None)
+    conn = db.connect()
+    n = 0
+    try:
+        conn.execute("PRAGMA query_only = 1")
+        def counted(records):
+            nonlocal n
+            for rec in records:
+                n += 1
+                yield rec
+        WRITERS[fmt](out, counted(iter_submissions(conn, with_code, **filters)))
+        out.flush()
+    finally:
+        conn.close()
+        out.detach()
+        if compress:
+            stream.close()
+        if path != "-":
+            raw.close()
+    return n
+
 if __name__ == "__main__":
     # Argument parser to accept the student_repo as a command-line argument
     parser = argparse.ArgumentParser(description="Retrieve data for a specific student and output it as Markdown.")
-    parser.add_argument("student_repo", help="The student repository (e.g., hw3-LeonardAlmeida)")
+    parser.add_argument("student_repo", nargs="?",
+                        help="The student repository (e.g., hw3-LeonardAlmeida)")
+    e = parser.add_argument_group("bulk export")
+    e.add_argument("--export", action="store_true", help="stream many repos in one pass")
+    e.add_argument("--format", choices=sorted(WRITERS), default="jsonl")
+    e.add_argument("-o", "--output", default="-", help="file (\".gz\" = gzip) or - for stdout")
+    e.add_argument("--gzip", action="store_true", default=None, help="gzip the output")
+    e.add_argument("--assignment", type=int)
+    e.add_argument("--since", help="submitted_at >= ISO date")
+    e.add_argument("--until", help="submitted_at < ISO date")
+    e.add_argument("--reviewed", choices=("yes", "no"), help="has reviewed / unreviewed feedback")
+    e.add_argument("--repo", help="repo name or glob (e.g. 'hw3-*')")
+    e.add_argument("--no-code", action="store_true", help="omit source files")
     args = parser.parse_args()
 
-    # Generate Markdown for the specified student repository
-    generate_markdown(args.student_repo)
+    if args.export:
+        try:
+            n = export(args.output, args.format, args.gzip, not args.no_code,
+                       assignment=args.assignment, since=args.since, until=args.until,
+                       reviewed=None if args.reviewed is None else args.reviewed == "yes",
+                       repo=args.repo or args.student_repo)
+        except sqlite3.Error as e:
+            sys.exit(f"SQLite error: {e}")
+        print(f"Exported {n} submissions", file=sys.stderr)
+    elif args.student_repo:
+        # Generate Markdown for the specified student repository
+        generate_markdown(args.student_repo)
+    else:
+        parser.error("give a student_repo or --export")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+db.py
+────────────────────────────────────────────────────────────
+Shared SQLite access for every AGLLM entry point.
+
+• DB_PATH is resolved once: $AGLLM_DB, else $HOME/agllmdatabase.db
+• Every connection runs in WAL mode with synchronous=NORMAL and a busy
+  timeout, so the grading worker can write while the teacher UI reads
+• get() hands out one long-lived connection per thread; its statement
+  cache keeps the hot queries prepared between calls
+• query / query_one / execute / transaction() cover the common patterns
+• agllm_blob_text(data, compressed) is available in SQL (FTS triggers,
+  see search_index.py), so blob writes need a connection from here
+"""
+
+import os, zlib, sqlite3, threading
+from contextlib import contextmanager
+
+# ─────────────────────────── config ─────────────────────────────
+DB_PATH         = os.getenv("AGLLM_DB",
+                            os.path.join(os.getenv("HOME") or ".", "agllmdatabase.db"))
+BUSY_TIMEOUT_MS = int(os.getenv("AGLLM_BUSY_TIMEOUT_MS", "10000"))
+STATEMENT_CACHE = 256
+
+_local = threading.local()
+
+def _blob_text(data, compressed):
+    if data is None:
+        return None
+    if compressed:
+        data = zlib.decompress(data)
+    return bytes(data).decode("utf-8", "replace")
+
+def connect(path: str = None, **kwargs) -> sqlite3.Connection:
+    """A new, tuned connection (caller owns and closes it)."""
+    kwargs.setdefault("timeout", BUSY_TIMEOUT_MS / 1000)
+    kwargs.setdefault("cached_statements", STATEMENT_CACHE)
+    conn = sqlite3.connect(path or DB_PATH, **kwargs)
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.create_function("agllm_blob_text", 2, _blob_text, deterministic=True)
+    return conn
+
+def get() -> sqlite3.Connection:
+    """This thread's shared connection (rows are sqlite3.Row)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = connect(check_same_thread=True)
+        conn.row_factory = sqlite3.Row
+    return conn
+
+def close() -> None:
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+# ─────────────────────────── helpers ────────────────────────────
+def query(sql: str, args=()) -> list:
+    return get().execute(sql, args).fetchall()
+
+def query_one(sql: str, args=()):
+    return get().execute(sql, args).fetchone()
+
+def execute(sql: str, args=()) -> sqlite3.Cursor:
+    """Single write statement, committed immediately."""
+    with get() as c:
+        return c.execute(sql, args)
+
+@contextmanager
+def transaction(immediate: bool = False):
+    """`with db.transaction() as c:` – commit on success, roll back on error.
+    immediate=True takes the write lock up front (no upgrade deadlocks, no
+    SQLITE_BUSY_SNAPSHOT); use it whenever the block may write after reading."""
+    conn = get()
+    if immediate and not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+diff_prompt.py
+────────────────────────────────────────────────────────────
+Incremental prompting: describe a push relative to the repo's previous one.
+
+• Looks up the latest earlier submission of `repo_name` (code_files/blobs)
+• Changed files  → unified-diff hunks        new files → full text
+• Unchanged files → signature outline        deleted   → names only
+• Adds the feedback the model gave last time
+
+Mode via $AGLLM_INCREMENTAL:  auto (default) | 1 (always when possible) | 0
+In auto mode the delta is used only when it is smaller than the full code
+section; a push with no code changes falls back to the full prompt so that
+llm_cache can answer it.
+"""
+
+import os, difflib
+
+import blobstore
+from prompt_packer import estimate_tokens, outline, PROMPT_TOKENS
+
+# ─────────────────────────── config ─────────────────────────────
+MODE          = os.getenv("AGLLM_INCREMENTAL", "auto").lower()
+CONTEXT_LINES = 3
+
+FOLLOW_UP_NOTE = (
+    "This is a follow-up push. Focus on what changed since the previous "
+    "submission and on whether the previous feedback was addressed."
+)
+
+# ─────────────────────────── history ────────────────────────────
+def previous_submission(cur, repo_name: str):
+    """(submission_id, feedback_text) of the repo's latest submission, or None."""
+    row = cur.execute(
+        """SELECT s.id,
+                  (SELECT f.feedback_text FROM feedback f
+                    WHERE f.submission_id = s.id ORDER BY f.id DESC LIMIT 1)
+             FROM submissions s
+            WHERE s.student_repo = ?
+              AND EXISTS (SELECT 1 FROM code_files cf WHERE cf.submission_id = s.id)
+              AND NOT EXISTS (SELECT 1 FROM feedback f          -- unfinished attempt
+                               WHERE f.submission_id = s.id AND f.status <> 'done')
+         ORDER BY s.id DESC
+            LIMIT 1""",
+        (repo_name,)
+    ).fetchone()
+    return (row[0], row[1] or "") if row else None
+
+# ─────────────────────────── diffing ────────────────────────────
+def file_changes(prev_files, files):
+    """Split into (changed, added, removed, unchanged) lists of names/pairs."""
+    prev = dict(prev_files)
+    cur  = dict(files)
+    changed   = [(n, prev[n], t) for n, t in files if n in prev and prev[n] != t]
+    added     = [(n, t) for n, t in files if n not in prev]
+    removed   = [n for n, _ in prev_files if n not in cur]
+    unchanged = [(n, t) for n, t in files if n in prev and prev[n] == t]
+    return changed, added, removed, unchanged
+
+def hunks(name: str, old: str, new: str) -> str:
+    return "".join(difflib.unified_diff(
+        old.splitlines(keepends=True), new.splitlines(keepends=True),
+        fromfile=f"a/{name}", tofile=f"b/{name}", n=CONTEXT_LINES))
+
+def build(cur, repo_name: str, files, full_section: str = None,
+          budget: int = PROMPT_TOKENS):
+    """
+    Return (code_section, previous_feedback) for an incremental prompt, or
+    None when the full prompt should be used instead.
+    """
+    if MODE in ("0", "off", "false", "no"):
+        return None
+    prev = previous_submission(cur, repo_name)
+    if prev is None:
+        return None
+    prev_id, prev_feedback = prev
+    changed, added, removed, unchanged = file_changes(
+        blobstore.submission_files(cur, prev_id), files)
+    if not changed and not added and not removed:
+        return None                                    # let llm_cache answer it
+
+    parts = []
+    for name, old, new in changed:
+        d = hunks(name, old, new)
+        if not d.endswith("\n"):
+            d += "\n"
+        parts.append(f"File: {name}  (modified)\n```diff\n{d}```\n\n")
+    for name, text in added:
+        parts.append(f"File: {name}  (new)\n{text}\n\n")
+    if removed:
+        parts.append("Deleted files: " + ", ".join(removed) + "\n\n")
+    if unchanged:
+        parts.append("**Unchanged Files (outline)**\n")
+        for name, text in unchanged:
+            sig = outline(text, max_lines=10)
+            lines = text.count("\n") + 1
+            parts.append(f"File: {name}  ({lines} lines, unchanged)\n"
+                         + (f"{sig}\n" if sig else "") + "\n")
+    section = "".join(parts)
+
+    if estimate_tokens(section) > budget:
+        return None
+    if MODE == "auto" and full_section is not None \
+            and estimate_tokens(section) + estimate_tokens(prev_feedback) \
+                >= estimate_tokens(full_section):
+        return None
+    return section, prev_feedback or "None recorded."
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+feedback_stream.py
+────────────────────────────────────────────────────────────
+Feedback that becomes visible while Ollama is still generating.
+
+    feedback.status   'streaming'  generation in progress (text so far)
+                      'partial'    generation failed / timed out (text kept)
+                      'done'       complete
+
+control_code inserts the submission rows and a 'streaming' feedback row
+*before* the LLM call; Writer then appends every token to
+~/logs/feedback.md at once and to the row at most every FLUSH_SECS, so a
+killed or timed-out job keeps what was generated.  The retried job finds
+its unfinished row again (resumable) instead of adding a second push.
+
+teacher_ui serves /feedback/<id>/stream as Server-Sent Events: events()
+polls the row and sends the new text (event id = characters sent, so a
+reconnecting EventSource continues where it stopped).
+
+$AGLLM_STREAM=0 falls back to one blocking /api/generate call.
+"""
+
+import os, json, time, sqlite3
+
+import db
+
+# ─────────────────────────── config ─────────────────────────────
+STREAM       = os.getenv("AGLLM_STREAM", "1") != "0"
+FLUSH_SECS   = float(os.getenv("AGLLM_STREAM_FLUSH_SECS", "0.5"))   # row updates
+POLL_SECS    = float(os.getenv("AGLLM_STREAM_POLL_SECS", "0.3"))    # SSE polling
+SSE_MAX_SECS = float(os.getenv("AGLLM_STREAM_MAX_SECS", "1800"))
+HEARTBEAT    = 15                                                    # s, SSE comment
+
+DDL = """
+CREATE INDEX IF NOT EXISTS idx_feedback_live
+    ON feedback(repo_name, id) WHERE status <> 'done';
+"""
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(feedback)")}
+    if not cols:
+        return
+    if "status" not in cols:
+        conn.execute("ALTER TABLE feedback ADD COLUMN status TEXT NOT NULL DEFAULT 'done'")
+    conn.executescript(DDL)
+    conn.commit()
+
+# ─────────────────────────── writing ────────────────────────────
+def resumable(cur, repo_name: str, file_hashes, autograder_out: str):
+    """(submission_id, feedback_id) of this repo's unfinished last push if it
+    graded the same files and autograder log, else None."""
+    row = cur.execute(
+        """SELECT f.submission_id, f.id FROM feedback f
+            WHERE f.repo_name = ? AND f.status <> 'done'
+              AND f.submission_id = (SELECT MAX(id) FROM submissions
+                                      WHERE student_repo = ?)
+         ORDER BY f.id DESC LIMIT 1""", (repo_name, repo_name)).fetchone()
+    if row is None:
+        return None
+    sid, fid = row
+    files = sorted(tuple(r) for r in cur.execute(
+        "SELECT filename, blob_hash FROM code_files WHERE submission_id = ?", (sid,)))
+    out = cur.execute("SELECT output FROM autograder_outputs WHERE submission_id = ? "
+                      "ORDER BY id DESC LIMIT 1", (sid,)).fetchone()
+    if files != sorted(file_hashes) or (out[0] if out else "") != autograder_out:
+        return None
+    return sid, fid
+
+
+class Writer:
+    """on_token callback for llm_client.generate_stream (one generation)."""
+
+    def __init__(self, conn: sqlite3.Connection, feedback_id: int, md_path, header: str = ""):
+        self.conn, self.feedback_id = conn, feedback_id
+        self.md_path, self.header = md_path, header
+        self.parts = []
+        self.started = time.perf_counter()
+        self.first_token_ms = None
+        self._md = None
+        self._flushed = self.started
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def __call__(self, piece: str) -> None:
+        if self.first_token_ms is None:
+            self.first_token_ms = (time.perf_counter() - self.started) * 1000
+            self._md = open(self.md_path, "w", encoding="utf-8")
+            self._md.write(self.header)
+        self.parts.append(piece)
+        self._md.write(piece)
+        self._md.flush()
+        if time.perf_counter() - self._flushed >= FLUSH_SECS:
+            self._update("streaming", self.text)
+
+    def _update(self, status: str, text: str, from_cache: bool = None) -> None:
+        if from_cache is None:
+            self.conn.execute("UPDATE feedback SET feedback_text = ?, status = ? WHERE id = ?",
+                              (text, status, self.feedback_id))
+        else:
+            self.conn.execute("UPDATE feedback SET feedback_text = ?, status = ?, "
+                              "from_cache = ? WHERE id = ?",
+                              (text, status, int(from_cache), self.feedback_id))
+        self.conn.commit()
+        self._flushed = time.perf_counter()
+
+    def close(self, status: str = "done", text: str = None, from_cache: bool = None) -> None:
+        """Final text (default: what was streamed) → feedback.md and the row.
+        Leaving 'streaming' is what indexes the row for search (search_index.py)."""
+        if self._md is not None:
+            self._md.close()
+            self._md = None
+        text = self.text if text is None else text
+        self.md_path.write_text(self.header + text, encoding="utf-8")
+        self._update(status, text, from_cache)
+
+# ─────────────────────────── SSE ────────────────────────────────
+def _event(data: dict, event: str = None, eid: int = None) -> str:
+    head = (f"event: {event}\n" if event else "") + (f"id: {eid}\n" if eid is not None else "")
+    return f"{head}data: {json.dumps(data)}\n\n"
+
+def events(feedback_id: int, sent: int = 0):
+    """SSE stream of one feedback row until it leaves 'streaming'."""
+    deadline = time.monotonic() + SSE_MAX_SECS
+    beat = time.monotonic()
+    prev = None                                    # text as of the last poll
+    yield f"retry: {int(POLL_SECS * 1000 * 10)}\n\n"
+    while True:
+        row = db.query_one("SELECT feedback_text, status FROM feedback WHERE id = ?",
+                           (feedback_id,))
+        if row is None:
+            yield _event({"status": "missing"}, "done")
+            return
+        text, status = row
+        if len(text) < sent or (prev is not None and not text.startswith(prev)):
+            yield _event({"text": text}, "reset", len(text))    # resumed job restarted
+        elif len(text) > sent:
+            yield _event({"append": text[sent:]}, None, len(text))
+        prev, sent = text, len(text)
+        if status != "streaming":
+            yield _event({"status": status}, "done", sent)
+            return
+        if time.monotonic() > deadline:
+            return
+        if time.monotonic() - beat > HEARTBEAT:
+            beat = time.monotonic()
+            yield ": keep-alive\n\n"
+        time.sleep(POLL_SECS)
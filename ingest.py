@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+ingest.py
+────────────────────────────────────────────────────────────
+Single-pass, bounded-memory walk over a student's checkout.
+
+• Prunes hidden dirs, virtualenvs (pyvenv.cfg), .gitignore'd paths and
+  instructor excludes *before* descending into them
+• Sniffs the first 8 KiB of each file and skips binary content
+• Enforces a per-file and a total size cap
+• Yields one SourceFile at a time; skipped files are yielded too (text=None)
+  so the caller can record why they were left out
+
+Instructor config lives next to the assignment README as `agllm.ini`:
+
+    [ingest]
+    include      = *.py, *.java, src/**
+    exclude      = data/**, *.csv
+    max_file_kb  = 256
+    max_total_kb = 4096
+
+(a [rules] section in the same file is read by rules.py)
+
+$AGLLM_INCLUDE / $AGLLM_EXCLUDE (comma-separated globs) extend it.
+"""
+
+import os, re, fnmatch, configparser
+from dataclasses import dataclass
+from pathlib import Path
+
+# ─────────────────────────── config ─────────────────────────────
+SNIFF_BYTES      = 8192
+MAX_FILE_KB      = int(os.getenv("AGLLM_MAX_FILE_KB", "256"))
+MAX_TOTAL_KB     = int(os.getenv("AGLLM_MAX_TOTAL_KB", "4096"))
+CONFIG_NAME      = "agllm.ini"
+DEFAULT_EXCLUDE  = ["node_modules", "__pycache__", "site-packages", "*.pyc", "*.class"]
+
+_TEXT_CHARS = bytes({7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x100)) - {0x7f})
+
+
+@dataclass
+class SourceFile:
+    name: str                 # path relative to the root, '/' separated
+    size: int                 # bytes on disk
+    text: str = None          # None ⇒ skipped
+    skipped: str = None       # 'binary' | 'too_large' | 'over_total' | 'undecodable'
+
+
+@dataclass
+class IngestConfig:
+    include: list
+    exclude: list
+    max_file: int
+    max_total: int
+
+
+def _globs(value: str) -> list:
+    return [g.strip() for g in (value or "").replace("\n", ",").split(",") if g.strip()]
+
+def load_config(config_dir: Path) -> IngestConfig:
+    cp = configparser.ConfigParser()
+    if config_dir is not None:
+        cp.read(Path(config_dir) / CONFIG_NAME, encoding="utf-8")
+    sec = cp["ingest"] if cp.has_section("ingest") else {}
+    return IngestConfig(
+        include=_globs(sec.get("include", "")) + _globs(os.getenv("AGLLM_INCLUDE")),
+        exclude=DEFAULT_EXCLUDE + _globs(sec.get("exclude", ""))
+                + _globs(os.getenv("AGLLM_EXCLUDE")),
+        max_file=int(sec.get("max_file_kb", MAX_FILE_KB)) * 1024,
+        max_total=int(sec.get("max_total_kb", MAX_TOTAL_KB)) * 1024,
+    )
+
+# ─────────────────────────── glob / .gitignore ──────────────────
+def _glob_re(pattern: str) -> str:
+    """gitignore-flavoured glob → regex body (`**` crosses directories)."""
+    out, i = [], 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?"); i += 3; continue
+        if pattern.startswith("**", i):
+            out.append(".*"); i += 2; continue
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+def glob_match(pattern: str, rel: str) -> bool:
+    """Match a relative path; patterns without '/' match any basename."""
+    if "/" not in pattern.rstrip("/"):
+        return fnmatch.fnmatchcase(rel.rsplit("/", 1)[-1], pattern.rstrip("/"))
+    return re.fullmatch(_glob_re(pattern.strip("/")), rel) is not None
+
+
+class GitIgnore:
+    """The subset of .gitignore semantics students actually use."""
+
+    def __init__(self):
+        self.rules = []       # (base, regex, negate, dir_only)
+
+    def load(self, directory: Path, base: str) -> None:
+        f = directory / ".gitignore"
+        if not f.is_file():
+            return
+        for line in f.read_text(encoding="utf-8", errors="replace").splitlines():
+            line = line.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            anchored = "/" in line
+            body = _glob_re(line.lstrip("/"))
+            rx = re.compile(body if anchored else rf"(?:.*/)?{body}")
+            self.rules.append((base, rx, negate, dir_only))
+
+    def ignored(self, rel: str, is_dir: bool) -> bool:
+        hit = False
+        for base, rx, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if base:
+                if not rel.startswith(base + "/"):
+                    continue
+                sub = rel[len(base) + 1:]
+            else:
+                sub = rel
+            if rx.fullmatch(sub):
+                hit = not negate
+        return hit
+
+# ─────────────────────────── content sniffing ───────────────────
+def is_binary(head: bytes) -> bool:
+    if not head:
+        return False
+    if b"\0" in head:
+        return True
+    nontext = head.translate(None, _TEXT_CHARS)
+    return len(nontext) / len(head) > 0.30
+
+def _decode(raw: bytes):
+    try:
+        return raw.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        pass
+    try:
+        return raw.decode("cp1252")
+    except UnicodeDecodeError:
+        return None
+
+# ─────────────────────────── walk ───────────────────────────────
+def iter_files(root: Path, config: IngestConfig = None):
+    """Yield SourceFile for every candidate under root, in sorted path order."""
+    root = Path(root)
+    config = config or load_config(None)
+    gi = GitIgnore()
+    total = 0
+
+    def walk(directory: Path, rel_dir: str):
+        nonlocal total
+        gi.load(directory, rel_dir)
+        try:
+            entries = sorted(os.scandir(directory), key=lambda e: e.name)
+        except OSError:
+            return
+        for e in entries:
+            if e.name.startswith("."):
+                continue
+            rel = f"{rel_dir}/{e.name}" if rel_dir else e.name
+            is_dir = e.is_dir(follow_symlinks=False)
+            if gi.ignored(rel, is_dir):
+                continue
+            if any(glob_match(p, rel) or (is_dir and glob_match(p, rel + "/x"))
+                   for p in config.exclude):
+                continue
+            if is_dir:
+                if not os.path.exists(os.path.join(e.path, "pyvenv.cfg")):
+                    yield from walk(Path(e.path), rel)
+                continue
+            if not e.is_file(follow_symlinks=False):
+                continue
+            if config.include and not any(glob_match(p, rel) for p in config.include):
+                continue
+
+            size = e.stat().st_size
+            if size > config.max_file:
+                yield SourceFile(rel, size, skipped="too_large"); continue
+            if total + size > config.max_total:
+                yield SourceFile(rel, size, skipped="over_total"); continue
+            with open(e.path, "rb") as fh:
+                head = fh.read(SNIFF_BYTES)
+                if is_binary(head):
+                    yield SourceFile(rel, size, skipped="binary"); continue
+                raw = head + fh.read()
+            text = _decode(raw)
+            if text is None:
+                yield SourceFile(rel, size, skipped="undecodable"); continue
+            total += size
+            yield SourceFile(rel, size, text=text)
+
+    yield from walk(root, "")
+
+
+if __name__ == "__main__":
+    import sys
+    root = Path(sys.argv[1] if len(sys.argv) > 1 else ".")
+    for f in iter_files(root, load_config(root)):
+        print(f"{'skip:' + f.skipped if f.skipped else 'ok':<16} {f.size:>9}  {f.name}")
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+job_queue.py
+────────────────────────────────────────────────────────────
+SQLite-backed grading queue + worker daemon.
+
+    enqueue   (called by the GitHub workflow)
+      • snapshots ~/logs into a private spool dir
+      • supersedes still-queued jobs for the same repo (latest push wins)
+      • --wait blocks until the job finishes and writes ~/logs/feedback.md
+
+    worker    (started once from run.sh)
+      • claims jobs atomically (BEGIN IMMEDIATE), N at a time
+      • runs control_code.grade() on the spool copy
+      • renews a running job's lease every HEARTBEAT_SECS; requeues jobs whose
+        lease expired (a dead worker; this counts as a failed attempt)
+      • restarts itself (after finishing the jobs in hand) when the synced
+        control code changes, so every push is graded by the current code
+
+Usage:
+    python3 job_queue.py enqueue <repo_name> [--commit SHA] [--wait]
+    python3 job_queue.py worker  [--concurrency N]
+    python3 job_queue.py status
+"""
+
+import os, sys, time, uuid, shutil, socket, hashlib, sqlite3, argparse, threading, traceback
+from contextlib import contextmanager
+from pathlib import Path
+from datetime import datetime, timedelta
+
+import db, llm_pool
+
+# ─────────────────────────── config ─────────────────────────────
+LOGS_DIR      = Path(os.getenv("HOME") or ".").joinpath("logs")
+SPOOL_DIR     = Path(os.getenv("AGLLM_SPOOL_DIR",
+                               Path(os.getenv("HOME") or ".") / "agllm_spool"))
+CONCURRENCY   = int(os.getenv("AGLLM_WORKERS", "0"))       # 0 = LLM pool capacity
+MAX_ATTEMPTS  = int(os.getenv("AGLLM_JOB_ATTEMPTS", "3"))
+RETRY_DELAY   = float(os.getenv("AGLLM_JOB_RETRY_DELAY", "30"))     # seconds, doubles
+HEARTBEAT_SECS = float(os.getenv("AGLLM_JOB_HEARTBEAT", "30"))
+# no heartbeat for this long = the worker died (grade length does not matter)
+LEASE_SECS    = float(os.getenv("AGLLM_JOB_LEASE", "300"))
+RELOAD        = os.getenv("AGLLM_WORKER_RELOAD", "1") != "0"
+CODE_DIR      = Path(__file__).resolve().parent
+POLL_SECS     = 1.0
+
+DDL = """
+CREATE TABLE IF NOT EXISTS jobs (
+  id            INTEGER PRIMARY KEY,
+  repo_name     TEXT    NOT NULL,
+  commit_sha    TEXT,
+  status        TEXT    NOT NULL DEFAULT 'queued',
+                -- queued | running | done | failed | superseded
+  spool_dir     TEXT    NOT NULL,
+  attempts      INTEGER NOT NULL DEFAULT 0,
+  not_before    TEXT    NOT NULL,          -- earliest (re)try time
+  enqueued_at   TEXT    NOT NULL,
+  started_at    TEXT,
+  heartbeat_at  TEXT,                      -- lease renewed while running
+  finished_at   TEXT,
+  worker        TEXT,
+  submission_id INTEGER REFERENCES submissions(id),
+  superseded_by INTEGER REFERENCES jobs(id),
+  error         TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(status, not_before, id);
+CREATE INDEX IF NOT EXISTS idx_jobs_repo  ON jobs(repo_name, status);
+"""
+
+def _now(delta: float = 0) -> str:
+    return (datetime.utcnow() + timedelta(seconds=delta)).isoformat() + "Z"
+
+def connect() -> sqlite3.Connection:
+    conn = db.connect(isolation_level=None)         # explicit BEGIN/COMMIT
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    conn.executescript(DDL)
+
+# ─────────────────────────── enqueue ────────────────────────────
+def enqueue(repo_name: str, logs_dir: Path = LOGS_DIR, commit: str = None) -> int:
+    """Snapshot logs_dir and queue it; older queued pushes of the repo are dropped."""
+    spool = SPOOL_DIR / uuid.uuid4().hex
+    shutil.copytree(logs_dir, spool, ignore=shutil.ignore_patterns("feedback.md"))
+
+    conn = connect()
+    try:
+        ensure_schema(conn)
+        conn.execute("BEGIN IMMEDIATE")
+        now = _now()
+        jid = conn.execute(
+            """INSERT INTO jobs(repo_name, commit_sha, spool_dir, not_before, enqueued_at)
+               VALUES (?,?,?,?,?)""",
+            (repo_name, commit, str(spool), now, now)
+        ).lastrowid
+        stale = conn.execute(
+            "SELECT id, spool_dir FROM jobs "
+            "WHERE repo_name = ? AND status = 'queued' AND id < ?",
+            (repo_name, jid)
+        ).fetchall()
+        conn.executemany(
+            "UPDATE jobs SET status = 'superseded', superseded_by = ?, finished_at = ? "
+            "WHERE id = ?",
+            [(jid, now, r["id"]) for r in stale]
+        )
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+    for r in stale:
+        shutil.rmtree(r["spool_dir"], ignore_errors=True)
+    return jid
+
+def wait(jid: int, logs_dir: Path = LOGS_DIR, timeout: float = None) -> str:
+    """Block until job `jid` is terminal; write its feedback.md into logs_dir."""
+    deadline = time.monotonic() + timeout if timeout else None
+    conn = connect()
+    try:
+        while True:
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (jid,)).fetchone()
+            if job is None:
+                return "missing"
+            if job["status"] in ("done", "failed", "superseded"):
+                break
+            if deadline and time.monotonic() > deadline:
+                return "timeout"
+            time.sleep(POLL_SECS)
+        if job["status"] == "done":
+            fb = conn.execute(
+                "SELECT feedback_text FROM feedback WHERE submission_id = ? "
+                "ORDER BY id DESC LIMIT 1", (job["submission_id"],)
+            ).fetchone()
+            if fb:
+                (Path(logs_dir) / "feedback.md").write_text(
+                    f"# Feedback for {job['repo_name']}\n\n{fb[0]}", encoding="utf-8")
+        return job["status"]
+    finally:
+        conn.close()
+
+# ─────────────────────────── worker ─────────────────────────────
+def claim(conn: sqlite3.Connection, worker: str):
+    """Atomically move the oldest runnable job to 'running'; None if idle."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        now = _now()
+        # jobs whose worker died mid-run go back to the queue, unless that
+        # was their last attempt (a job that kills its worker must not loop)
+        expired = conn.execute(
+            "SELECT id, spool_dir, attempts FROM jobs "
+            "WHERE status = 'running' AND COALESCE(heartbeat_at, started_at) < ?",
+            (_now(-LEASE_SECS),)
+        ).fetchall()
+        dead = [r for r in expired if r["attempts"] >= MAX_ATTEMPTS]
+        conn.executemany(
+            "UPDATE jobs SET status = 'queued', not_before = ?, worker = NULL, "
+            "error = 'lease expired' WHERE id = ?",
+            [(now, r["id"]) for r in expired if r["attempts"] < MAX_ATTEMPTS]
+        )
+        conn.executemany(
+            "UPDATE jobs SET status = 'failed', finished_at = ?, worker = NULL, "
+            "error = 'lease expired' WHERE id = ?",
+            [(now, r["id"]) for r in dead]
+        )
+        job = conn.execute(
+            "SELECT * FROM jobs WHERE status = 'queued' AND not_before <= ? "
+            "ORDER BY id LIMIT 1", (now,)
+        ).fetchone()
+        if job:
+            conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, heartbeat_at = ?, "
+                "worker = ?, attempts = attempts + 1 WHERE id = ?",
+                (now, now, worker, job["id"])
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    for r in dead:
+        print(f"❌ job {r['id']} lease expired on its last attempt")
+        shutil.rmtree(r["spool_dir"], ignore_errors=True)
+    return job
+
+def _finish(conn: sqlite3.Connection, job, worker: str, sets: str, args: tuple) -> bool:
+    """Update a job this worker still holds; False if its lease was lost."""
+    return conn.execute(
+        f"UPDATE jobs SET {sets} WHERE id = ? AND status = 'running' AND worker = ?",
+        (*args, job["id"], worker)
+    ).rowcount == 1
+
+@contextmanager
+def _heartbeat(jid: int, worker: str):
+    """Renew the lease of a job this worker holds while the block runs."""
+    done = threading.Event()
+
+    def beat():
+        conn = connect()
+        try:
+            while not done.wait(HEARTBEAT_SECS):
+                try:
+                    conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? "
+                                 "AND status = 'running' AND worker = ?", (_now(), jid, worker))
+                except sqlite3.Error as e:
+                    print(f"⚠️  job {jid} heartbeat failed: {e}")
+        finally:
+            conn.close()
+
+    t = threading.Thread(target=beat, daemon=True)
+    t.start()
+    try:
+        yield
+    finally:
+        done.set()
+        t.join()
+
+def run_job(conn: sqlite3.Connection, job, worker: str) -> None:
+    import control_code
+    try:
+        with _heartbeat(job["id"], worker):
+            sid = control_code.grade(job["repo_name"], Path(job["spool_dir"]))
+    except Exception as e:
+        attempts = job["attempts"] + 1
+        msg = "".join(traceback.format_exception_only(type(e), e)).strip()
+        if attempts < MAX_ATTEMPTS:
+            delay = RETRY_DELAY * 2 ** (attempts - 1)
+            if _finish(conn, job, worker, "status = 'queued', not_before = ?, error = ?",
+                       (_now(delay), msg)):
+                print(f"⚠️  job {job['id']} ({job['repo_name']}) failed, "
+                      f"retry in {delay:.0f}s: {msg}")
+                return
+        elif _finish(conn, job, worker, "status = 'failed', finished_at = ?, error = ?",
+                     (_now(), msg)):
+            print(f"❌ job {job['id']} ({job['repo_name']}) failed for good: {msg}")
+            shutil.rmtree(job["spool_dir"], ignore_errors=True)
+            return
+    else:
+        if _finish(conn, job, worker,
+                   "status = 'done', finished_at = ?, submission_id = ?, error = NULL",
+                   (_now(), sid)):
+            shutil.rmtree(job["spool_dir"], ignore_errors=True)
+            print(f"✅ job {job['id']} ({job['repo_name']}) → submission {sid}")
+            return
+    # the lease expired mid-run: the job was requeued (its spool dir is still
+    # in use) or failed, so leave both to whoever holds it now
+    print(f"⚠️  job {job['id']} ({job['repo_name']}) lost its lease; left to its new holder")
+
+def worker_loop(name: str, stop: threading.Event) -> None:
+    conn = connect()
+    try:
+        while not stop.is_set():
+            job = claim(conn, name)
+            if job is None:
+                stop.wait(POLL_SECS)
+                continue
+            run_job(conn, job, name)
+    finally:
+        conn.close()
+
+def _code_files() -> list:
+    """The control code the workflow syncs (*.py + LLMFiles)."""
+    return sorted(p for p in [*CODE_DIR.glob("*.py"), *CODE_DIR.glob("LLMFiles/*")]
+                  if p.is_file())
+
+def _code_stamp() -> tuple:
+    return tuple((p.name, p.stat().st_mtime_ns) for p in _code_files())
+
+def code_signature() -> str:
+    h = hashlib.sha256()
+    for p in _code_files():
+        h.update(p.name.encode() + b"\0" + p.read_bytes())
+    return h.hexdigest()
+
+def serve(concurrency: int = CONCURRENCY) -> None:
+    conn = connect()
+    ensure_schema(conn)
+    llm_pool.ensure_schema(conn)
+    conn.close()
+    SPOOL_DIR.mkdir(parents=True, exist_ok=True)
+
+    # one grading slot per LLM request slot, so adding nodes adds throughput
+    pool = llm_pool.default().start(on_probe=llm_pool.persist_stats)
+    concurrency = concurrency or pool.capacity
+
+    stop = threading.Event()
+    host = socket.gethostname()
+    threads = [threading.Thread(target=worker_loop, args=(f"{host}:{os.getpid()}:{i}", stop),
+                                daemon=True)
+               for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    print(f"👷 worker up — {concurrency} slot(s), {len(pool.backends)} LLM backend(s), "
+          f"db {db.DB_PATH}")
+    # the workflow copies fresh *.py into CODE_DIR on every push, but this
+    # process imported control_code once: restart when the content changes
+    # (cp rewrites mtimes on every push, so only a content change counts)
+    stamp, signature = (_code_stamp(), code_signature()) if RELOAD else (None, None)
+    try:
+        while any(t.is_alive() for t in threads):
+            time.sleep(1)
+            if RELOAD and not stop.is_set() and _code_stamp() != stamp:
+                stamp = _code_stamp()
+                if code_signature() != signature:
+                    print("🔄 control code changed — finishing running jobs, then restarting")
+                    stop.set()
+    except KeyboardInterrupt:
+        stop.set()
+        for t in threads:
+            t.join()
+        return
+    for t in threads:
+        t.join()
+    if RELOAD and stop.is_set():
+        sys.stdout.flush()
+        os.execv(sys.executable, [sys.executable, *sys.argv])
+
+# ─────────────────────────── CLI ────────────────────────────────
+def main() -> None:
+    ap = argparse.ArgumentParser(description="AGLLM grading queue.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    e = sub.add_parser("enqueue", help="queue the current ~/logs snapshot")
+    e.add_argument("repo_name")
+    e.add_argument("--commit", help="commit SHA (informational)")
+    e.add_argument("--logs", type=Path, default=LOGS_DIR)
+    e.add_argument("--wait", action="store_true", help="block until graded")
+    e.add_argument("--timeout", type=float, default=None)
+
+    w = sub.add_parser("worker", help="run the worker daemon")
+    w.add_argument("--concurrency", type=int, default=CONCURRENCY)
+
+    sub.add_parser("status", help="job counts per status")
+    args = ap.parse_args()
+
+    if args.cmd == "enqueue":
+        jid = enqueue(args.repo_name, args.logs, args.commit)
+        print(f"📥 queued job {jid} for {args.repo_name}")
+        if args.wait:
+            status = wait(jid, args.logs, args.timeout)
+            print(f"job {jid}: {status}")
+            if status in ("failed", "timeout", "missing"):
+                sys.exit(1)
+    elif args.cmd == "worker":
+        serve(args.concurrency)
+    else:
+        conn = connect()
+        ensure_schema(conn)
+        for r in conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+            print(f"{r[0]:<12} {r[1]}")
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+llm_cache.py
+────────────────────────────────────────────────────────────
+Content-addressed cache of LLM responses.
+
+key = sha256( final prompt ‖ model name ‖ modelfile parameters )
+
+A re-push that produces the exact same prompt (README edit, empty commit …)
+reuses the stored `feedback_text` instead of paying for a new generation.
+Entries are evicted by age and by total size (least recently hit first).
+
+CLI:  python3 llm_cache.py [--evict | --clear]   (prints stats)
+"""
+
+import os, sys, json, sqlite3, hashlib, argparse
+from pathlib import Path
+from datetime import datetime, timedelta
+
+import db
+
+# ─────────────────────────── config ─────────────────────────────
+MODELFILE      = Path(os.getenv("AGLLM_MODELFILE",
+                      Path(__file__).resolve().parent / "LLMFiles" / "setupllm.modelfile"))
+CACHE_ENABLED  = os.getenv("AGLLM_CACHE", "1") != "0"
+MAX_AGE_DAYS   = float(os.getenv("AGLLM_CACHE_MAX_AGE_DAYS", "30"))
+MAX_BYTES      = int(float(os.getenv("AGLLM_CACHE_MAX_MB", "64")) * 1024 * 1024)
+
+DDL = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+  key           TEXT PRIMARY KEY,        -- sha256 of prompt + model + params
+  model         TEXT    NOT NULL,
+  feedback_text TEXT    NOT NULL,
+  size          INTEGER NOT NULL,        -- len(feedback_text) in bytes
+  created_at    TEXT    NOT NULL,
+  last_hit_at   TEXT,
+  hits          INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_lru
+    ON llm_cache(COALESCE(last_hit_at, created_at));
+"""
+
+def _now() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+# ─────────────────────────── schema ─────────────────────────────
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    conn.executescript(DDL)
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(feedback)")}
+    if cols and "from_cache" not in cols:
+        conn.execute("ALTER TABLE feedback ADD COLUMN from_cache INTEGER NOT NULL DEFAULT 0")
+    conn.commit()
+
+# ─────────────────────────── keys ───────────────────────────────
+_missing_warned = set()
+
+def modelfile_params(path: Path = MODELFILE) -> dict:
+    """FROM / PARAMETER / SYSTEM of the modelfile the model was built from."""
+    if not path.is_file():
+        # keys and the prompt budget fall back to defaults: say so, once
+        if path not in _missing_warned:
+            _missing_warned.add(path)
+            print(f"⚠️  modelfile {path} not found (set $AGLLM_MODELFILE); "
+                  "using default model parameters", file=sys.stderr)
+        return {}
+    params, system, in_system = {}, [], False
+    for line in path.read_text(encoding="utf-8").splitlines():
+        s = line.strip()
+        if in_system:
+            if s.endswith('"""'):
+                system.append(s[:-3]); in_system = False
+            else:
+                system.append(s)
+            continue
+        if s.upper().startswith("SYSTEM"):
+            rest = s[6:].strip()
+            if rest.startswith('"""') and not (len(rest) > 3 and rest.endswith('"""')):
+                system.append(rest[3:]); in_system = True
+            else:
+                system.append(rest.strip('"'))
+        elif s.upper().startswith(("FROM", "PARAMETER")):
+            key, _, val = s.partition(" ")
+            if key.upper() == "PARAMETER":
+                key, _, val = val.strip().partition(" ")
+            params.setdefault(key.lower(), []).append(val.strip())
+    if system:
+        params["system"] = "\n".join(system).strip()
+    return params
+
+def cache_key(prompt: str, model: str, params: dict = None) -> str:
+    h = hashlib.sha256()
+    h.update(prompt.encode("utf-8"))
+    h.update(b"\0" + model.encode("utf-8") + b"\0")
+    h.update(json.dumps(params or {}, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+# ─────────────────────────── get / put ──────────────────────────
+def get(conn: sqlite3.Connection, key: str):
+    """Cached feedback_text or None; bumps the hit counter."""
+    if not CACHE_ENABLED:
+        return None
+    row = conn.execute("SELECT feedback_text FROM llm_cache WHERE key = ?",
+                       (key,)).fetchone()
+    if row is None:
+        return None
+    conn.execute("UPDATE llm_cache SET hits = hits + 1, last_hit_at = ? WHERE key = ?",
+                 (_now(), key))
+    return row[0]
+
+def put(conn: sqlite3.Connection, key: str, model: str, feedback_text: str) -> None:
+    if not CACHE_ENABLED or not feedback_text.strip():
+        return
+    conn.execute(
+        """INSERT OR REPLACE INTO llm_cache
+               (key, model, feedback_text, size, created_at)
+           VALUES (?,?,?,?,?)""",
+        (key, model, feedback_text, len(feedback_text.encode("utf-8")), _now()),
+    )
+    evict(conn)
+
+def evict(conn: sqlite3.Connection, max_age_days: float = MAX_AGE_DAYS,
+          max_bytes: int = MAX_BYTES) -> int:
+    """Drop stale entries, then least-recently-hit ones until under max_bytes."""
+    cutoff = (datetime.utcnow() - timedelta(days=max_age_days)).isoformat() + "Z"
+    n = conn.execute("DELETE FROM llm_cache WHERE COALESCE(last_hit_at, created_at) < ?",
+                     (cutoff,)).rowcount
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+    if total > max_bytes:
+        doomed = []
+        for key, size in conn.execute(
+                "SELECT key, size FROM llm_cache "
+                "ORDER BY COALESCE(last_hit_at, created_at)"):
+            if total <= max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM llm_cache WHERE key = ?", doomed)
+        n += len(doomed)
+    return n
+
+# ─────────────────────────── CLI ────────────────────────────────
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Inspect or trim the LLM response cache.")
+    g = ap.add_mutually_exclusive_group()
+    g.add_argument("--evict", action="store_true", help="apply age/size policy now")
+    g.add_argument("--clear", action="store_true", help="delete every entry")
+    args = ap.parse_args()
+
+    conn = db.connect()
+    ensure_schema(conn)
+    if args.clear:
+        conn.execute("DELETE FROM llm_cache")
+    elif args.evict:
+        print(f"evicted {evict(conn)} entries")
+    conn.commit()
+    n, size, hits = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size),0), COALESCE(SUM(hits),0) FROM llm_cache"
+    ).fetchone()
+    print(f"{n} entries, {size / 1024:.1f} KiB, {hits} hits")
+    conn.close()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+llm_client.py
+────────────────────────────────────────────────────────────
+Thin HTTP client for the Ollama daemon (replaces `ollama run` forks).
+
+• Talks to POST /api/generate at $OLLAMA_HOST over one keep-alive connection
+• Sends `keep_alive` so the model stays resident between grading jobs
+• Per-request timeout + retries with exponential backoff on transient errors
+• Returns the server's token counts and durations alongside the text
+• generate_stream() hands each NDJSON chunk to a callback as it arrives;
+  it is retried only while nothing has been received yet
+
+Only the standard library is used, so the runner needs no extra packages.
+"""
+
+import os, json, time, random, http.client
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+# ─────────────────────────── config ─────────────────────────────
+OLLAMA_HOST       = os.getenv("OLLAMA_HOST", "127.0.0.1:11434")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_TIMEOUT    = float(os.getenv("OLLAMA_TIMEOUT", "600"))
+OLLAMA_RETRIES    = int(os.getenv("OLLAMA_RETRIES", "3"))
+OLLAMA_BACKOFF    = float(os.getenv("OLLAMA_BACKOFF", "1.0"))
+
+RETRY_STATUSES    = {429, 500, 502, 503, 504}
+
+
+class LLMError(RuntimeError):
+    """Raised when the daemon cannot produce a response after all retries."""
+    partial = ""                     # text streamed before the failure
+    status = None                    # HTTP status; None = transport failure
+
+    @property
+    def backend_fault(self) -> bool:
+        """Transport errors and 5xx say the daemon is sick; 4xx blame the request."""
+        return self.status is None or self.status >= 500
+
+
+class _Retryable(Exception):
+    def __init__(self, msg: str, status: int = None):
+        super().__init__(msg)
+        self.status = status
+
+
+def _http_error(status: int, raw: bytes) -> LLMError:
+    err = LLMError(f"HTTP {status}: {raw[:200]!r}")
+    err.status = status
+    return err
+
+
+@dataclass
+class GenerateResult:
+    text: str
+    model: str = ""
+    prompt_eval_count: int = 0
+    eval_count: int = 0
+    total_duration: int = 0          # nanoseconds, as reported by Ollama
+    load_duration: int = 0
+    prompt_eval_duration: int = 0
+    eval_duration: int = 0
+    backend: str = ""                # host that answered (set by llm_pool)
+
+    @property
+    def tokens_per_sec(self) -> float:
+        if not self.eval_duration:
+            return 0.0
+        return self.eval_count / (self.eval_duration / 1e9)
+
+    @classmethod
+    def from_json(cls, body: dict, text: str = None) -> "GenerateResult":
+        return cls(
+            text=body.get("response", "") if text is None else text,
+            model=body.get("model", ""),
+            prompt_eval_count=body.get("prompt_eval_count", 0),
+            eval_count=body.get("eval_count", 0),
+            total_duration=body.get("total_duration", 0),
+            load_duration=body.get("load_duration", 0),
+            prompt_eval_duration=body.get("prompt_eval_duration", 0),
+            eval_duration=body.get("eval_duration", 0),
+        )
+
+
+def parse_host(host: str):
+    """`0.0.0.0:11434`, `http://node:11434`, `node` → (scheme, host, port)."""
+    if "://" not in host:
+        host = "http://" + host
+    parts = urlsplit(host)
+    hostname = parts.hostname or "127.0.0.1"
+    if hostname in ("0.0.0.0", "::"):          # bind address, not a target
+        hostname = "127.0.0.1"
+    port = parts.port or (443 if parts.scheme == "https" else 11434)
+    return parts.scheme or "http", hostname, port
+
+
+class OllamaClient:
+    """One persistent connection to one Ollama daemon (not thread-safe)."""
+
+    def __init__(self, host: str = OLLAMA_HOST, *, timeout: float = OLLAMA_TIMEOUT,
+                 retries: int = OLLAMA_RETRIES, backoff: float = OLLAMA_BACKOFF,
+                 keep_alive: str = OLLAMA_KEEP_ALIVE):
+        self.scheme, self.host, self.port = parse_host(host)
+        self.timeout    = timeout
+        self.retries    = retries
+        self.backoff    = backoff
+        self.keep_alive = keep_alive
+        self._conn      = None
+
+    # ─────────────────────── connection ────────────────────────
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._conn is None:
+            cls = (http.client.HTTPSConnection if self.scheme == "https"
+                   else http.client.HTTPConnection)
+            self._conn = cls(self.host, self.port, timeout=self.timeout)
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _request(self, method: str, path: str, payload: dict = None):
+        """Send one request, return the open response (caller must drain it)."""
+        body = json.dumps(payload).encode() if payload is not None else None
+        headers = {"Connection": "keep-alive"}
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+        conn = self._connection()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            return conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            self.close()                       # stale keep-alive socket
+            raise
+
+    def _with_retries(self, fn):
+        last = None
+        for attempt in range(self.retries + 1):
+            try:
+                return fn()
+            except _Retryable as e:
+                last = e
+            except (http.client.HTTPException, OSError) as e:
+                last = e
+            if attempt < self.retries:
+                delay = self.backoff * (2 ** attempt)
+                time.sleep(delay + random.uniform(0, delay / 2))
+        err = LLMError(f"Ollama at {self.host}:{self.port} failed: {last}")
+        err.status = getattr(last, "status", None)
+        raise err
+
+    # ──────────────────────── API calls ────────────────────────
+    def generate(self, model: str, prompt: str, *, options: dict = None,
+                 system: str = None) -> GenerateResult:
+        """Blocking, non-streamed generation."""
+        payload = {"model": model, "prompt": prompt, "stream": False,
+                   "keep_alive": self.keep_alive}
+        if options:
+            payload["options"] = options
+        if system:
+            payload["system"] = system
+
+        def call():
+            res = self._request("POST", "/api/generate", payload)
+            raw = res.read()
+            if res.status in RETRY_STATUSES:
+                raise _Retryable(f"HTTP {res.status}: {raw[:200]!r}", res.status)
+            if res.status != 200:
+                raise _http_error(res.status, raw)
+            return GenerateResult.from_json(json.loads(raw))
+
+        return self._with_retries(call)
+
+    def generate_stream(self, model: str, prompt: str, on_token, *, options: dict = None,
+                        system: str = None) -> GenerateResult:
+        """Streamed generation: on_token(piece) per chunk, full result at the end.
+
+        Once a chunk has been delivered a failure is not retried (the
+        caller already has that text); LLMError.partial holds it."""
+        payload = {"model": model, "prompt": prompt, "stream": True,
+                   "keep_alive": self.keep_alive}
+        if options:
+            payload["options"] = options
+        if system:
+            payload["system"] = system
+        parts = []
+
+        def call():
+            res = self._request("POST", "/api/generate", payload)
+            if res.status != 200:
+                raw = res.read()
+                if res.status in RETRY_STATUSES:
+                    raise _Retryable(f"HTTP {res.status}: {raw[:200]!r}", res.status)
+                raise _http_error(res.status, raw)
+            try:
+                for line in res:
+                    if not line.strip():
+                        continue
+                    obj = json.loads(line)
+                    if obj.get("error"):
+                        raise ValueError(obj["error"])
+                    piece = obj.get("response", "")
+                    if piece:
+                        parts.append(piece)
+                        on_token(piece)
+                    if obj.get("done"):
+                        res.read()                 # drain the chunk terminator
+                        return GenerateResult.from_json(obj, "".join(parts))
+                raise ValueError("stream ended before done")
+            except (http.client.HTTPException, OSError, ValueError) as e:
+                self.close()
+                if not parts:
+                    raise _Retryable(str(e))
+                err = LLMError(f"Ollama at {self.host}:{self.port} stream broke after "
+                               f"{len(parts)} chunk(s): {e}")
+                err.partial = "".join(parts)
+                raise err
+
+        return self._with_retries(call)
+
+    def ping(self) -> bool:
+        """True if the daemon answers /api/tags."""
+        try:
+            res = self._request("GET", "/api/tags")
+            res.read()
+            return res.status == 200
+        except (http.client.HTTPException, OSError):
+            return False
+
+
+# ─────────────────────────── CLI ────────────────────────────────
+if __name__ == "__main__":
+    import sys
+    model = sys.argv[1] if len(sys.argv) > 1 else "ux1"
+    with OllamaClient() as client:
+        r = client.generate(model, sys.stdin.read())
+    print(r.text)
+    print(f"\n— {r.eval_count} tokens, {r.tokens_per_sec:.1f} tok/s", file=sys.stderr)
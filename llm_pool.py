@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+llm_pool.py
+────────────────────────────────────────────────────────────
+Spread generations over several Ollama daemons (e.g. one per CloudLab node).
+
+    AGLLM_LLM_POOL = "node-1:11434@ux1*2, node-2:11434@ux1*4, http://gpu:11434"
+                      host[:port][@model][*max concurrent requests]
+
+Without $AGLLM_LLM_POOL the pool is the single $OLLAMA_HOST / $OLLAMA_MODEL
+daemon with $AGLLM_LLM_CONCURRENCY slots, i.e. the old behaviour.  Every
+backend should serve the same model build: llm_cache keys on
+$OLLAMA_MODEL, not on the node that answered.
+
+• Dispatch: least outstanding requests relative to the backend's limit
+  (ties → lower recent latency); callers wait while every slot is busy
+• Failover: a failed request is re-sent to the next backend (streamed
+  requests only before the first chunk); transport errors and 5xx also
+  mark the backend down, a 4xx does not.  Other exceptions (e.g. from
+  on_token) free the slot and propagate
+• Health: a daemon thread pings /api/tags every $AGLLM_LLM_PROBE_SECS and
+  brings backends back (or takes them out) between requests
+• Stats: per backend requests, failures, outstanding, p50/p95 latency;
+  the job_queue worker persists them to `llm_backends` for /metrics
+
+CLI:  python3 llm_pool.py            # probe every backend, print stats
+      python3 llm_pool.py --stats    # last snapshot stored by the worker
+"""
+
+import os, time, sqlite3, argparse, threading
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import db
+from llm_client import (OLLAMA_HOST, OLLAMA_RETRIES, GenerateResult, LLMError,
+                        OllamaClient, parse_host)
+
+# ─────────────────────────── config ─────────────────────────────
+POOL_SPEC      = os.getenv("AGLLM_LLM_POOL", "")
+DEFAULT_MODEL  = os.getenv("OLLAMA_MODEL", "ux1")
+DEFAULT_LIMIT  = int(os.getenv("AGLLM_LLM_CONCURRENCY", "2"))      # per backend
+PROBE_SECS     = float(os.getenv("AGLLM_LLM_PROBE_SECS", "15"))
+PROBE_TIMEOUT  = float(os.getenv("AGLLM_LLM_PROBE_TIMEOUT", "3"))
+ACQUIRE_SECS   = float(os.getenv("AGLLM_LLM_ACQUIRE_SECS", "600"))  # wait for a slot
+POOL_RETRIES   = int(os.getenv("AGLLM_LLM_POOL_RETRIES", "0"))     # per backend, pooled
+LATENCY_WINDOW = 200                                                # recent requests
+
+DDL = """
+CREATE TABLE IF NOT EXISTS llm_backends (
+  host          TEXT PRIMARY KEY,
+  model         TEXT    NOT NULL,
+  max_requests  INTEGER NOT NULL,
+  healthy       INTEGER NOT NULL,
+  outstanding   INTEGER NOT NULL,
+  requests      INTEGER NOT NULL,
+  failures      INTEGER NOT NULL,
+  p50_ms        REAL,
+  p95_ms        REAL,
+  last_error    TEXT,
+  updated_at    TEXT    NOT NULL
+);
+"""
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    conn.executescript(DDL)
+    conn.commit()
+
+# ─────────────────────────── backends ───────────────────────────
+@dataclass(eq=False)
+class Backend:
+    host: str                       # as configured, e.g. "node-1:11434"
+    model: str = DEFAULT_MODEL
+    limit: int = DEFAULT_LIMIT
+    healthy: bool = True
+    outstanding: int = 0
+    requests: int = 0
+    failures: int = 0
+    last_error: str = None
+    latencies: deque = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+
+    def latency(self, q: float) -> float:
+        """Quantile of recent request wall times in ms (None before the first)."""
+        if not self.latencies:
+            return None
+        xs = sorted(self.latencies)
+        return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+    def stats(self) -> dict:
+        return {"host": self.host, "model": self.model, "max_requests": self.limit,
+                "healthy": self.healthy, "outstanding": self.outstanding,
+                "requests": self.requests, "failures": self.failures,
+                "p50_ms": self.latency(0.5), "p95_ms": self.latency(0.95),
+                "last_error": self.last_error}
+
+def parse_spec(spec: str) -> list:
+    """'host[:port][@model][*limit], …' → [Backend] (empty spec → [])."""
+    out = []
+    for item in spec.replace("\n", ",").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        limit = DEFAULT_LIMIT
+        if "*" in item:
+            item, _, n = item.rpartition("*")
+            limit = max(1, int(n))
+        model = DEFAULT_MODEL
+        if "@" in item:
+            item, _, model = item.rpartition("@")
+        parse_host(item)                                  # fail early on a bad entry
+        out.append(Backend(item.strip(), model.strip() or DEFAULT_MODEL, limit))
+    return out
+
+# ─────────────────────────── pool ───────────────────────────────
+class Pool:
+    """Thread-safe dispatcher; each thread keeps one keep-alive client per backend."""
+
+    def __init__(self, backends: list, *, probe_secs: float = PROBE_SECS,
+                 retries: int = None, acquire_secs: float = ACQUIRE_SECS):
+        if not backends:
+            raise ValueError("empty LLM pool")
+        self.backends     = backends
+        self.probe_secs   = probe_secs
+        self.acquire_secs = acquire_secs
+        # one backend: keep llm_client's own retries; several: fail over instead
+        self.retries      = (retries if retries is not None
+                             else OLLAMA_RETRIES if len(backends) == 1 else POOL_RETRIES)
+        self._cond        = threading.Condition()
+        self._local       = threading.local()
+        self._prober      = None
+        self._stop        = threading.Event()
+
+    @property
+    def capacity(self) -> int:
+        return sum(b.limit for b in self.backends)
+
+    # ─────────────────────── health ────────────────────────────
+    def probe(self) -> None:
+        """Ping every backend once (outside the lock) and update `healthy`."""
+        for b in self.backends:
+            with OllamaClient(b.host, timeout=PROBE_TIMEOUT, retries=0) as c:
+                ok = c.ping()
+            with self._cond:
+                if ok != b.healthy:
+                    print(f"{'💚' if ok else '💔'}  LLM backend {b.host} "
+                          f"{'up' if ok else 'down'}")
+                b.healthy = ok
+                if not ok:
+                    b.last_error = b.last_error or "health probe failed"
+                self._cond.notify_all()
+
+    def start(self, on_probe=None) -> "Pool":
+        """Start the background prober (idempotent); on_probe(pool) runs after each round."""
+        if self._prober is None and self.probe_secs > 0:
+            def loop():
+                while not self._stop.wait(self.probe_secs):
+                    self.probe()
+                    if on_probe is not None:
+                        try:
+                            on_probe(self)
+                        except Exception as e:          # stats are best effort
+                            print(f"⚠️  pool stats: {e}")
+            self._prober = threading.Thread(target=loop, name="llm-pool-probe", daemon=True)
+            self._prober.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    # ─────────────────────── dispatch ──────────────────────────
+    def _pick(self, exclude) -> Backend:
+        free = [b for b in self.backends
+                if b.healthy and b not in exclude and b.outstanding < b.limit]
+        if not free:
+            return None
+        return min(free, key=lambda b: (b.outstanding / b.limit, b.outstanding,
+                                        b.latency(0.5) or 0))
+
+    def acquire(self, exclude=()) -> Backend:
+        deadline = time.monotonic() + self.acquire_secs
+        probed = False
+        with self._cond:
+            while True:
+                b = self._pick(exclude)
+                if b is not None:
+                    b.outstanding += 1
+                    return b
+                if not any(b.healthy for b in self.backends if b not in exclude):
+                    if probed:
+                        raise LLMError("no healthy LLM backend: " + ", ".join(
+                            f"{b.host} ({b.last_error})" for b in self.backends))
+                    self._cond.release()                 # maybe they are back
+                    try:
+                        self.probe()
+                    finally:
+                        self._cond.acquire()
+                    probed = True
+                    continue
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    raise LLMError(f"no free LLM slot after {self.acquire_secs:.0f}s")
+                self._cond.wait(min(left, 1.0))
+
+    def release(self, b: Backend, ms: float, error: BaseException = None) -> None:
+        with self._cond:
+            b.outstanding -= 1
+            b.requests += 1
+            if error is None:
+                b.latencies.append(ms)
+            else:
+                b.failures += 1
+                b.last_error = str(error)[:200] or type(error).__name__
+                if isinstance(error, LLMError) and error.backend_fault:
+                    b.healthy = False                    # the prober brings it back
+            self._cond.notify_all()
+
+    def _client(self, b: Backend) -> OllamaClient:
+        clients = self._local.__dict__.setdefault("clients", {})
+        c = clients.get(b.host)
+        if c is None:
+            c = clients[b.host] = OllamaClient(b.host, retries=self.retries)
+        return c
+
+    def generate(self, prompt: str, *, on_token=None, options: dict = None) -> GenerateResult:
+        """One generation on the least busy healthy backend, failing over on errors.
+
+        With on_token the answer is streamed (see OllamaClient.generate_stream)."""
+        self.start()
+        tried, last = set(), None
+        while len(tried) < len(self.backends):
+            b = self.acquire(exclude=tried)
+            t, error = time.perf_counter(), None
+            try:
+                c = self._client(b)
+                if on_token is None:
+                    res = c.generate(b.model, prompt, options=options)
+                else:
+                    res = c.generate_stream(b.model, prompt, on_token, options=options)
+                res.backend = b.host
+                return res
+            except LLMError as e:
+                error = e
+                if e.partial:                    # tokens already handed out
+                    raise
+                print(f"🔀  {b.host} failed ({e}); failing over")
+                tried.add(b)
+                last = e
+            except BaseException as e:           # bad JSON, on_token (DB) errors …
+                error = e
+                raise
+            finally:                             # the slot is always given back
+                self.release(b, (time.perf_counter() - t) * 1000, error)
+        err = LLMError(f"all {len(self.backends)} LLM backend(s) failed; last: {last}")
+        err.status = last.status if last is not None else None
+        raise err
+
+    def stats(self) -> list:
+        with self._cond:
+            return [b.stats() for b in self.backends]
+
+    def save_stats(self, conn: sqlite3.Connection) -> None:
+        now = datetime.utcnow().isoformat() + "Z"
+        conn.executemany(
+            """INSERT OR REPLACE INTO llm_backends
+                   (host, model, max_requests, healthy, outstanding, requests, failures,
+                    p50_ms, p95_ms, last_error, updated_at)
+               VALUES (:host, :model, :max_requests, :healthy, :outstanding, :requests,
+                       :failures, :p50_ms, :p95_ms, :last_error, :now)""",
+            [dict(s, now=now) for s in self.stats()])
+        conn.commit()
+
+# ─────────────────────────── process-wide pool ──────────────────
+_default = None
+_default_lock = threading.Lock()
+
+def default() -> Pool:
+    """The pool described by $AGLLM_LLM_POOL (else the single $OLLAMA_HOST)."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Pool(parse_spec(POOL_SPEC) or [Backend(OLLAMA_HOST)])
+        return _default
+
+def persist_stats(pool: Pool) -> None:
+    """on_probe hook for long-running processes (job_queue worker)."""
+    conn = db.connect()
+    try:
+        ensure_schema(conn)
+        pool.save_stats(conn)
+    finally:
+        conn.close()
+
+# ─────────────────────────── CLI ────────────────────────────────
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="AGLLM Ollama backend pool.")
+    ap.add_argument("--stats", action="store_true", help="show the worker's last snapshot")
+    args = ap.parse_args()
+
+    if args.stats:
+        conn = db.connect()
+        conn.row_factory = sqlite3.Row
+        ensure_schema(conn)
+        rows = conn.execute("SELECT * FROM llm_backends ORDER BY host").fetchall()
+        conn.close()
+    else:
+        pool = default()
+        pool.probe()
+        rows = [dict(s, updated_at="now") for s in pool.stats()]
+    for r in rows:
+        r = dict(r)
+        p50 = "—" if r["p50_ms"] is None else f"{r['p50_ms']:.0f}ms"
+        print(f"{'✅' if r['healthy'] else '❌'} {r['host']:<28} {r['model']:<14} "
+              f"{r['outstanding']}/{r['max_requests']} busy  {r['requests']} req  "
+              f"{r['failures']} fail  p50 {p50}  ({r['updated_at']})")
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+metrics.py
+────────────────────────────────────────────────────────────
+Per-stage timings for grading runs + Prometheus exposition.
+
+    run_metrics   submission_id, name, value   (one row per span / counter)
+
+control_code wraps each stage in `spans.span("<stage>")` (stored as
+`stage.<stage>` in milliseconds) and adds counters such as prompt_tokens,
+llm.eval_count, llm.tokens_per_sec, llm.first_token_ms and cache_hit; record() writes them in
+the same transaction as the submission.
+
+prometheus() renders p50/p95 per stage over the last $AGLLM_METRICS_WINDOW
+runs, LLM cache hit rates, per-backend pool stats, queue depth and the
+review backlog; teacher_ui serves it at /metrics.
+
+CLI:  python3 metrics.py        # print the /metrics text
+"""
+
+import os, math, time, sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+
+import db
+
+# ─────────────────────────── config ─────────────────────────────
+WINDOW    = int(os.getenv("AGLLM_METRICS_WINDOW", "500"))     # most recent runs
+QUANTILES = (0.5, 0.95)
+
+DDL = """
+CREATE TABLE IF NOT EXISTS run_metrics (
+  submission_id INTEGER NOT NULL REFERENCES submissions(id),
+  name          TEXT    NOT NULL,      -- 'stage.llm', 'llm.eval_count', …
+  value         REAL    NOT NULL,      -- stage.* in milliseconds
+  recorded_at   TEXT    NOT NULL,
+  PRIMARY KEY (submission_id, name)
+);
+"""
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    conn.executescript(DDL)
+
+# ─────────────────────────── collection ─────────────────────────
+class Spans:
+    """Timings + counters of one grading run."""
+
+    def __init__(self):
+        self.values = {}
+        self._t0 = time.perf_counter()
+
+    @contextmanager
+    def span(self, stage: str):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            key = f"stage.{stage}"
+            self.values[key] = self.values.get(key, 0.0) + (time.perf_counter() - t) * 1000
+
+    def set(self, name: str, value) -> None:
+        self.values[name] = float(value)
+
+    def total(self) -> None:
+        self.values["stage.total"] = (time.perf_counter() - self._t0) * 1000
+
+    def summary(self) -> str:
+        return "  ".join(f"{k[6:]} {v:.0f}ms" for k, v in self.values.items()
+                         if k.startswith("stage."))
+
+def record(cur, submission_id: int, spans: Spans) -> None:
+    now = datetime.utcnow().isoformat() + "Z"
+    cur.executemany(
+        "INSERT OR REPLACE INTO run_metrics(submission_id, name, value, recorded_at) "
+        "VALUES (?,?,?,?)",
+        [(submission_id, k, v, now) for k, v in spans.values.items()])
+
+# ─────────────────────────── exposition ─────────────────────────
+def quantile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    i = (len(sorted_values) - 1) * q
+    lo = int(i)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (i - lo)
+
+def _table_exists(conn, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                        (name,)).fetchone() is not None
+
+def _num(v: float) -> str:
+    return "NaN" if math.isnan(v) else f"{v:.6g}"
+
+def _summary(lines, metric, help_, label, series, scale=1.0):
+    lines += [f"# HELP {metric} {help_}", f"# TYPE {metric} summary"]
+    for key, values in sorted(series.items()):
+        values = sorted(v * scale for v in values)
+        for q in QUANTILES:
+            lines.append(f'{metric}{{{label}="{key}",quantile="{q}"}} '
+                         f'{_num(quantile(values, q))}')
+        lines.append(f'{metric}_sum{{{label}="{key}"}} {_num(sum(values))}')
+        lines.append(f'{metric}_count{{{label}="{key}"}} {len(values)}')
+
+def _gauge(lines, metric, help_, samples):
+    lines += [f"# HELP {metric} {help_}", f"# TYPE {metric} gauge"]
+    for labels, value in samples:
+        lines.append(f"{metric}{labels} {_num(value)}")
+
+def prometheus(conn: sqlite3.Connection, window: int = WINDOW) -> str:
+    """Prometheus text format (0.0.4) for the last `window` grading runs."""
+    lines = []
+    if _table_exists(conn, "run_metrics"):
+        stages, rates, first = {}, [], []
+        for name, value in conn.execute(
+                """SELECT name, value FROM run_metrics
+                    WHERE submission_id > (SELECT COALESCE(MAX(id), 0) - ? FROM submissions)
+                      AND (name LIKE 'stage.%'
+                           OR name IN ('llm.tokens_per_sec', 'llm.first_token_ms'))""",
+                (window,)):
+            if name == "llm.tokens_per_sec":
+                rates.append(value)
+            elif name == "llm.first_token_ms":
+                first.append(value)
+            else:
+                stages.setdefault(name[6:], []).append(value)
+        _summary(lines, "agllm_stage_duration_seconds",
+                 "Grading stage wall time over recent runs.", "stage", stages, 1 / 1000)
+        _summary(lines, "agllm_llm_tokens_per_second",
+                 "LLM output rate over recent uncached runs.", "model", {"all": rates})
+        _summary(lines, "agllm_llm_first_token_seconds",
+                 "Time until the first streamed token over recent uncached runs.",
+                 "model", {"all": first}, 1 / 1000)
+
+    fb = conn.execute(
+        """SELECT COUNT(*), COALESCE(SUM(from_cache), 0) FROM
+             (SELECT from_cache FROM feedback ORDER BY id DESC LIMIT ?)""",
+        (window,)).fetchone()
+    _gauge(lines, "agllm_llm_cache_hit_ratio",
+           "Share of recent submissions answered from llm_cache.",
+           [("", fb[1] / fb[0] if fb[0] else 0)])
+    if _table_exists(conn, "llm_cache"):
+        entries, hits = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM llm_cache").fetchone()
+        _gauge(lines, "agllm_llm_cache_entries", "Rows in llm_cache.", [("", entries)])
+        _gauge(lines, "agllm_llm_cache_hits", "Lifetime hits over current entries.",
+               [("", hits)])
+
+    if _table_exists(conn, "llm_backends"):
+        # snapshot written by the worker's pool prober (llm_pool.py)
+        rows = conn.execute(
+            "SELECT host, healthy, outstanding, requests, failures, p50_ms / 1000.0, "
+            "p95_ms / 1000.0 FROM llm_backends ORDER BY host").fetchall()
+        for i, (metric, help_) in enumerate((
+                ("agllm_llm_backend_up", "1 if the backend passed its last health probe."),
+                ("agllm_llm_backend_outstanding", "Requests in flight per backend."),
+                ("agllm_llm_backend_requests", "Requests sent since the worker started."),
+                ("agllm_llm_backend_failures", "Failed requests since the worker started."),
+                ("agllm_llm_backend_latency_p50_seconds", "Median request wall time."),
+                ("agllm_llm_backend_latency_p95_seconds", "p95 request wall time.")), 1):
+            _gauge(lines, metric, help_,
+                   [(f'{{backend="{r[0]}"}}', r[i] or 0) for r in rows])
+
+    if _table_exists(conn, "jobs"):
+        counts = dict(conn.execute(
+            "SELECT status, COUNT(*) FROM jobs WHERE status IN ('queued', 'running') "
+            "GROUP BY status").fetchall())
+        _gauge(lines, "agllm_queue_jobs", "Grading jobs by status.",
+               [(f'{{status="{s}"}}', counts.get(s, 0)) for s in ("queued", "running")])
+        oldest = conn.execute(
+            "SELECT MIN(enqueued_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+        age = 0.0
+        if oldest:
+            age = (datetime.utcnow()
+                   - datetime.fromisoformat(oldest.rstrip("Z"))).total_seconds()
+        _gauge(lines, "agllm_queue_oldest_age_seconds",
+               "Age of the oldest queued job.", [("", age)])
+        waits = [r[0] for r in conn.execute(
+            """SELECT (julianday(RTRIM(started_at, 'Z')) - julianday(RTRIM(enqueued_at, 'Z')))
+                      * 86400
+                 FROM jobs WHERE status = 'done' ORDER BY id DESC LIMIT ?""", (window,))]
+        _summary(lines, "agllm_queue_wait_seconds",
+                 "Time from enqueue to a worker picking the job up.", "queue",
+                 {"grading": waits})
+
+    if _table_exists(conn, "repo_summary"):
+        backlog = conn.execute(
+            "SELECT COALESCE(SUM(unreviewed), 0) FROM repo_summary").fetchone()[0]
+        _gauge(lines, "agllm_unreviewed_feedback", "Feedback rows awaiting review.",
+               [("", backlog)])
+    return "\n".join(lines) + "\n"
+
+# ─────────────────────────── CLI ────────────────────────────────
+if __name__ == "__main__":
+    conn = db.connect()
+    print(prometheus(conn), end="")
+    conn.close()
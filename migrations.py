@@ -0,0 +1,712 @@
+#!/usr/bin/env python3
+"""
+migrations.py
+────────────────────────────────────────────────────────────
+Versioned, in-place schema upgrades (PRAGMA user_version).
+
+    1  baseline              core tables + every module's tables
+    2  workload indexes      one index per hot lookup (see PLAN_CHECKS)
+    3  autograder results    per-test rows parsed from stored outputs
+    4  analytics rollups     dashboard tables + triggers (analytics.py)
+    5  feedback status       streaming / partial / done rows (feedback_stream.py)
+    6  llm backends          per-node pool stats for /metrics (llm_pool.py)
+    7  near-duplicate index  MinHash signatures + LSH buckets (near_dupes.py)
+    8  search skips streams  FTS triggers ignore 'streaming' feedback rows
+    9  job heartbeats        jobs.heartbeat_at, the lease running jobs renew
+   10  back-fill ledger      schema_backfills (see BACKFILLS)
+   11  render cache eviction rendered.size / rendered_at (rendering.evict)
+
+migrate() applies the steps above the database's user_version, each in
+its own BEGIN IMMEDIATE transaction that also bumps the version: a step
+that fails rolls back whole and is re-run next time, so an existing
+semester database is upgraded without losing rows.  Steps are
+append-only: never edit one that has shipped, add a new one.  They are
+schema only and frozen (their DDL is a copy, not the module's live DDL;
+Python parts just add columns), so a step does the same on any database.
+
+Derived data (search index, similarity vectors, rollups, …) is not part
+of a step: BACKFILLS lists each module rebuild with an explicit version.
+After the schema steps, migrate() runs every rebuild whose version is not
+recorded in schema_backfills yet, against the latest schema, each in its
+own transaction with its ledger row.  Bump a version when that rebuild's
+output changes and every database re-runs it once.
+
+check_plans() runs EXPLAIN QUERY PLAN over the hot queries and reports
+every full table scan; verify_db.py and `--check` fail on any.
+
+CLI:  python3 migrations.py            # upgrade $AGLLM_DB
+      python3 migrations.py --status   # current / pending versions
+      python3 migrations.py --check    # EXPLAIN QUERY PLAN gate
+"""
+
+import re, sys, sqlite3, argparse
+
+import db, analytics, autograder, near_dupes, repo_summary, search_index, similarity
+
+CORE_DDL = """
+CREATE TABLE IF NOT EXISTS students (
+  student_repo TEXT PRIMARY KEY,
+  additional_data TEXT
+);
+
+CREATE TABLE IF NOT EXISTS assignments (
+  id INTEGER PRIMARY KEY,
+  description TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS submissions (
+  id            INTEGER PRIMARY KEY,
+  student_repo  TEXT    NOT NULL REFERENCES students(student_repo),
+  assignment_id INTEGER NOT NULL REFERENCES assignments(id),
+  code TEXT,                     -- legacy single-blob (NULL = derive from code_files)
+  submitted_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS code_files (
+  id            INTEGER PRIMARY KEY,
+  submission_id INTEGER NOT NULL REFERENCES submissions(id),
+  filename      TEXT NOT NULL,
+  code          TEXT NOT NULL DEFAULT '',   -- legacy inline text
+  blob_hash     TEXT REFERENCES blobs(hash)
+);
+
+CREATE TABLE IF NOT EXISTS feedback (
+  id            INTEGER PRIMARY KEY,
+  submission_id INTEGER NOT NULL REFERENCES submissions(id),
+  repo_name     TEXT    NOT NULL,
+  feedback_text TEXT    NOT NULL,
+  generated_at  TEXT    NOT NULL,
+  reviewed      INTEGER NOT NULL DEFAULT 0,
+  teacher_comments TEXT,
+  reviewed_at   TEXT,
+  from_cache    INTEGER NOT NULL DEFAULT 0   -- 1 = reused llm_cache entry
+);
+
+CREATE TABLE IF NOT EXISTS autograder_outputs (
+  id INTEGER PRIMARY KEY,
+  submission_id INTEGER NOT NULL REFERENCES submissions(id),
+  output TEXT NOT NULL,
+  generated_at TEXT NOT NULL
+);
+
+"""
+
+# columns the original dbschema script did not have
+LEGACY_COLUMNS = {
+    "feedback": {
+        "repo_name":        "TEXT NOT NULL DEFAULT ''",
+        "reviewed":         "INTEGER NOT NULL DEFAULT 0",
+        "teacher_comments": "TEXT",
+        "reviewed_at":      "TEXT",
+        "from_cache":       "INTEGER NOT NULL DEFAULT 0",
+    },
+    "code_files": {
+        "blob_hash":        "TEXT REFERENCES blobs(hash)",
+    },
+}
+
+def _add_columns(conn: sqlite3.Connection, table: str, columns: dict) -> None:
+    have = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns.items():
+        if name not in have:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+def _legacy_columns(conn: sqlite3.Connection) -> None:
+    for table, columns in LEGACY_COLUMNS.items():
+        _add_columns(conn, table, columns)
+
+# core indexes (after _legacy_columns) + blobstore, llm_cache, prompt_packer,
+# job_queue, rendering, repo_summary, search_index, similarity and metrics
+# tables as they were at v1
+BASELINE_DDL = """
+CREATE INDEX IF NOT EXISTS idx_feedback_repo ON feedback(repo_name, reviewed);
+CREATE INDEX IF NOT EXISTS idx_codefiles_sub ON code_files(submission_id);
+
+CREATE TABLE IF NOT EXISTS blobs (
+  hash       TEXT PRIMARY KEY,          -- sha256 hex of the UTF-8 text
+  size       INTEGER NOT NULL,          -- uncompressed length in bytes
+  compressed INTEGER NOT NULL DEFAULT 0,
+  data       BLOB    NOT NULL
+);
+CREATE TABLE IF NOT EXISTS llm_cache (
+  key           TEXT PRIMARY KEY,        -- sha256 of prompt + model + params
+  model         TEXT    NOT NULL,
+  feedback_text TEXT    NOT NULL,
+  size          INTEGER NOT NULL,        -- len(feedback_text) in bytes
+  created_at    TEXT    NOT NULL,
+  last_hit_at   TEXT,
+  hits          INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_lru
+    ON llm_cache(COALESCE(last_hit_at, created_at));
+CREATE TABLE IF NOT EXISTS prompt_omissions (
+  id            INTEGER PRIMARY KEY,
+  submission_id INTEGER NOT NULL REFERENCES submissions(id),
+  filename      TEXT    NOT NULL,
+  action        TEXT    NOT NULL,        -- 'summarized' | 'dropped' | ingest skip reason
+  est_tokens    INTEGER NOT NULL         -- size of the full file
+);
+CREATE INDEX IF NOT EXISTS idx_prompt_omissions_sub ON prompt_omissions(submission_id);
+CREATE TABLE IF NOT EXISTS jobs (
+  id            INTEGER PRIMARY KEY,
+  repo_name     TEXT    NOT NULL,
+  commit_sha    TEXT,
+  status        TEXT    NOT NULL DEFAULT 'queued',
+                -- queued | running | done | failed | superseded
+  spool_dir     TEXT    NOT NULL,
+  attempts      INTEGER NOT NULL DEFAULT 0,
+  not_before    TEXT    NOT NULL,          -- earliest (re)try time
+  enqueued_at   TEXT    NOT NULL,
+  started_at    TEXT,
+  finished_at   TEXT,
+  worker        TEXT,
+  submission_id INTEGER REFERENCES submissions(id),
+  superseded_by INTEGER REFERENCES jobs(id),
+  error         TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(status, not_before, id);
+CREATE INDEX IF NOT EXISTS idx_jobs_repo  ON jobs(repo_name, status);
+CREATE TABLE IF NOT EXISTS rendered (
+  hash     TEXT NOT NULL,               -- sha256 of the source text
+  kind     TEXT NOT NULL,               -- 'md' | 'code:<lexer>'
+  version  TEXT NOT NULL,               -- RENDER_VERSION at render time
+  html     TEXT NOT NULL,
+  PRIMARY KEY (hash, kind)
+);
+CREATE TABLE IF NOT EXISTS repo_summary (
+  repo_name   TEXT PRIMARY KEY,
+  unreviewed  INTEGER NOT NULL DEFAULT 0,
+  red_flag    INTEGER NOT NULL DEFAULT 0,
+  updated_at  TEXT    NOT NULL
+);
+CREATE TABLE IF NOT EXISTS submission_flags (
+  submission_id INTEGER PRIMARY KEY REFERENCES submissions(id),
+  repo_name     TEXT    NOT NULL,
+  hits          INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_submission_flags_repo ON submission_flags(repo_name, hits);
+CREATE TABLE IF NOT EXISTS summary_meta (
+  key   TEXT PRIMARY KEY,
+  value TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS fts_feedback USING fts5(
+  feedback_text, teacher_comments,
+  content='feedback', content_rowid='id',
+  tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS fts_feedback_ai AFTER INSERT ON feedback BEGIN
+  INSERT INTO fts_feedback(rowid, feedback_text, teacher_comments)
+  VALUES (new.id, new.feedback_text, new.teacher_comments);
+END;
+CREATE TRIGGER IF NOT EXISTS fts_feedback_ad AFTER DELETE ON feedback BEGIN
+  INSERT INTO fts_feedback(fts_feedback, rowid, feedback_text, teacher_comments)
+  VALUES ('delete', old.id, old.feedback_text, old.teacher_comments);
+END;
+CREATE TRIGGER IF NOT EXISTS fts_feedback_au
+AFTER UPDATE OF feedback_text, teacher_comments ON feedback BEGIN
+  INSERT INTO fts_feedback(fts_feedback, rowid, feedback_text, teacher_comments)
+  VALUES ('delete', old.id, old.feedback_text, old.teacher_comments);
+  INSERT INTO fts_feedback(rowid, feedback_text, teacher_comments)
+  VALUES (new.id, new.feedback_text, new.teacher_comments);
+END;
+
+CREATE VIEW IF NOT EXISTS blob_text(rowid, body) AS
+  SELECT rowid, agllm_blob_text(data, compressed) FROM blobs;
+CREATE VIRTUAL TABLE IF NOT EXISTS fts_code USING fts5(
+  body,
+  content='blob_text', content_rowid='rowid',
+  tokenize="unicode61 tokenchars '_'"
+);
+CREATE TRIGGER IF NOT EXISTS fts_code_ai AFTER INSERT ON blobs BEGIN
+  INSERT INTO fts_code(rowid, body)
+  VALUES (new.rowid, agllm_blob_text(new.data, new.compressed));
+END;
+CREATE TRIGGER IF NOT EXISTS fts_code_ad AFTER DELETE ON blobs BEGIN
+  INSERT INTO fts_code(fts_code, rowid, body)
+  VALUES ('delete', old.rowid, agllm_blob_text(old.data, old.compressed));
+END;
+CREATE INDEX IF NOT EXISTS idx_codefiles_blob ON code_files(blob_hash);
+CREATE TABLE IF NOT EXISTS sim_vectors (
+  feedback_id   INTEGER PRIMARY KEY REFERENCES feedback(id),
+  submission_id INTEGER NOT NULL,
+  repo_name     TEXT    NOT NULL,
+  comment       TEXT    NOT NULL,
+  dim           INTEGER NOT NULL,
+  vec           BLOB    NOT NULL,          -- float32[dim], L2-normalised
+  seq           INTEGER NOT NULL           -- bumped on every write (cache sync)
+);
+CREATE INDEX IF NOT EXISTS idx_sim_vectors_seq ON sim_vectors(seq);
+CREATE TABLE IF NOT EXISTS run_metrics (
+  submission_id INTEGER NOT NULL REFERENCES submissions(id),
+  name          TEXT    NOT NULL,      -- 'stage.llm', 'llm.eval_count', …
+  value         REAL    NOT NULL,      -- stage.* in milliseconds
+  recorded_at   TEXT    NOT NULL,
+  PRIMARY KEY (submission_id, name)
+);
+"""
+
+WORKLOAD_INDEXES = """
+-- search_db / database_retrieve / diff_prompt: a repo's submissions, newest first
+CREATE INDEX IF NOT EXISTS idx_submissions_repo ON submissions(student_repo);
+-- review queue (ORDER BY generated_at) and repo_summary.refresh counts;
+-- replaces idx_feedback_repo(repo_name, reviewed)
+CREATE INDEX IF NOT EXISTS idx_feedback_queue
+    ON feedback(repo_name, reviewed, generated_at);
+DROP INDEX IF EXISTS idx_feedback_repo;
+-- latest feedback / comments of one submission
+CREATE INDEX IF NOT EXISTS idx_feedback_sub ON feedback(submission_id);
+CREATE INDEX IF NOT EXISTS idx_autograder_sub ON autograder_outputs(submission_id);
+"""
+
+AUTOGRADER_RESULTS_DDL = """
+CREATE TABLE IF NOT EXISTS autograder_results (
+  id            INTEGER PRIMARY KEY,
+  submission_id INTEGER NOT NULL REFERENCES submissions(id),
+  test          TEXT    NOT NULL,
+  status        TEXT    NOT NULL,        -- pass | fail | error
+  points        REAL,
+  max_points    REAL,
+  excerpt       TEXT,                    -- failing tests only
+  recorded_at   TEXT    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_autograder_results_sub
+    ON autograder_results(submission_id);
+CREATE INDEX IF NOT EXISTS idx_autograder_results_recent
+    ON autograder_results(recorded_at, test, status);
+"""
+
+def _autograder_points(conn: sqlite3.Connection) -> None:
+    _add_columns(conn, "autograder_outputs", {"points": "REAL", "max_points": "REAL"})
+
+ANALYTICS_DDL = """
+CREATE TABLE IF NOT EXISTS analytics_daily (
+  assignment_id INTEGER NOT NULL,
+  day           TEXT    NOT NULL,            -- YYYY-MM-DD (UTC)
+  pushes        INTEGER NOT NULL DEFAULT 0,
+  perfect       INTEGER NOT NULL DEFAULT 0,
+  points        REAL    NOT NULL DEFAULT 0,
+  max_points    REAL    NOT NULL DEFAULT 0,
+  new_passes    INTEGER NOT NULL DEFAULT 0,  -- students whose first perfect push it was
+  unreviewed    INTEGER NOT NULL DEFAULT 0,  -- by feedback generation day
+  PRIMARY KEY (assignment_id, day)
+);
+CREATE TABLE IF NOT EXISTS analytics_students (
+  assignment_id  INTEGER NOT NULL,
+  repo_name      TEXT    NOT NULL,
+  pushes         INTEGER NOT NULL DEFAULT 0,
+  first_at       TEXT,
+  last_at        TEXT,
+  best_points    REAL,
+  max_points     REAL,
+  passed_at      TEXT,                       -- first perfect push
+  pushes_to_pass INTEGER,
+  PRIMARY KEY (assignment_id, repo_name)
+);
+-- slowest to pass: not yet passed first, then most pushes (see dashboard())
+CREATE INDEX IF NOT EXISTS idx_analytics_students_slow
+    ON analytics_students(assignment_id, passed_at IS NOT NULL,
+                          COALESCE(pushes_to_pass, pushes) DESC);
+
+CREATE TRIGGER IF NOT EXISTS analytics_push AFTER INSERT ON autograder_outputs BEGIN
+  INSERT INTO analytics_students(assignment_id, repo_name, pushes, first_at, last_at,
+                                 best_points, max_points, passed_at, pushes_to_pass)
+  SELECT s.assignment_id, s.student_repo, 1, s.submitted_at, s.submitted_at,
+         new.points, new.max_points,
+         CASE WHEN (new.max_points > 0 AND new.points >= new.max_points) THEN s.submitted_at END,
+         CASE WHEN (new.max_points > 0 AND new.points >= new.max_points) THEN 1 END
+    FROM submissions s WHERE s.id = new.submission_id
+  ON CONFLICT(assignment_id, repo_name) DO UPDATE SET
+         pushes         = pushes + 1,
+         first_at       = MIN(first_at, excluded.first_at),
+         last_at        = MAX(last_at, excluded.last_at),
+         best_points    = COALESCE(MAX(best_points, excluded.best_points),
+                                   best_points, excluded.best_points),
+         max_points     = COALESCE(excluded.max_points, max_points),
+         passed_at      = COALESCE(passed_at, excluded.passed_at),
+         pushes_to_pass = COALESCE(pushes_to_pass,
+                                   CASE WHEN excluded.passed_at IS NOT NULL
+                                        THEN pushes + 1 END);
+  INSERT INTO analytics_daily(assignment_id, day, pushes, perfect, points, max_points,
+                              new_passes)
+  SELECT s.assignment_id, substr(s.submitted_at, 1, 10), 1,
+         COALESCE((new.max_points > 0 AND new.points >= new.max_points), 0),
+         COALESCE(new.points, 0), COALESCE(new.max_points, 0),
+         COALESCE(st.pushes_to_pass = st.pushes, 0)
+    FROM submissions s
+    JOIN analytics_students st ON st.assignment_id = s.assignment_id
+                              AND st.repo_name = s.student_repo
+   WHERE s.id = new.submission_id
+  ON CONFLICT(assignment_id, day) DO UPDATE SET
+         pushes     = pushes + 1,
+         perfect    = perfect + excluded.perfect,
+         points     = points + excluded.points,
+         max_points = max_points + excluded.max_points,
+         new_passes = new_passes + excluded.new_passes;
+END;
+
+CREATE TRIGGER IF NOT EXISTS analytics_fb_ai AFTER INSERT ON feedback
+WHEN new.reviewed = 0 BEGIN
+  INSERT INTO analytics_daily(assignment_id, day, unreviewed)
+  SELECT assignment_id, substr(new.generated_at, 1, 10), 1
+    FROM submissions WHERE id = new.submission_id
+  ON CONFLICT(assignment_id, day) DO UPDATE SET unreviewed = unreviewed + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS analytics_fb_au AFTER UPDATE OF reviewed ON feedback
+WHEN (old.reviewed = 0) <> (new.reviewed = 0) BEGIN
+  INSERT INTO analytics_daily(assignment_id, day, unreviewed)
+  SELECT assignment_id, substr(new.generated_at, 1, 10),
+         CASE WHEN new.reviewed = 0 THEN 1 ELSE -1 END
+    FROM submissions WHERE id = new.submission_id
+  ON CONFLICT(assignment_id, day) DO UPDATE SET
+         unreviewed = unreviewed + excluded.unreviewed;
+END;
+CREATE TRIGGER IF NOT EXISTS analytics_fb_ad AFTER DELETE ON feedback
+WHEN old.reviewed = 0 BEGIN
+  UPDATE analytics_daily SET unreviewed = unreviewed - 1
+   WHERE assignment_id = (SELECT assignment_id FROM submissions WHERE id = old.submission_id)
+     AND day = substr(old.generated_at, 1, 10);
+END;
+"""
+
+def _feedback_status(conn: sqlite3.Connection) -> None:
+    _add_columns(conn, "feedback", {"status": "TEXT NOT NULL DEFAULT 'done'"})
+
+FEEDBACK_STATUS_DDL = """
+CREATE INDEX IF NOT EXISTS idx_feedback_live
+    ON feedback(repo_name, id) WHERE status <> 'done';
+"""
+
+LLM_BACKENDS_DDL = """
+CREATE TABLE IF NOT EXISTS llm_backends (
+  host          TEXT PRIMARY KEY,
+  model         TEXT    NOT NULL,
+  max_requests  INTEGER NOT NULL,
+  healthy       INTEGER NOT NULL,
+  outstanding   INTEGER NOT NULL,
+  requests      INTEGER NOT NULL,
+  failures      INTEGER NOT NULL,
+  p50_ms        REAL,
+  p95_ms        REAL,
+  last_error    TEXT,
+  updated_at    TEXT    NOT NULL
+);
+"""
+
+NEAR_DUPES_DDL = """
+CREATE TABLE IF NOT EXISTS dupe_signatures (
+  submission_id INTEGER PRIMARY KEY,
+  assignment_id INTEGER NOT NULL,
+  repo_name     TEXT    NOT NULL,
+  shingles      INTEGER NOT NULL,        -- after starter removal
+  perms         INTEGER NOT NULL,
+  sig           BLOB    NOT NULL         -- uint32[perms]
+);
+CREATE TABLE IF NOT EXISTS dupe_buckets (
+  assignment_id INTEGER NOT NULL,
+  band          INTEGER NOT NULL,
+  bucket        INTEGER NOT NULL,        -- 64-bit hash of the band's rows
+  submission_id INTEGER NOT NULL,
+  PRIMARY KEY (assignment_id, band, bucket, submission_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dupe_starter (
+  assignment_id INTEGER NOT NULL,
+  shingle       INTEGER NOT NULL,
+  source        TEXT    NOT NULL,        -- 'config' (--starter) | 'auto' (rebuild)
+  PRIMARY KEY (assignment_id, shingle)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dupe_repos (
+  repo_name           TEXT PRIMARY KEY,
+  assignment_id       INTEGER NOT NULL,
+  score               REAL    NOT NULL,
+  match_repo          TEXT    NOT NULL,
+  submission_id       INTEGER NOT NULL,
+  match_submission_id INTEGER NOT NULL,
+  updated_at          TEXT    NOT NULL
+);
+"""
+
+FTS_SKIP_STREAMING = """
+DROP TRIGGER IF EXISTS fts_feedback_ai;
+DROP TRIGGER IF EXISTS fts_feedback_ad;
+DROP TRIGGER IF EXISTS fts_feedback_au;
+-- 'streaming' rows are not indexed: Writer flushes would re-index them
+-- every FLUSH_SECS; the update that ends the stream indexes them once
+CREATE TRIGGER IF NOT EXISTS fts_feedback_ai AFTER INSERT ON feedback
+WHEN new.status <> 'streaming' BEGIN
+  INSERT INTO fts_feedback(rowid, feedback_text, teacher_comments)
+  VALUES (new.id, new.feedback_text, new.teacher_comments);
+END;
+CREATE TRIGGER IF NOT EXISTS fts_feedback_ad AFTER DELETE ON feedback
+WHEN old.status <> 'streaming' BEGIN
+  INSERT INTO fts_feedback(fts_feedback, rowid, feedback_text, teacher_comments)
+  VALUES ('delete', old.id, old.feedback_text, old.teacher_comments);
+END;
+CREATE TRIGGER IF NOT EXISTS fts_feedback_au
+AFTER UPDATE OF feedback_text, teacher_comments, status ON feedback
+WHEN old.status <> 'streaming' OR new.status <> 'streaming' BEGIN
+  INSERT INTO fts_feedback(fts_feedback, rowid, feedback_text, teacher_comments)
+  SELECT 'delete', old.id, old.feedback_text, old.teacher_comments
+   WHERE old.status <> 'streaming';
+  INSERT INTO fts_feedback(rowid, feedback_text, teacher_comments)
+  SELECT new.id, new.feedback_text, new.teacher_comments
+   WHERE new.status <> 'streaming';
+END;
+INSERT INTO fts_feedback(fts_feedback) VALUES ('delete-all');
+INSERT INTO fts_feedback(rowid, feedback_text, teacher_comments)
+  SELECT id, feedback_text, teacher_comments FROM feedback WHERE status <> 'streaming';
+"""
+
+def _job_heartbeats(conn: sqlite3.Connection) -> None:
+    _add_columns(conn, "jobs", {"heartbeat_at": "TEXT"})
+
+BACKFILL_LEDGER = """
+CREATE TABLE IF NOT EXISTS schema_backfills (
+  name        TEXT PRIMARY KEY,
+  version     INTEGER NOT NULL,
+  applied_at  TEXT    NOT NULL
+);
+"""
+
+def _rendered_eviction(conn: sqlite3.Connection) -> None:
+    _add_columns(conn, "rendered", {"size": "INTEGER NOT NULL DEFAULT 0",
+                                    "rendered_at": "TEXT"})
+
+RENDERED_EVICTION = """
+UPDATE rendered SET size = LENGTH(CAST(html AS BLOB)),
+                    rendered_at = STRFTIME('%Y-%m-%dT%H:%M:%fZ', 'now');
+CREATE INDEX IF NOT EXISTS idx_rendered_age ON rendered(rendered_at);
+"""
+
+# (version, description, parts): each part is a SQL script or a callable(conn).
+# Scripts are frozen copies of the DDL a step shipped with (modules' DDL may
+# move on); callables only add columns, and must not commit.
+MIGRATIONS = [
+    (1, "baseline", (CORE_DDL, _legacy_columns, BASELINE_DDL)),
+    (2, "workload indexes", (WORKLOAD_INDEXES,)),
+    (3, "autograder results", (AUTOGRADER_RESULTS_DDL, _autograder_points)),
+    (4, "analytics rollups", (ANALYTICS_DDL,)),
+    (5, "feedback status", (_feedback_status, FEEDBACK_STATUS_DDL)),
+    (6, "llm backends", (LLM_BACKENDS_DDL,)),
+    (7, "near-duplicate index", (NEAR_DUPES_DDL,)),
+    (8, "search skips streams", (FTS_SKIP_STREAMING,)),
+    (9, "job heartbeats", (_job_heartbeats,)),
+    (10, "back-fill ledger", (BACKFILL_LEDGER,)),
+    (11, "render cache eviction", (_rendered_eviction, RENDERED_EVICTION)),
+]
+LATEST = MIGRATIONS[-1][0]
+
+# (name, version, rebuild(conn)): live module code, run on the latest schema.
+# Bump the version whenever a rebuild's output changes.  Rebuilds must be
+# idempotent and must not commit.
+BACKFILLS = [
+    ("search_index.rebuild", 1, search_index.rebuild),
+    ("similarity.rebuild",   1, similarity.rebuild),
+    ("repo_summary.rebuild", 1, repo_summary.rebuild),
+    ("autograder.backfill",  1, autograder.backfill),
+    ("analytics.rebuild",    1, analytics.rebuild),
+    ("near_dupes.rebuild",   1, near_dupes.rebuild),
+]
+
+# ─────────────────────────── runner ─────────────────────────────
+def version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def _statements(script: str):
+    buf = ""
+    for line in script.splitlines(keepends=True):
+        if line.lstrip().startswith("--"):
+            continue
+        buf += line
+        if sqlite3.complete_statement(buf):
+            yield buf.strip()
+            buf = ""
+
+def pending_backfills(conn: sqlite3.Connection) -> list:
+    """BACKFILLS entries whose version is not recorded (needs schema v10)."""
+    done = dict(conn.execute("SELECT name, version FROM schema_backfills"))
+    return [b for b in BACKFILLS if done.get(b[0]) != b[1]]
+
+def backfill(conn: sqlite3.Connection, verbose: bool = False) -> list:
+    """Run pending rebuilds, each atomic with its ledger row; returns their names."""
+    applied = []
+    for name, ver, rebuild in pending_backfills(conn):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT version FROM schema_backfills WHERE name = ?",
+                               (name,)).fetchone()
+            if row and row[0] == ver:       # another process got here first
+                conn.rollback()
+                continue
+            rebuild(conn)
+            if not conn.in_transaction:
+                raise RuntimeError(f"back-fill {name} committed mid-step")
+            conn.execute("INSERT OR REPLACE INTO schema_backfills(name, version, applied_at) "
+                         "VALUES (?,?,datetime('now'))", (name, ver))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        applied.append(name)
+        if verbose:
+            print(f"🔁  back-fill {name} v{ver}")
+    return applied
+
+def migrate(conn: sqlite3.Connection, target: int = LATEST, verbose: bool = False) -> list:
+    """Apply pending steps up to `target`, then (at LATEST) pending back-fills;
+    returns the schema versions applied."""
+    if version(conn) >= target and (target < LATEST or not pending_backfills(conn)):
+        return []
+    if conn.in_transaction:
+        conn.commit()
+    applied = []
+    for ver, desc, parts in MIGRATIONS:
+        if ver > target:
+            break
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version(conn) >= ver:        # another process got here first
+                conn.rollback()
+                continue
+            for part in parts:
+                if callable(part):
+                    part(conn)
+                else:
+                    for stmt in _statements(part):
+                        conn.execute(stmt)
+                if not conn.in_transaction:
+                    raise RuntimeError(f"schema v{ver}: {part!r} committed mid-step")
+            conn.execute(f"PRAGMA user_version = {ver}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        applied.append(ver)
+        if verbose:
+            print(f"⬆️  schema v{ver}: {desc}")
+    if target >= LATEST:
+        backfill(conn, verbose)
+    return applied
+
+# ─────────────────────────── plan check ─────────────────────────
+# representative forms of the per-request queries (any parameter values)
+PLAN_CHECKS = {
+    "search_db.page": ("""
+        SELECT s.id, s.submitted_at,
+               (SELECT COUNT(*) FROM code_files cf WHERE cf.submission_id = s.id),
+               (SELECT SUBSTR(a.output, 1, 80) FROM autograder_outputs a
+                 WHERE a.submission_id = s.id ORDER BY a.id DESC LIMIT 1),
+               f.feedback_text
+          FROM submissions s
+     LEFT JOIN feedback f ON f.id = (SELECT MAX(id) FROM feedback
+                                      WHERE submission_id = s.id)
+         WHERE s.student_repo = ?
+      ORDER BY s.id DESC LIMIT 20""", ("repo",)),
+    "diff_prompt.previous_submission": ("""
+        SELECT s.id,
+               (SELECT f.feedback_text FROM feedback f
+                 WHERE f.submission_id = s.id ORDER BY f.id DESC LIMIT 1)
+          FROM submissions s
+         WHERE s.student_repo = ?
+           AND EXISTS (SELECT 1 FROM code_files cf WHERE cf.submission_id = s.id)
+           AND NOT EXISTS (SELECT 1 FROM feedback f
+                            WHERE f.submission_id = s.id AND f.status <> 'done')
+      ORDER BY s.id DESC LIMIT 1""", ("repo",)),
+    "teacher_ui.review_queue": ("""
+        SELECT * FROM feedback
+         WHERE reviewed = 0 AND repo_name = ?
+      ORDER BY generated_at DESC, id DESC LIMIT 11""", ("repo",)),
+    "teacher_ui.files": (
+        "SELECT filename, COALESCE(blob_hash, '') FROM code_files "
+        "WHERE submission_id = ? ORDER BY filename", (1,)),
+    "repo_summary.refresh": (
+        "SELECT COUNT(*) FROM feedback WHERE repo_name = ? AND reviewed = 0", ("repo",)),
+    "similarity.recent": (
+        "SELECT teacher_comments FROM feedback WHERE repo_name = ? AND reviewed = 1 "
+        "AND COALESCE(teacher_comments, '') <> '' ORDER BY reviewed_at DESC LIMIT 3",
+        ("repo",)),
+    "repo_summary.comments": (
+        "SELECT teacher_comments FROM feedback WHERE submission_id = ?", (1,)),
+    "database_retrieve.repo": ("""
+        SELECT f.submission_id, f.id, f.feedback_text
+          FROM feedback f JOIN submissions s ON s.id = f.submission_id
+         WHERE s.student_repo = ? ORDER BY f.submission_id, f.id""", ("repo",)),
+    "job_queue.result": (
+        "SELECT feedback_text FROM feedback WHERE submission_id = ? "
+        "ORDER BY id DESC LIMIT 1", (1,)),
+    "autograder.results_for": (
+        "SELECT submission_id, test, status FROM autograder_results "
+        "WHERE submission_id IN (?, ?) ORDER BY id", (1, 2)),
+    "autograder.top_failing": ("""
+        SELECT test, SUM(status <> 'pass') AS failures, COUNT(*) FROM autograder_results
+         WHERE recorded_at >= ? GROUP BY test""", ("2025-01-01",)),
+    "analytics.timeline": (
+        "SELECT day, pushes FROM analytics_daily WHERE assignment_id = ? AND day >= ? "
+        "ORDER BY day", (1, "2025-01-01")),
+    "analytics.slowest": ("""
+        SELECT repo_name FROM analytics_students WHERE assignment_id = ?
+         ORDER BY passed_at IS NOT NULL, COALESCE(pushes_to_pass, pushes) DESC
+         LIMIT 10""", (1,)),
+    "feedback_stream.resumable": ("""
+        SELECT f.submission_id, f.id FROM feedback f
+         WHERE f.repo_name = ? AND f.status <> 'done'
+           AND f.submission_id = (SELECT MAX(id) FROM submissions WHERE student_repo = ?)
+      ORDER BY f.id DESC LIMIT 1""", ("repo", "repo")),
+    "feedback_stream.events": (
+        "SELECT feedback_text, status FROM feedback WHERE id = ?", (1,)),
+    "near_dupes.bucket": (
+        "SELECT submission_id FROM dupe_buckets "
+        "WHERE assignment_id = ? AND band = ? AND bucket = ?", (1, 0, 0)),
+    "near_dupes.signatures": (
+        "SELECT submission_id, repo_name, sig FROM dupe_signatures "
+        "WHERE submission_id IN (?, ?) AND perms = ?", (1, 2, 128)),
+    "job_queue.claim": (
+        "SELECT * FROM jobs WHERE status = 'queued' AND not_before <= ? "
+        "ORDER BY id LIMIT 1", ("2025-01-01",)),
+}
+
+_FULL_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+
+def full_scans(conn: sqlite3.Connection, sql: str, args=()) -> list:
+    """Tables EXPLAIN QUERY PLAN reads without any index."""
+    plan = conn.execute("EXPLAIN QUERY PLAN " + sql, args).fetchall()
+    return [m.group(1) for row in plan if (m := _FULL_SCAN_RE.match(row[-1]))]
+
+def check_plans(conn: sqlite3.Connection) -> dict:
+    """{query name: [fully scanned tables]} for every failing PLAN_CHECKS entry."""
+    bad = {}
+    for name, (sql, args) in PLAN_CHECKS.items():
+        scans = full_scans(conn, sql, args)
+        if scans:
+            bad[name] = scans
+    return bad
+
+# ─────────────────────────── CLI ────────────────────────────────
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="AGLLM schema migrations.")
+    g = ap.add_mutually_exclusive_group()
+    g.add_argument("--status", action="store_true", help="show current / pending versions")
+    g.add_argument("--check", action="store_true", help="fail on full table scans")
+    args = ap.parse_args()
+
+    conn = db.connect()
+    if args.status:
+        cur = version(conn)
+        print(f"schema v{cur} (latest v{LATEST})")
+        for ver, desc, _ in MIGRATIONS:
+            print(f"  {'✅' if ver <= cur else '⏳'} v{ver} {desc}")
+        if cur >= LATEST:
+            todo = {b[0] for b in pending_backfills(conn)}
+            for name, ver, _ in BACKFILLS:
+                print(f"  {'⏳' if name in todo else '✅'} {name} v{ver}")
+    elif args.check:
+        bad = check_plans(conn)
+        for name, tables in bad.items():
+            print(f"❌ {name}: full scan of {', '.join(tables)}")
+        print(f"{'❌' if bad else '✅'} {len(PLAN_CHECKS) - len(bad)}/{len(PLAN_CHECKS)} "
+              "hot queries use an index")
+        conn.close()
+        sys.exit(1 if bad else 0)
+    else:
+        migrate(conn, verbose=True)
+        print(f"✅ schema v{version(conn)}, back-fills current")
+    conn.close()
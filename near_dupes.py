@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+near_dupes.py
+────────────────────────────────────────────────────────────
+Near-identical code across students of the same assignment.
+
+    dupe_signatures  submission_id → MinHash signature of its code
+    dupe_buckets     (assignment, band, bucket) → submission_id   (LSH index)
+    dupe_starter     shingles of shared starter code, ignored everywhere
+    dupe_repos       repo → best match in another repo (teacher UI column)
+
+Every push is shingled ($AGLLM_DUPE_SHINGLE tokens per shingle, comments and
+string literals blanked, files never joined), starter shingles are removed
+and the rest is MinHashed into $AGLLM_DUPE_BANDS × $AGLLM_DUPE_ROWS values.
+control_code calls add() in the insert transaction; a lookup reads one bucket
+per band, so it only touches submissions that collide somewhere instead of
+the whole cohort, and the estimated Jaccard similarity is the share of
+equal signature values.
+
+Starter code is registered explicitly (--starter DIR), and rebuild() also
+treats shingles found in ≥ $AGLLM_DUPE_STARTER_SHARE of an assignment's
+repos as starter code.  Archived pushes (archive.py) stay indexed: rebuild()
+shingles them from their archived records.
+
+CLI:  python3 near_dupes.py --rebuild [--jobs N]        # process pool
+      python3 near_dupes.py --similar SID
+      python3 near_dupes.py --starter DIR --assignment N  # then rebuilds
+      python3 near_dupes.py --top 20
+"""
+
+import os, sys, zlib, hashlib, sqlite3, argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+
+import numpy as np
+
+import archive, blobstore, db, ingest
+from rules import strip_comments
+from similarity import TOKEN_RE
+
+# ─────────────────────────── config ─────────────────────────────
+SHINGLE         = int(os.getenv("AGLLM_DUPE_SHINGLE", "5"))       # tokens per shingle
+BANDS           = int(os.getenv("AGLLM_DUPE_BANDS", "32"))
+ROWS            = int(os.getenv("AGLLM_DUPE_ROWS", "4"))          # BANDS × ROWS hashes
+MIN_SCORE       = float(os.getenv("AGLLM_DUPE_MIN", "0.5"))       # reported matches
+FLAG_SCORE      = float(os.getenv("AGLLM_DUPE_FLAG", "0.8"))      # highlighted in the UI
+STARTER_SHARE   = float(os.getenv("AGLLM_DUPE_STARTER_SHARE", "0.5"))
+STARTER_MIN     = 5                    # repos before shared shingles count as starter
+TOP_K           = 10
+CHUNK           = 64                   # submissions per worker task
+SEED            = 0x5EED
+
+PERMS = BANDS * ROWS
+_rng  = np.random.default_rng(SEED)
+_A    = _rng.integers(1, 2**63, PERMS, dtype=np.uint64) | np.uint64(1)
+_B    = _rng.integers(0, 2**63, PERMS, dtype=np.uint64)
+_MUL  = np.uint64(0x9E3779B97F4A7C15)         # window polynomial base
+
+DDL = """
+CREATE TABLE IF NOT EXISTS dupe_signatures (
+  submission_id INTEGER PRIMARY KEY,
+  assignment_id INTEGER NOT NULL,
+  repo_name     TEXT    NOT NULL,
+  shingles      INTEGER NOT NULL,        -- after starter removal
+  perms         INTEGER NOT NULL,
+  sig           BLOB    NOT NULL         -- uint32[perms]
+);
+CREATE TABLE IF NOT EXISTS dupe_buckets (
+  assignment_id INTEGER NOT NULL,
+  band          INTEGER NOT NULL,
+  bucket        INTEGER NOT NULL,        -- 64-bit hash of the band's rows
+  submission_id INTEGER NOT NULL,
+  PRIMARY KEY (assignment_id, band, bucket, submission_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dupe_starter (
+  assignment_id INTEGER NOT NULL,
+  shingle       INTEGER NOT NULL,
+  source        TEXT    NOT NULL,        -- 'config' (--starter) | 'auto' (rebuild)
+  PRIMARY KEY (assignment_id, shingle)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dupe_repos (
+  repo_name           TEXT PRIMARY KEY,
+  assignment_id       INTEGER NOT NULL,
+  score               REAL    NOT NULL,
+  match_repo          TEXT    NOT NULL,
+  submission_id       INTEGER NOT NULL,
+  match_submission_id INTEGER NOT NULL,
+  updated_at          TEXT    NOT NULL
+);
+"""
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    """Create the tables; index existing pushes the first time.
+
+    Signatures of another BANDS × ROWS are ignored until --rebuild."""
+    new = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'dupe_signatures'"
+                       ).fetchone() is None
+    conn.executescript(DDL)
+    if new:
+        rebuild(conn)
+    conn.commit()
+
+# ─────────────────────────── signatures ─────────────────────────
+def shingles(files) -> np.ndarray:
+    """Sorted unique 32-bit hashes of every SHINGLE-token window, per (name, text) file.
+
+    Each distinct token is crc32'd once; windows combine the token hashes
+    polynomially (mod 2**64)."""
+    out = []
+    for name, text in files:
+        toks = TOKEN_RE.findall(strip_comments(text or "", PurePosixPath(name).suffix.lower()))
+        if not toks:
+            continue
+        vocab, idx = np.unique(np.array(toks), return_inverse=True)
+        th = np.fromiter((zlib.crc32(t.encode("utf-8")) for t in vocab),
+                         dtype=np.uint64, count=len(vocab))[idx]
+        n = max(len(th) - SHINGLE + 1, 1)
+        acc = np.zeros(n, dtype=np.uint64)
+        for j in range(min(SHINGLE, len(th))):
+            acc = acc * _MUL + th[j:j + n]
+        out.append((acc >> np.uint64(32)).astype(np.uint32))
+    return np.unique(np.concatenate(out)) if out else np.zeros(0, dtype=np.uint32)
+
+def minhash(sh: np.ndarray) -> np.ndarray:
+    """uint32[PERMS] minimum of each multiply-shift hash (None for no shingles)."""
+    if not len(sh):
+        return None
+    sig = np.full(PERMS, np.iinfo(np.uint32).max, dtype=np.uint64)
+    x = sh.astype(np.uint64)
+    for i in range(0, len(x), 4096):             # bounded PERMS × 4096 temporary
+        h = (_A[:, None] * x[None, i:i + 4096] + _B[:, None]) >> np.uint64(32)
+        np.minimum(sig, h.min(axis=1), out=sig)
+    return sig.astype(np.uint32)
+
+def bands(sig: np.ndarray) -> list:
+    """[(band, bucket)] LSH keys of one signature."""
+    return [(b, int.from_bytes(hashlib.blake2b(sig[b * ROWS:(b + 1) * ROWS].tobytes(),
+                                               digest_size=8).digest(), "little", signed=True))
+            for b in range(BANDS)]
+
+def estimate(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.count_nonzero(a == b)) / len(a)
+
+_starter = {}                                  # assignment → (fingerprint, shingles)
+
+def starter(cur, assignment_id: int) -> np.ndarray:
+    """Starter shingles of an assignment (cached until the rows change)."""
+    n = cur.execute("SELECT COUNT(*), TOTAL(shingle) FROM dupe_starter "
+                    "WHERE assignment_id = ?", (assignment_id,)).fetchone()
+    hit = _starter.get(assignment_id)
+    if hit is None or hit[0] != n:
+        arr = np.array(sorted(r[0] for r in cur.execute(
+            "SELECT shingle FROM dupe_starter WHERE assignment_id = ?", (assignment_id,))),
+            dtype=np.uint32)
+        hit = _starter[assignment_id] = (n, arr)
+    return hit[1]
+
+def _store(cur, sid: int, aid: int, repo: str, sh: np.ndarray, sig: np.ndarray) -> None:
+    cur.execute("INSERT OR REPLACE INTO dupe_signatures"
+                "(submission_id, assignment_id, repo_name, shingles, perms, sig) "
+                "VALUES (?,?,?,?,?,?)", (sid, aid, repo, len(sh), PERMS, sig.tobytes()))
+    cur.executemany("INSERT OR IGNORE INTO dupe_buckets(assignment_id, band, bucket, "
+                    "submission_id) VALUES (?,?,?,?)",
+                    [(aid, b, k, sid) for b, k in bands(sig)])
+
+# ─────────────────────────── lookups ────────────────────────────
+def _candidates(cur, aid: int, sig: np.ndarray) -> set:
+    keys = bands(sig)
+    sql = " UNION ".join(["SELECT submission_id FROM dupe_buckets "
+                          "WHERE assignment_id = ? AND band = ? AND bucket = ?"] * len(keys))
+    return {r[0] for r in cur.execute(sql, [v for b, k in keys for v in (aid, b, k)])}
+
+def _matches(cur, aid: int, repo: str, sig: np.ndarray, k: int, min_score: float) -> list:
+    ids = list(_candidates(cur, aid, sig))
+    best = {}                                    # other repo → (score, sid)
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        for sid, other, data in cur.execute(
+                f"SELECT submission_id, repo_name, sig FROM dupe_signatures "
+                f"WHERE submission_id IN ({','.join('?' * len(chunk))}) AND perms = ?",
+                chunk + [PERMS]):
+            if other == repo:
+                continue
+            s = estimate(sig, np.frombuffer(data, dtype=np.uint32))
+            if s >= min_score and s > best.get(other, (-1, 0))[0]:
+                best[other] = (s, sid)
+    out = sorted(((s, sid, other) for other, (s, sid) in best.items()), reverse=True)
+    return out[:k]
+
+def similar(cur, submission_id: int, k: int = TOP_K, min_score: float = MIN_SCORE) -> list:
+    """[(score, submission_id, repo)] best push per other repo, most similar first."""
+    row = cur.execute("SELECT assignment_id, repo_name, sig FROM dupe_signatures "
+                      "WHERE submission_id = ? AND perms = ?",
+                      (submission_id, PERMS)).fetchone()
+    if row is None:
+        return []
+    return _matches(cur, row[0], row[1], np.frombuffer(row[2], dtype=np.uint32),
+                    k, min_score)
+
+def _bump(cur, repo: str, aid: int, score: float, other: str, sid: int, other_sid: int,
+          now: str) -> None:
+    """Raise a repo's best match (dupe_repos only ever grows)."""
+    cur.execute(
+        """INSERT INTO dupe_repos(repo_name, assignment_id, score, match_repo, submission_id,
+                                  match_submission_id, updated_at)
+           VALUES (?,?,?,?,?,?,?)
+           ON CONFLICT(repo_name) DO UPDATE SET
+               assignment_id = excluded.assignment_id, score = excluded.score,
+               match_repo = excluded.match_repo, submission_id = excluded.submission_id,
+               match_submission_id = excluded.match_submission_id,
+               updated_at = excluded.updated_at
+           WHERE excluded.score > dupe_repos.score""",
+        (repo, aid, score, other, sid, other_sid, now))
+
+# ─────────────────────────── write path ─────────────────────────
+def add(cur, submission_id: int, repo_name: str, assignment_id: int, files) -> list:
+    """Index one new push and update dupe_repos; returns its matches."""
+    sh = np.setdiff1d(shingles(files), starter(cur, assignment_id), assume_unique=True)
+    sig = minhash(sh)
+    if sig is None:
+        return []
+    found = _matches(cur, assignment_id, repo_name, sig, TOP_K, MIN_SCORE)
+    _store(cur, submission_id, assignment_id, repo_name, sh, sig)
+    now = datetime.utcnow().isoformat() + "Z"
+    for score, other_sid, other in found:
+        _bump(cur, repo_name, assignment_id, score, other, submission_id, other_sid, now)
+        _bump(cur, other, assignment_id, score, repo_name, other_sid, submission_id, now)
+    return found
+
+def add_starter(cur, assignment_id: int, files) -> int:
+    """Register starter code; returns the shingles added (rebuild to apply)."""
+    sh = shingles(files)
+    cur.executemany("INSERT OR REPLACE INTO dupe_starter(assignment_id, shingle, source) "
+                    "VALUES (?,?,'config')", [(assignment_id, int(s)) for s in sh])
+    return len(sh)
+
+# ─────────────────────────── rebuild ────────────────────────────
+def _shingles_of(conn: sqlite3.Connection, ids: list) -> list:
+    return [(sid, shingles(blobstore.submission_files(conn, sid))) for sid in ids]
+
+def _shingle_task(path: str, ids: list) -> list:
+    """Worker: [(submission_id, shingles)] read through its own connection."""
+    conn = db.connect(path)
+    try:
+        return _shingles_of(conn, ids)
+    finally:
+        conn.close()
+
+def _minhash_task(items: list, skip: np.ndarray) -> list:
+    out = []
+    for sid, sh in items:
+        sh = np.setdiff1d(sh, skip, assume_unique=True)
+        out.append((sid, sh, minhash(sh)))
+    return out
+
+def _map(pool, fn, tasks):
+    if pool is None:
+        return [fn(*t) for t in tasks]
+    return list(pool.map(fn, *zip(*tasks))) if tasks else []
+
+def rebuild(conn: sqlite3.Connection, processes: int = 1, path: str = None,
+            verbose: bool = False) -> int:
+    """Re-shingle every push (archived ones included), re-detect starter code,
+    re-index; returns pushes indexed.
+
+    Does not commit.  processes > 1 shingles and hashes on a process pool
+    (workers read committed rows of `path` through their own connections, so
+    commit before calling)."""
+    path = path or db.DB_PATH
+    subs = conn.execute("SELECT s.id, s.assignment_id, s.student_repo FROM submissions s "
+                        "WHERE EXISTS (SELECT 1 FROM code_files cf WHERE cf.submission_id "
+                        "= s.id) ORDER BY s.id").fetchall()
+    pool = ProcessPoolExecutor(processes) if processes > 1 and subs else None
+    try:
+        ids = [s[0] for s in subs]
+        chunks = [ids[i:i + CHUNK] for i in range(0, len(ids), CHUNK)]
+        sh = {}
+        # in-process reads go through conn, so they see its uncommitted rows
+        for part in (_map(pool, _shingle_task, [(path, c) for c in chunks]) if pool
+                     else [_shingles_of(conn, c) for c in chunks]):
+            sh.update(part)
+        hot = set(ids)
+        for rec in archive.records():
+            s = rec["submission"]
+            if s["id"] not in hot and rec["files"]:        # hot copy wins
+                subs.append((s["id"], s["assignment_id"], s["student_repo"]))
+                sh[s["id"]] = shingles([(f["filename"], f["code"]) for f in rec["files"]])
+        subs.sort(key=lambda s: s[0])
+        if verbose:
+            print(f"🧩  shingled {len(sh)} push(es)")
+
+        conn.execute("DELETE FROM dupe_signatures")
+        conn.execute("DELETE FROM dupe_buckets")
+        conn.execute("DELETE FROM dupe_repos")
+        conn.execute("DELETE FROM dupe_starter WHERE source = 'auto'")
+        by_aid = {}
+        for sid, aid, repo in subs:
+            by_aid.setdefault(aid, {}).setdefault(repo, []).append(sid)
+        indexed, now = 0, datetime.utcnow().isoformat() + "Z"
+        for aid, repos in by_aid.items():
+            # shingles in enough repos are starter code, not copying
+            if len(repos) >= STARTER_MIN:
+                per_repo = [np.unique(np.concatenate([sh[s] for s in sids]))
+                            for sids in repos.values()]
+                vals, counts = np.unique(np.concatenate(per_repo), return_counts=True)
+                common = vals[counts >= max(STARTER_MIN, STARTER_SHARE * len(repos))]
+                conn.executemany("INSERT OR IGNORE INTO dupe_starter(assignment_id, shingle, "
+                                 "source) VALUES (?,?,'auto')",
+                                 [(aid, int(s)) for s in common])
+            skip = starter(conn, aid)
+            items = [(sid, sh[sid]) for sids in repos.values() for sid in sids]
+            sigs, repo_of = {}, {sid: repo for repo, sids in repos.items() for sid in sids}
+            for part in _map(pool, _minhash_task,
+                             [(items[i:i + CHUNK], skip) for i in range(0, len(items), CHUNK)]):
+                for sid, s, sig in part:
+                    if sig is not None:
+                        _store(conn, sid, aid, repo_of[sid], s, sig)
+                        sigs[sid] = sig
+            indexed += len(sigs)
+            # candidate pairs straight from the buckets just written
+            pairs = set()
+            for (members,) in conn.execute(
+                    "SELECT group_concat(submission_id) FROM dupe_buckets "
+                    "WHERE assignment_id = ? GROUP BY band, bucket HAVING COUNT(*) > 1",
+                    (aid,)):
+                ms = sorted(int(m) for m in members.split(","))
+                pairs.update((a, b) for i, a in enumerate(ms) for b in ms[i + 1:]
+                             if repo_of[a] != repo_of[b])
+            for a, b in pairs:
+                s = estimate(sigs[a], sigs[b])
+                if s >= MIN_SCORE:
+                    _bump(conn, repo_of[a], aid, s, repo_of[b], a, b, now)
+                    _bump(conn, repo_of[b], aid, s, repo_of[a], b, a, now)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return indexed
+
+# ─────────────────────────── CLI ────────────────────────────────
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="MinHash/LSH near-duplicate index.")
+    g = ap.add_mutually_exclusive_group(required=True)
+    g.add_argument("--rebuild", action="store_true", help="re-index every push")
+    g.add_argument("--similar", type=int, metavar="SID", help="pushes similar to SID")
+    g.add_argument("--starter", type=Path, metavar="DIR",
+                   help="register starter code for --assignment, then rebuild")
+    g.add_argument("--top", type=int, metavar="N", help="repos with the closest matches")
+    ap.add_argument("--assignment", type=int, help="assignment id (with --starter)")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                    help="worker processes for --rebuild (default %(default)s)")
+    args = ap.parse_args()
+
+    conn = db.connect()
+    conn.executescript(DDL)
+    if args.similar:
+        hits = similar(conn, args.similar)
+        if not hits:
+            print(f"no push of another repo ≥ {MIN_SCORE:.0%} similar to #{args.similar}")
+        for score, sid, repo in hits:
+            print(f"{'🚩' if score >= FLAG_SCORE else '  '} {score:6.1%}  #{sid:<6} {repo}")
+    elif args.top:
+        for repo, score, other, sid, osid in conn.execute(
+                "SELECT repo_name, score, match_repo, submission_id, match_submission_id "
+                "FROM dupe_repos ORDER BY score DESC, repo_name LIMIT ?", (args.top,)):
+            print(f"{'🚩' if score >= FLAG_SCORE else '  '} {score:6.1%}  "
+                  f"{repo} #{sid}  ↔  {other} #{osid}")
+    else:
+        if args.starter:
+            if args.assignment is None:
+                sys.exit("--starter needs --assignment")
+            files = [(f.name, f.text) for f in ingest.iter_files(
+                args.starter, ingest.load_config(args.starter.parent)) if f.text is not None]
+            print(f"📎  {add_starter(conn, args.assignment, files)} starter shingle(s) "
+                  f"from {len(files)} file(s)")
+            conn.commit()
+        n = rebuild(conn, max(1, args.jobs), verbose=True)
+        conn.commit()
+        pairs = conn.execute("SELECT COUNT(*) FROM dupe_repos WHERE score >= ?",
+                             (FLAG_SCORE,)).fetchone()[0]
+        print(f"✅ {n} push(es) indexed, {pairs} repo(s) ≥ {FLAG_SCORE:.0%} similar "
+              f"to another ({BANDS}×{ROWS} LSH)")
+    conn.close()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+prompt_packer.py
+────────────────────────────────────────────────────────────
+Fits the student's files into a fixed token budget for the prompt.
+
+• Estimates tokens per section (≈ 4 chars / token, no tokenizer needed)
+• Ranks files: named in failing autograder output  >  mentioned in the
+  professor's README  >  ordinary source  >  data / lockfiles / generated
+• Packs whole files in rank order, then falls back to an outline
+  (signatures only) and finally drops what still does not fit
+• Returns what was summarized or dropped so the caller can record it
+
+Budget = the model's context window (modelfile `PARAMETER num_ctx`, sent
+explicitly as LLM_OPTIONS so Ollama does not fall back to its own default)
+minus the answer (`num_predict`) and the modelfile SYSTEM prompt, less 10 %
+headroom for the chars/token estimate. $AGLLM_PROMPT_TOKENS can only lower it.
+"""
+
+import os, re, sqlite3
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+
+import llm_cache
+
+# ─────────────────────────── config ─────────────────────────────
+CHARS_PER_TOKEN = 4
+MIN_CODE_TOKENS = 1000          # code always gets at least this much
+
+def _modelfile_int(params: dict, key: str, default: int) -> int:
+    try:
+        v = int(params.get(key, [default])[-1])
+    except ValueError:
+        return default
+    return v if v > 0 else default          # num_predict -1 = unbounded
+
+_PARAMS         = llm_cache.modelfile_params()
+NUM_CTX         = int(os.getenv("AGLLM_NUM_CTX") or _modelfile_int(_PARAMS, "num_ctx", 8192))
+OUTPUT_TOKENS   = _modelfile_int(_PARAMS, "num_predict", 1024)
+SYSTEM_TOKENS   = -(-len(_PARAMS.get("system", "")) // CHARS_PER_TOKEN)
+PROMPT_TOKENS   = int((NUM_CTX - OUTPUT_TOKENS - SYSTEM_TOKENS) * 0.9)
+if os.getenv("AGLLM_PROMPT_TOKENS"):
+    PROMPT_TOKENS = min(PROMPT_TOKENS, int(os.environ["AGLLM_PROMPT_TOKENS"]))
+LLM_OPTIONS     = {"num_ctx": NUM_CTX}
+
+LOW_VALUE_NAMES = {
+    "package-lock.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock",
+    "Pipfile.lock", "Cargo.lock", "go.sum", "composer.lock", "Gemfile.lock",
+}
+LOW_VALUE_EXTS  = {
+    ".csv", ".tsv", ".json", ".xml", ".txt", ".log", ".lock", ".svg",
+    ".ipynb", ".min.js", ".map", ".dat", ".sql",
+}
+LOW_VALUE_DIRS  = {
+    "node_modules", "dist", "build", "target", "out", "bin", "obj",
+    "__pycache__", ".venv", "venv", "vendor", ".idea", ".vscode",
+}
+
+SIGNATURE_RE = re.compile(
+    r"^\s*(?:export\s+|async\s+)*"
+    r"(?:def|class|fn|func|function|interface|struct|enum|impl|trait|module|"
+    r"public|private|protected|static|void)\b"
+)
+
+DDL = """
+CREATE TABLE IF NOT EXISTS prompt_omissions (
+  id            INTEGER PRIMARY KEY,
+  submission_id INTEGER NOT NULL REFERENCES submissions(id),
+  filename      TEXT    NOT NULL,
+  action        TEXT    NOT NULL,        -- 'summarized' | 'dropped' | ingest skip reason
+  est_tokens    INTEGER NOT NULL         -- size of the full file
+);
+CREATE INDEX IF NOT EXISTS idx_prompt_omissions_sub ON prompt_omissions(submission_id);
+"""
+
+
+@dataclass
+class Omission:
+    filename: str
+    action: str
+    est_tokens: int
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    conn.executescript(DDL)
+
+def record(cur, submission_id: int, omitted) -> None:
+    cur.executemany(
+        "INSERT INTO prompt_omissions(submission_id, filename, action, est_tokens) "
+        "VALUES (?,?,?,?)",
+        [(submission_id, o.filename, o.action, o.est_tokens) for o in omitted]
+    )
+
+# ─────────────────────────── ranking ────────────────────────────
+def _mentioned(name: str, text: str) -> bool:
+    p = PurePosixPath(name)
+    return bool(text) and (name in text or re.search(
+        rf"(?<![\w.]){re.escape(p.name)}(?![\w])", text) is not None)
+
+def _low_value(name: str) -> bool:
+    p = PurePosixPath(name)
+    if p.name in LOW_VALUE_NAMES or set(p.parts[:-1]) & LOW_VALUE_DIRS:
+        return True
+    return any(p.name.endswith(ext) for ext in LOW_VALUE_EXTS)
+
+def rank(files, autograder_out: str = "", readme: str = "", failing: bool = True):
+    """Sort (name, text) pairs most-relevant first (stable within a tier)."""
+    def score(item):
+        name, _ = item
+        if failing and _mentioned(name, autograder_out):
+            tier = 0
+        elif _mentioned(name, readme):
+            tier = 1
+        elif not _low_value(name):
+            tier = 2
+        else:
+            tier = 3
+        return tier
+    return sorted(files, key=score)
+
+def outline(text: str, max_lines: int = 40) -> str:
+    """Signature lines only – enough for the model to know the file exists."""
+    sigs = [l.rstrip() for l in text.splitlines() if SIGNATURE_RE.match(l)]
+    return "\n".join(sigs[:max_lines])
+
+# ─────────────────────────── packing ────────────────────────────
+def pack(files, *, other_sections: str = "", autograder_out: str = "",
+         readme: str = "", failing: bool = True, budget: int = PROMPT_TOKENS):
+    """
+    Return (code_section, omitted) where code_section fits into
+    `budget - tokens(other_sections)` and omitted is a list of Omission.
+    """
+    remaining = max(budget - estimate_tokens(other_sections), MIN_CODE_TOKENS)
+    parts, omitted, deferred = [], [], []
+
+    for name, text in rank(files, autograder_out, readme, failing):
+        chunk = f"File: {name}\n{text}\n\n"
+        cost = estimate_tokens(chunk)
+        if cost <= remaining:
+            parts.append(chunk)
+            remaining -= cost
+        else:
+            deferred.append((name, text, cost))
+
+    # second pass: outlines for files that did not fit whole
+    for name, text, cost in deferred:
+        sig = outline(text)
+        chunk = f"File: {name}  (summarized – signatures only)\n{sig}\n\n"
+        if sig and estimate_tokens(chunk) <= remaining:
+            parts.append(chunk)
+            remaining -= estimate_tokens(chunk)
+            omitted.append(Omission(name, "summarized", cost))
+        else:
+            omitted.append(Omission(name, "dropped", cost))
+
+    if omitted:
+        note = "\n".join(f"- {o.filename} ({o.action}, ~{o.est_tokens} tokens)"
+                         for o in omitted)
+        parts.append(f"(Omitted to fit the prompt budget:)\n{note}\n")
+    return "".join(parts), omitted
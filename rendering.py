@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+rendering.py
+────────────────────────────────────────────────────────────
+Render-once cache for the teacher UI.
+
+• Feedback Markdown → HTML (fenced_code, codehilite, tables)
+• Student source    → server-side Pygments HTML (with line numbers)
+
+Rows in `rendered` are keyed by (content hash, kind) and stamped with
+RENDER_VERSION; a version bump (or a markdown / pygments upgrade) makes
+every entry stale and it is re-rendered on next view.  Every write also
+evicts stale-version rows, rows rendered more than $AGLLM_RENDER_MAX_AGE_DAYS
+ago, and the oldest rows beyond $AGLLM_RENDER_MAX_MB.  Feedback that is
+still streaming is never cached (each partial text would be a new row).
+
+Pages read the cache outside any transaction and pass a `pending` list:
+misses are rendered without holding the write lock and store() writes
+them afterwards in one short transaction.
+
+CLI:  python3 rendering.py --warm    # pre-render unreviewed rows
+      python3 rendering.py --purge   # apply the eviction policy now
+"""
+
+import os, sqlite3, hashlib, argparse
+from datetime import datetime, timedelta
+
+import markdown
+import pygments
+from pygments import highlight
+from pygments.lexers import get_lexer_for_filename, TextLexer
+from pygments.formatters import HtmlFormatter
+from pygments.util import ClassNotFound
+
+import blobstore, db
+
+# ─────────────────────────── config ─────────────────────────────
+RENDER_VERSION = f"1/md{markdown.__version__}/pyg{pygments.__version__}"
+CODE_FORMATTER = HtmlFormatter(cssclass="codehilite", linenos="inline", wrapcode=True)
+MAX_AGE_DAYS   = float(os.getenv("AGLLM_RENDER_MAX_AGE_DAYS", "30"))
+MAX_BYTES      = int(float(os.getenv("AGLLM_RENDER_MAX_MB", "128")) * 1024 * 1024)
+
+DDL = """
+CREATE TABLE IF NOT EXISTS rendered (
+  hash     TEXT NOT NULL,               -- sha256 of the source text
+  kind     TEXT NOT NULL,               -- 'md' | 'code:<lexer>'
+  version  TEXT NOT NULL,               -- RENDER_VERSION at render time
+  html     TEXT NOT NULL,
+  size     INTEGER NOT NULL DEFAULT 0,  -- len(html) in bytes
+  rendered_at TEXT,
+  PRIMARY KEY (hash, kind)
+);
+CREATE INDEX IF NOT EXISTS idx_rendered_age ON rendered(rendered_at);
+"""
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    conn.executescript(DDL)
+
+# ─────────────────────────── renderers ──────────────────────────
+def md(txt: str) -> str:
+    return markdown.markdown(txt or "", extensions=["fenced_code", "codehilite", "tables"])
+
+def lexer_for(filename: str):
+    try:
+        return get_lexer_for_filename(filename, stripnl=False)
+    except ClassNotFound:
+        return TextLexer(stripnl=False)
+
+def code(filename: str, text: str, lexer=None) -> str:
+    return highlight(text or "", lexer or lexer_for(filename), CODE_FORMATTER)
+
+def _write(conn, rows: list) -> None:
+    # a row of the current version is never replaced by a concurrent render
+    now = datetime.utcnow().isoformat() + "Z"
+    conn.executemany(
+        "INSERT INTO rendered(hash, kind, version, html, size, rendered_at) "
+        "VALUES (?,?,?,?,?,?) "
+        "ON CONFLICT(hash, kind) DO UPDATE SET version = excluded.version, "
+        "html = excluded.html, size = excluded.size, rendered_at = excluded.rendered_at "
+        "WHERE rendered.version <> excluded.version",
+        [(h, kind, RENDER_VERSION, html, len(html.encode("utf-8")), now)
+         for h, kind, html in rows])
+    evict(conn)
+
+def evict(conn, max_age_days: float = MAX_AGE_DAYS, max_bytes: int = MAX_BYTES) -> int:
+    """Drop stale-version and old entries, then the oldest until under max_bytes.
+
+    Age is time since rendering: a hit stays a read, so viewing a page
+    never takes the write lock."""
+    cutoff = (datetime.utcnow() - timedelta(days=max_age_days)).isoformat() + "Z"
+    n = conn.execute("DELETE FROM rendered WHERE version <> ? OR rendered_at < ?",
+                     (RENDER_VERSION, cutoff)).rowcount
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM rendered").fetchone()[0]
+    if total > max_bytes:
+        doomed = []
+        for h, kind, size in conn.execute(
+                "SELECT hash, kind, size FROM rendered ORDER BY rendered_at"):
+            if total <= max_bytes:
+                break
+            doomed.append((h, kind))
+            total -= size
+        conn.executemany("DELETE FROM rendered WHERE hash = ? AND kind = ?", doomed)
+        n += len(doomed)
+    return n
+
+def _cached(conn, h: str, kind: str, render, pending: list = None) -> str:
+    row = conn.execute("SELECT html, version FROM rendered WHERE hash = ? AND kind = ?",
+                       (h, kind)).fetchone()
+    if row and row[1] == RENDER_VERSION:
+        return row[0]
+    html = render()
+    if pending is None:
+        _write(conn, [(h, kind, html)])
+    else:
+        pending.append((h, kind, html))
+    return html
+
+# ─────────────────────────── cached API ─────────────────────────
+def markdown_html(conn, text: str, pending: list = None) -> str:
+    h = hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+    return _cached(conn, h, "md", lambda: md(text), pending)
+
+def code_html(conn, filename: str, text: str, h: str = None, pending: list = None) -> str:
+    """`h` is the blob hash when known (saves re-hashing the text)."""
+    lexer = lexer_for(filename)
+    kind = "code:" + (lexer.aliases[0] if lexer.aliases else lexer.name)
+    return _cached(conn, h or blobstore.text_hash(text or ""), kind,
+                   lambda: code(filename, text, lexer), pending)
+
+def store(pending: list) -> None:
+    """Write the misses a page collected, in one short write transaction."""
+    if pending:
+        with db.transaction(immediate=True) as c:
+            _write(c, pending)
+
+def stylesheet(style: str = "monokai") -> str:
+    return HtmlFormatter(style=style).get_style_defs(".codehilite")
+
+# ─────────────────────────── CLI ────────────────────────────────
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Teacher UI render cache.")
+    g = ap.add_mutually_exclusive_group(required=True)
+    g.add_argument("--warm", action="store_true", help="render unreviewed feedback + code")
+    g.add_argument("--purge", action="store_true", help="apply the eviction policy now")
+    args = ap.parse_args()
+
+    import migrations                    # adds rendered.size / rendered_at (v11)
+    conn = db.connect()
+    migrations.migrate(conn)
+    if args.purge:
+        print(f"🧹 {evict(conn)} entries evicted")
+    else:
+        n = 0
+        for fid, sid, text in conn.execute(
+                "SELECT id, submission_id, feedback_text FROM feedback "
+                "WHERE reviewed = 0 AND status <> 'streaming'"
+        ).fetchall():
+            markdown_html(conn, text)
+            for name, code_text in blobstore.submission_files(conn, sid):
+                code_html(conn, name, code_text)
+            n += 1
+        print(f"🔥 {n} feedback entries warmed")
+    conn.commit()
+    conn.close()
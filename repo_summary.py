@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+repo_summary.py
+────────────────────────────────────────────────────────────
+Per-repo aggregates behind the teacher UI home page.
+
+    repo_summary        repo_name → unreviewed count, red_flag
+    submission_flags    submission_id → keyword hits in teacher comments
+
+A submission is "hit" once per (feedback row, keyword) whose comment
+contains the keyword; a repo is red-flagged when any of its submissions
+reaches $AGLLM_FLAG_THRESHOLD hits.  Kept current from the write paths
+(control_code insert, /review/<fid>) via refresh(); rebuilt automatically
+when the keyword list changes.
+
+CLI:  python3 repo_summary.py --rebuild | --check
+"""
+
+import os, sys, sqlite3, argparse
+from datetime import datetime
+
+import db
+
+# ─────────────────────────── config ─────────────────────────────
+KEYWORDS   = [k.strip().lower() for k in
+              os.getenv("AGLLM_FLAG_KEYWORDS", "memory,leak,edge,case").split(",")
+              if k.strip()]
+THRESHOLD  = int(os.getenv("AGLLM_FLAG_THRESHOLD", "3"))
+
+DDL = """
+CREATE TABLE IF NOT EXISTS repo_summary (
+  repo_name   TEXT PRIMARY KEY,
+  unreviewed  INTEGER NOT NULL DEFAULT 0,
+  red_flag    INTEGER NOT NULL DEFAULT 0,
+  updated_at  TEXT    NOT NULL
+);
+CREATE TABLE IF NOT EXISTS submission_flags (
+  submission_id INTEGER PRIMARY KEY REFERENCES submissions(id),
+  repo_name     TEXT    NOT NULL,
+  hits          INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_submission_flags_repo ON submission_flags(repo_name, hits);
+CREATE TABLE IF NOT EXISTS summary_meta (
+  key   TEXT PRIMARY KEY,
+  value TEXT
+);
+"""
+
+def _signature() -> str:
+    return f"{THRESHOLD}:" + ",".join(KEYWORDS)
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    """Create tables; rebuild if they are new or the keyword config changed."""
+    conn.executescript(DDL)
+    row = conn.execute("SELECT value FROM summary_meta WHERE key = 'keywords'").fetchone()
+    if row is None or row[0] != _signature():
+        rebuild(conn)
+    conn.commit()
+
+# ─────────────────────────── incremental ────────────────────────
+def count_hits(comments) -> int:
+    return sum(kw in c.lower() for c in comments if c for kw in KEYWORDS)
+
+def refresh(cur, repo_name: str, submission_id: int = None) -> None:
+    """Recompute one repo's row (and one submission's hits) after a write."""
+    if submission_id is not None:
+        comments = [r[0] for r in cur.execute(
+            "SELECT teacher_comments FROM feedback WHERE submission_id = ?",
+            (submission_id,))]
+        cur.execute(
+            "INSERT OR REPLACE INTO submission_flags(submission_id, repo_name, hits) "
+            "VALUES (?,?,?)", (submission_id, repo_name, count_hits(comments)))
+    unreviewed = cur.execute(
+        "SELECT COUNT(*) FROM feedback WHERE repo_name = ? AND reviewed = 0",
+        (repo_name,)).fetchone()[0]
+    red = cur.execute(
+        "SELECT EXISTS(SELECT 1 FROM submission_flags WHERE repo_name = ? AND hits >= ?)",
+        (repo_name, THRESHOLD)).fetchone()[0]
+    cur.execute(
+        "INSERT OR REPLACE INTO repo_summary(repo_name, unreviewed, red_flag, updated_at) "
+        "VALUES (?,?,?,?)",
+        (repo_name, unreviewed, red, datetime.utcnow().isoformat() + "Z"))
+
+# ─────────────────────────── full rebuild ───────────────────────
+def compute(conn: sqlite3.Connection):
+    """From scratch: ({repo: (unreviewed, red_flag)}, {sid: (repo, hits)})."""
+    flags, repos = {}, {}
+    for sid, repo, comments, reviewed in conn.execute(
+            "SELECT submission_id, repo_name, teacher_comments, reviewed FROM feedback"):
+        _, hits = flags.get(sid, (repo, 0))
+        flags[sid] = (repo, hits + count_hits([comments]))
+        unrev, _ = repos.get(repo, (0, 0))
+        repos[repo] = (unrev + (reviewed == 0), 0)
+    for sid, (repo, hits) in flags.items():
+        if hits >= THRESHOLD:
+            repos[repo] = (repos[repo][0], 1)
+    return repos, flags
+
+def rebuild(conn: sqlite3.Connection) -> None:
+    repos, flags = compute(conn)
+    now = datetime.utcnow().isoformat() + "Z"
+    conn.execute("DELETE FROM repo_summary")
+    conn.execute("DELETE FROM submission_flags")
+    conn.executemany(
+        "INSERT INTO submission_flags(submission_id, repo_name, hits) VALUES (?,?,?)",
+        [(sid, repo, hits) for sid, (repo, hits) in flags.items()])
+    conn.executemany(
+        "INSERT INTO repo_summary(repo_name, unreviewed, red_flag, updated_at) "
+        "VALUES (?,?,?,?)",
+        [(repo, u, r, now) for repo, (u, r) in repos.items()])
+    conn.execute("INSERT OR REPLACE INTO summary_meta(key, value) VALUES ('keywords', ?)",
+                 (_signature(),))
+
+def check(conn: sqlite3.Connection) -> list:
+    """Repos whose stored row differs from a from-scratch computation."""
+    repos, _ = compute(conn)
+    stored = {r[0]: (r[1], r[2]) for r in conn.execute(
+        "SELECT repo_name, unreviewed, red_flag FROM repo_summary")}
+    names = set(repos) | set(stored)
+    return sorted((n, stored.get(n), repos.get(n)) for n in names
+                  if stored.get(n, (0, 0)) != repos.get(n, (0, 0)))
+
+# ─────────────────────────── CLI ────────────────────────────────
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Maintain the teacher UI repo summary.")
+    g = ap.add_mutually_exclusive_group(required=True)
+    g.add_argument("--rebuild", action="store_true", help="recompute from feedback")
+    g.add_argument("--check", action="store_true", help="report drift, exit 1 if any")
+    args = ap.parse_args()
+
+    conn = db.connect()
+    conn.executescript(DDL)
+    if args.rebuild:
+        rebuild(conn)
+        conn.commit()
+        print("✅ repo_summary rebuilt")
+    else:
+        drift = check(conn)
+        for repo, stored, actual in drift:
+            print(f"❌ {repo}: stored {stored} ≠ actual {actual}")
+        if not drift:
+            print("✅ repo_summary consistent")
+        conn.close()
+        sys.exit(1 if drift else 0)
+    conn.close()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+rules.py
+────────────────────────────────────────────────────────────
+Mechanical assignment checks that run before the LLM.
+
+Declared next to the assignment README in `agllm.ini` (see ingest.py):
+
+    [rules]
+    banned_imports     = numpy, pandas, collections.Counter
+    required_functions = merge_sort, main
+    forbidden          = while, recursion, eval, sorted
+    short_circuit      = yes          # perfect score + no findings ⇒ no LLM call
+    perfect_message    = Full marks{score}! Checked: {checks}.
+
+• Python files are parsed (ast): imports, defined functions, constructs
+  (while, for, try, global, lambda, class, comprehension, recursion) and
+  calls by name (eval, sorted, os.system …)
+• Other source files are token-scanned with comments and strings
+  blanked out; required functions only need to appear as `name(`
+• Unparsable Python falls back to the token scan
+
+control_code puts prompt_section() into the prompt, and for a perfect
+autograder score with no findings stores perfect_feedback() instead of
+calling Ollama.  $AGLLM_RULES_SHORT_CIRCUIT=0 turns the shortcut off.
+
+CLI:  python3 rules.py <checkout_dir> [--config DIR]   # print findings
+"""
+
+import os, re, ast, argparse, configparser
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+
+from ingest import CONFIG_NAME
+
+# ─────────────────────────── config ─────────────────────────────
+SHORT_CIRCUIT   = os.getenv("AGLLM_RULES_SHORT_CIRCUIT", "1") != "0"
+PERFECT_MESSAGE = (
+    "🎉 Congratulations — the autograder awarded a perfect score{score}!\n\n"
+    "Your code also passes the assignment's automated requirement checks: {checks}.\n\n"
+    "Nice work. If you want a stretch goal, look for an input your tests do not "
+    "cover yet and ask yourself how your code would handle it."
+)
+
+CONSTRUCTS = {
+    "while":         (ast.While,),
+    "for":           (ast.For, ast.AsyncFor),
+    "try":           tuple(getattr(ast, n) for n in ("Try", "TryStar") if hasattr(ast, n)),
+    "global":        (ast.Global, ast.Nonlocal),
+    "lambda":        (ast.Lambda,),
+    "class":         (ast.ClassDef,),
+    "comprehension": (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp),
+}
+PYTHON_ONLY = {"comprehension", "recursion"}
+
+SOURCE_EXTS = {".c", ".h", ".cc", ".cpp", ".hpp", ".java", ".js", ".jsx", ".ts", ".tsx",
+               ".cs", ".go", ".rs", ".kt", ".swift", ".scala", ".php", ".rb", ".sh",
+               ".r", ".pl", ".lua", ".m"}
+HASH_COMMENTS = {".py", ".rb", ".sh", ".r", ".pl"}
+
+_IMPORT_LINE_RE = re.compile(
+    r"^\s*(?:import|from|#\s*include|using|use|require|library|extern\s+crate)\b"
+    r"|\brequire\s*\(|\bimport\s*\(")
+
+
+@dataclass
+class RuleSet:
+    banned_imports: list
+    required_functions: list
+    forbidden: list
+    short_circuit: bool = True
+    perfect_message: str = PERFECT_MESSAGE
+
+    @property
+    def empty(self) -> bool:
+        return not (self.banned_imports or self.required_functions or self.forbidden)
+
+
+@dataclass
+class Finding:
+    rule: str                 # 'banned_import' | 'missing_function' | 'forbidden'
+    subject: str              # the import / function / construct named in agllm.ini
+    filename: str = None
+    line: int = None
+
+    def __str__(self) -> str:
+        where = f" — {self.filename}:{self.line}" if self.filename else ""
+        if self.rule == "banned_import":
+            return f"banned import `{self.subject}`{where}"
+        if self.rule == "missing_function":
+            return f"required function `{self.subject}` is not defined"
+        return f"forbidden `{self.subject}`{where}"
+
+
+def _names(value: str) -> list:
+    return [v.strip() for v in (value or "").replace("\n", ",").split(",") if v.strip()]
+
+def load_rules(config_dir: Path) -> RuleSet:
+    cp = configparser.ConfigParser(interpolation=None)
+    if config_dir is not None:
+        cp.read(Path(config_dir) / CONFIG_NAME, encoding="utf-8")
+    sec = cp["rules"] if cp.has_section("rules") else {}
+    rs = RuleSet(banned_imports=_names(sec.get("banned_imports")),
+                 required_functions=_names(sec.get("required_functions")),
+                 forbidden=[w.lower() if w.lower() in CONSTRUCTS or w.lower() in PYTHON_ONLY
+                            else w for w in _names(sec.get("forbidden"))],
+                 perfect_message=sec.get("perfect_message", PERFECT_MESSAGE))
+    flag = str(sec.get("short_circuit", "yes")).strip().lower()
+    rs.short_circuit = SHORT_CIRCUIT and flag in ("1", "yes", "true", "on") and not rs.empty
+    return rs
+
+# ─────────────────────────── Python (ast) ───────────────────────
+def _dotted(node) -> str:
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+        return ".".join(reversed(parts))
+    return ""
+
+def _banned(module: str, banned: list) -> str:
+    for b in banned:
+        if module == b or module.startswith(b + "."):
+            return b
+    return None
+
+def _imported(node):
+    """(module, line) pairs for import statements and dynamic imports."""
+    if isinstance(node, ast.Import):
+        return [(a.name, node.lineno) for a in node.names]
+    if isinstance(node, ast.ImportFrom) and node.module and not node.level:
+        return [(node.module, node.lineno)] + [(f"{node.module}.{a.name}", node.lineno)
+                                               for a in node.names]
+    if (isinstance(node, ast.Call) and _dotted(node.func) in ("__import__",
+                                                               "importlib.import_module")
+            and node.args and isinstance(node.args[0], ast.Constant)
+            and isinstance(node.args[0].value, str)):
+        return [(node.args[0].value, node.lineno)]
+    return []
+
+def _check_python(name: str, tree, rs: RuleSet, findings: list, defined: set) -> None:
+    calls = [w for w in rs.forbidden if w not in CONSTRUCTS and w not in PYTHON_ONLY]
+    for node in ast.walk(tree):
+        for module, line in _imported(node):
+            b = _banned(module, rs.banned_imports)
+            if b:
+                findings.append(Finding("banned_import", b, name, line))
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            defined.add(node.name)
+            if "recursion" in rs.forbidden and any(
+                    isinstance(n, ast.Call) and _dotted(n.func) in (node.name,
+                                                                    f"self.{node.name}")
+                    for n in ast.walk(node)):
+                findings.append(Finding("forbidden", "recursion", name, node.lineno))
+        for word in rs.forbidden:
+            if word in CONSTRUCTS and isinstance(node, CONSTRUCTS[word]):
+                findings.append(Finding("forbidden", word, name, node.lineno))
+        if calls and isinstance(node, ast.Call):
+            fn = _dotted(node.func)
+            for word in calls:
+                if fn == word or fn.endswith("." + word):
+                    findings.append(Finding("forbidden", word, name, node.lineno))
+
+# ─────────────────────────── other languages (tokens) ───────────
+def _blank(m) -> str:
+    return re.sub(r"[^\n]", " ", m.group(0))
+
+def strip_comments(text: str, suffix: str) -> str:
+    """Comments and string literals → spaces (line numbers are kept)."""
+    comment = r"#[^\n]*" if suffix in HASH_COMMENTS else r"//[^\n]*|/\*.*?\*/"
+    strings = r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\''
+    return re.sub(f"{comment}|{strings}", _blank, text, flags=re.S)
+
+def _code_strings_only(text: str, suffix: str) -> str:
+    """Comments blanked but strings kept (import targets are often quoted)."""
+    comment = r"#[^\n]*" if suffix in HASH_COMMENTS else r"//[^\n]*|/\*.*?\*/"
+    return re.sub(comment, _blank, text, flags=re.S)
+
+def _line_of(text: str, pos: int) -> int:
+    return text.count("\n", 0, pos) + 1
+
+def _check_tokens(name: str, text: str, rs: RuleSet, findings: list, defined: set) -> None:
+    suffix = PurePosixPath(name).suffix.lower()
+    code = strip_comments(text, suffix)
+    with_strings = _code_strings_only(text, suffix)
+    for i, line in enumerate(with_strings.splitlines(), 1):
+        if _IMPORT_LINE_RE.search(line):
+            for b in rs.banned_imports:
+                if re.search(rf"(?<![\w.]){re.escape(b)}(?![\w])", line):
+                    findings.append(Finding("banned_import", b, name, i))
+    for fn in rs.required_functions:
+        if re.search(rf"\b{re.escape(fn)}\s*\(", code):
+            defined.add(fn)
+    for word in rs.forbidden:
+        if word in PYTHON_ONLY:
+            continue
+        for m in re.finditer(rf"(?<![\w.]){re.escape(word)}(?!\w)", code):
+            findings.append(Finding("forbidden", word, name, _line_of(code, m.start())))
+
+# ─────────────────────────── entry points ───────────────────────
+def check(files, rs: RuleSet) -> list:
+    """Findings for (name, text) pairs; empty when no rules are declared."""
+    if rs.empty:
+        return []
+    findings, defined = [], set()
+    for name, text in files:
+        suffix = PurePosixPath(name).suffix.lower()
+        if suffix == ".py":
+            try:
+                tree = ast.parse(text, filename=name)
+            except (SyntaxError, ValueError):
+                _check_tokens(name, text, rs, findings, defined)
+            else:
+                _check_python(name, tree, rs, findings, defined)
+        elif suffix in SOURCE_EXTS:
+            _check_tokens(name, text, rs, findings, defined)
+    findings.sort(key=lambda f: (f.filename, f.line))
+    findings += [Finding("missing_function", fn) for fn in rs.required_functions
+                 if fn not in defined]
+    return findings
+
+def summary(rs: RuleSet) -> str:
+    parts = []
+    if rs.banned_imports:
+        parts.append("no banned imports (" + ", ".join(rs.banned_imports) + ")")
+    if rs.required_functions:
+        parts.append("required functions present (" + ", ".join(rs.required_functions) + ")")
+    if rs.forbidden:
+        parts.append("no forbidden constructs (" + ", ".join(rs.forbidden) + ")")
+    return "; ".join(parts)
+
+def prompt_section(rs: RuleSet, findings: list, limit: int = 20) -> str:
+    """Static-check block for the prompt ('' when no rules are declared)."""
+    if rs.empty:
+        return ""
+    if not findings:
+        return "All automated requirement checks passed: " + summary(rs) + "."
+    lines = [f"- ❌ {f}" for f in findings[:limit]]
+    if len(findings) > limit:
+        lines.append(f"- … {len(findings) - limit} more")
+    return ("The automated requirement checks found these violations; ask guiding "
+            "questions about them:\n" + "\n".join(lines))
+
+class _Fields(dict):
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+def perfect_feedback(rs: RuleSet, points=None, max_points=None, repo: str = "") -> str:
+    score = f" ({points:g}/{max_points:g})" if points is not None and max_points else ""
+    return rs.perfect_message.replace("\\n", "\n").format_map(
+        _Fields(score=score, checks=summary(rs), repo=repo))
+
+# ─────────────────────────── CLI ────────────────────────────────
+if __name__ == "__main__":
+    import ingest
+
+    ap = argparse.ArgumentParser(description="Run the agllm.ini [rules] checks.")
+    ap.add_argument("checkout", type=Path, help="student code directory")
+    ap.add_argument("--config", type=Path, help="directory holding agllm.ini "
+                    "(default: the checkout's parent)")
+    args = ap.parse_args()
+
+    cfg_dir = args.config or args.checkout.parent
+    rs = load_rules(cfg_dir)
+    if rs.empty:
+        print(f"no [rules] in {cfg_dir / CONFIG_NAME}")
+    files = [(f.name, f.text) for f in ingest.iter_files(args.checkout,
+                                                          ingest.load_config(cfg_dir))
+             if f.text is not None]
+    found = check(files, rs)
+    for f in found:
+        print(f"❌ {f}")
+    if not rs.empty and not found:
+        print(f"✅ {summary(rs)}")
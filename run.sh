@@ -10,7 +10,7 @@ if [ ! -f /tmp/setup_done ]; then
 
   cd /app || { echo "/app missing"; exit 1; }
 
-  echo "Running create_database.py…"
+  echo "Running create_database.py (in-place schema upgrade)…"
   python3 create_database.py
   python3 verify_db.py
 
@@ -22,10 +22,19 @@ if [ ! -f /tmp/setup_done ]; then
       echo "\$HOME/control_code.py already present — leaving repo‑version intact"
   fi
 
+  # Helper modules imported by control_code.py are always refreshed, and so
+  # is the modelfile llm_cache.py / prompt_packer.py read next to them
+  find /app -maxdepth 1 -name '*.py' ! -name control_code.py -exec cp {} "$HOME/" \;
+  cp -r /app/LLMFiles "$HOME/"
+
   echo "Starting teacher UI on :5003 …"
   python3 teacher_ui.py &
   echo $! > /tmp/ui_pid
 
+  echo "Starting grading worker (${AGLLM_WORKERS:-one per LLM pool slot} slots) …"
+  python3 "$HOME/job_queue.py" worker &
+  echo $! > /tmp/worker_pid
+
   touch /tmp/setup_done
 fi
 
@@ -48,6 +57,7 @@ cleanup() {
   echo "Deregistering runner …"
   ./config.sh remove --token "${GH_RUNNER_TOKEN}" || true
   [ -f /tmp/ui_pid ] && kill "$(cat /tmp/ui_pid)" || true
+  [ -f /tmp/worker_pid ] && kill "$(cat /tmp/worker_pid)" || true
   exit 0
 }
 trap cleanup SIGINT SIGTERM
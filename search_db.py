@@ -1,129 +1,277 @@
 from rich.console import Console
 from rich.panel import Panel
+from rich.table import Table
+from rich.markup import escape
 import sqlite3
 import argparse
-import shutil
 import os
 
-def fetch_data(student_repo):
-    """Fetch data from the database for a specific student repository."""
-    db_path = os.path.join(os.getenv("HOME"), "agllmdatabase.db")  # Path to the SQLite database
-    conn = None
+import archive, blobstore, db, search_index
+
+MAX_BYTES = int(os.getenv("AGLLM_VIEW_MAX_BYTES", "2000"))   # per field in --show
+PREVIEW   = 60                                                # chars per summary column
+
+def fetch_page(student_repo, limit=20, offset=0):
+    """One-line summaries of a repo's submissions (newest first) + total count.
 
+    Archived submissions (archive.py) are merged in by id."""
+    conn = None
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        # Fetch submissions
-        cursor.execute("""
-            SELECT id, assignment_id, code, submitted_at
-            FROM submissions
-            WHERE student_repo = ?
-        """, (student_repo,))
-        submissions = cursor.fetchall()
-
-        # Fetch feedback
-        cursor.execute("""
-            SELECT f.id, f.submission_id, f.feedback_text, f.generated_at
-            FROM feedback f
-            JOIN submissions s ON f.submission_id = s.id
-            WHERE s.student_repo = ?
-        """, (student_repo,))
-        feedbacks = cursor.fetchall()
-
-        # Fetch autograder outputs
-        cursor.execute("""
-            SELECT a.id, a.submission_id, a.output, a.generated_at
-            FROM autograder_outputs a
-            JOIN submissions s ON a.submission_id = s.id
-            WHERE s.student_repo = ?
-        """, (student_repo,))
-        autograder_outputs = cursor.fetchall()
-
-        return submissions, feedbacks, autograder_outputs
+        conn = db.connect()
+        hot_ids = {r[0] for r in conn.execute(
+            "SELECT id FROM submissions WHERE student_repo = ?", (student_repo,))}
+        # an interrupted archive run leaves rows in both tiers: count them once
+        archived = archive.ids(student_repo) - hot_ids
+        # sizes come from blobs.size; no code is read or decompressed here
+        rows = conn.execute("""
+            SELECT s.id, s.assignment_id, s.submitted_at,
+                   (SELECT COUNT(*) FROM code_files cf WHERE cf.submission_id = s.id),
+                   COALESCE((SELECT SUM(COALESCE(b.size, LENGTH(cf.code)))
+                               FROM code_files cf
+                          LEFT JOIN blobs b ON b.hash = cf.blob_hash
+                              WHERE cf.submission_id = s.id),
+                            LENGTH(s.code), 0),
+                   f.id, f.reviewed, SUBSTR(f.feedback_text, 1, ?),
+                   (SELECT SUBSTR(a.output, 1, ?) FROM autograder_outputs a
+                     WHERE a.submission_id = s.id ORDER BY a.id DESC LIMIT 1)
+              FROM submissions s
+         LEFT JOIN feedback f ON f.id = (SELECT MAX(id) FROM feedback
+                                          WHERE submission_id = s.id)
+             WHERE s.student_repo = ?
+          ORDER BY s.id DESC
+             LIMIT ? OFFSET ?
+        """, (PREVIEW * 4, PREVIEW * 4, student_repo,
+              limit + offset if archived else limit, 0 if archived else offset)).fetchall()
+        if archived:
+            rows = sorted(rows + [r for r in archive.page_rows(student_repo, limit + offset)
+                                  if r[0] not in hot_ids],
+                          key=lambda r: r[0], reverse=True)[offset:offset + limit]
+        return rows, len(hot_ids) + len(archived)
+    except sqlite3.Error as e:
+        raise Exception(f"SQLite error: {e}")
+    finally:
+        if conn:
+            conn.close()
 
+def fetch_submission(submission_id):
+    """Everything for one submission: (meta, files, feedbacks, autograder_outputs)."""
+    conn = None
+    try:
+        conn = db.connect()
+        meta = conn.execute("""
+            SELECT id, student_repo, assignment_id, code, submitted_at
+            FROM submissions WHERE id = ?
+        """, (submission_id,)).fetchone()
+        if meta is None:
+            return _archived_submission(submission_id)
+        files = blobstore.submission_files(conn, submission_id)
+        if not files and meta[3]:
+            files = [("submission.py", meta[3])]         # legacy single blob
+        feedbacks = conn.execute("""
+            SELECT id, feedback_text, generated_at, reviewed, teacher_comments
+            FROM feedback WHERE submission_id = ? ORDER BY id
+        """, (submission_id,)).fetchall()
+        outputs = conn.execute("""
+            SELECT id, output, generated_at
+            FROM autograder_outputs WHERE submission_id = ? ORDER BY id
+        """, (submission_id,)).fetchall()
+        return meta, files, feedbacks, outputs
     except sqlite3.Error as e:
         raise Exception(f"SQLite error: {e}")
     finally:
         if conn:
             conn.close()
 
-def center_text(text, width):
-    """Center text within a given width."""
-    return text.center(width)
-def display_data(student_repo, submissions, feedbacks, autograder_outputs):
-    """Display data using rich-enhanced terminal output."""
+def _archived_submission(submission_id):
+    """fetch_submission() tuples rebuilt from an archived record."""
+    rec = archive.load(submission_id)
+    if rec is None:
+        return None, [], [], []
+    s = rec["submission"]
+    meta = (s["id"], s["student_repo"], s["assignment_id"], s["code"], s["submitted_at"])
+    files = [(f["filename"], f["code"]) for f in rec["files"]]
+    if not files and s["code"]:
+        files = [("submission.py", s["code"])]
+    feedbacks = [(f["id"], f["feedback_text"], f["generated_at"], f["reviewed"],
+                  f["teacher_comments"]) for f in rec["feedback"]]
+    outputs = [(a["id"], a["output"], a["generated_at"]) for a in rec["autograder_outputs"]]
+    return meta, files, feedbacks, outputs
+
+def one_line(text, width=PREVIEW):
+    """Collapse whitespace and cut to `width` characters."""
+    text = " ".join((text or "").split())
+    return text if len(text) <= width else text[:width - 1] + "…"
+
+def clip(text, max_bytes=MAX_BYTES):
+    """Cut `text` to `max_bytes` UTF-8 bytes (0 = no limit), noting what was dropped."""
+    raw = (text or "").encode("utf-8")
+    if not max_bytes or len(raw) <= max_bytes:
+        return text or ""
+    return (raw[:max_bytes].decode("utf-8", "ignore")
+            + f"\n… [{len(raw) - max_bytes} more bytes — use --full]")
+
+def display_page(student_repo, rows, total, offset):
+    """Display one page of submission summaries as a table."""
     console = Console()
-    terminal_width = shutil.get_terminal_size().columns
+    table = Table(title=f"{student_repo} — submissions {offset + 1 if rows else 0}"
+                        f"–{offset + len(rows)} of {total}",
+                  title_style="bold yellow", header_style="bold cyan", expand=True)
+    table.add_column("ID", justify="right", no_wrap=True)
+    table.add_column("Asg", justify="right", no_wrap=True)
+    table.add_column("Submitted At", no_wrap=True)
+    table.add_column("Files", justify="right", no_wrap=True)
+    table.add_column("Size", justify="right", no_wrap=True)
+    table.add_column("Rev", justify="center", no_wrap=True)
+    table.add_column("Feedback", overflow="ellipsis", no_wrap=True, ratio=2)
+    table.add_column("Autograder", overflow="ellipsis", no_wrap=True, ratio=1)
+    for sid, aid, at, n_files, size, fid, reviewed, fb, out in rows:
+        table.add_row(str(sid), str(aid), (at or "")[:19], str(n_files),
+                      f"{size}B" if size < 1024 else f"{size / 1024:.1f}K", "—" if fid is None else ("✔" if reviewed else "•"),
+                      escape(one_line(fb)), escape(one_line(out)))
+    console.print(table)
+    if not rows:
+        console.print("[red]No submissions found.[/red]")
 
-    # Centered Header
-    header_text = f"Data for {student_repo}"
+def display_submission(meta, files, feedbacks, outputs, max_bytes=MAX_BYTES):
+    """Display one submission in full, each field capped at `max_bytes`."""
+    console = Console()
+    if meta is None:
+        console.print("[red]No such submission.[/red]")
+        return
+    sid, repo, aid, _, at = meta
     console.print(
         Panel(
-            center_text(header_text, terminal_width),
-            expand=False,
+            f"[bold yellow]Repository[/bold yellow]: {escape(repo)}\n"
+            f"[bold yellow]Assignment ID[/bold yellow]: {aid}\n"
+            f"[bold yellow]Submitted At[/bold yellow]: {at}",
+            title=f"[bold yellow]Submission {sid}[/bold yellow]",
             border_style="bright_cyan",
-            title="[bold yellow]Student Repository[/bold yellow]",
-            title_align="center",
         )
     )
 
-    # Submissions Table
-    console.print("\n[bold underline green]Submissions[/bold underline green]")
-    if submissions:
-        for submission in submissions:
-            console.print(
-                Panel(
-                    f"[bold yellow]Submission ID[/bold yellow]: {submission[0]}\n"
-                    f"[bold yellow]Assignment ID[/bold yellow]: {submission[1]}\n"
-                    f"[bold yellow]Code[/bold yellow]:\n[dim cyan]{submission[2]}\n\n"
-                    f"[bold yellow]Submitted At[/bold yellow]: {submission[3]}",
-                    border_style="green",
-                )
-            )
-    else:
-        console.print("[red]No submissions found.[/red]")
+    console.print("\n[bold underline green]Code[/bold underline green]")
+    for name, text in files:
+        console.print(Panel(f"[dim cyan]{escape(clip(text, max_bytes))}",
+                            title=escape(name), border_style="green"))
+    if not files:
+        console.print("[red]No code found.[/red]")
 
-    # Feedback Table
     console.print("\n[bold underline blue]Feedback[/bold underline blue]")
-    if feedbacks:
-        for feedback in feedbacks:
-            console.print(
-                Panel(
-                    f"[bold yellow]Feedback ID[/bold yellow]: {feedback[0]}\n"
-                    f"[bold yellow]Submission ID[/bold yellow]: {feedback[1]}\n"
-                    f"[bold yellow]Feedback[/bold yellow]: {feedback[2]}\n\n"
-                    f"[bold yellow]Generated At[/bold yellow]: {feedback[3]}",
-                    border_style="blue",
-                )
-            )
-    else:
+    for fid, text, gen_at, reviewed, comments in feedbacks:
+        body = escape(clip(text, max_bytes))
+        if comments:
+            body += f"\n\n[bold yellow]Teacher Comments[/bold yellow]: {escape(comments)}"
+        console.print(Panel(body, title=f"Feedback {fid}",
+                            subtitle=f"{gen_at} · {'reviewed' if reviewed else 'unreviewed'}",
+                            border_style="blue"))
+    if not feedbacks:
         console.print("[red]No feedback found.[/red]")
 
-    # Autograder Outputs Table
     console.print("\n[bold underline magenta]Autograder Outputs[/bold underline magenta]")
-    if autograder_outputs:
-        for output in autograder_outputs:
-            console.print(
-                Panel(
-                    f"[bold yellow]Output ID[/bold yellow]: {output[0]}\n"
-                    f"[bold yellow]Submission ID[/bold yellow]: {output[1]}\n"
-                    f"[bold yellow]Output[/bold yellow]:\n[dim cyan]{output[2]}\n\n"
-                    f"[bold yellow]Generated At[/bold yellow]: {output[3]}",
-                    border_style="magenta",
-                )
-            )
-    else:
+    for oid, text, gen_at in outputs:
+        console.print(Panel(f"[dim cyan]{escape(clip(text, max_bytes))}",
+                            title=f"Output {oid}", subtitle=gen_at, border_style="magenta"))
+    if not outputs:
         console.print("[red]No autograder outputs found.[/red]")
 
+def browse(student_repo, limit, offset, max_bytes):
+    """Interactive pager: n/p to move, a submission ID to expand it, q to quit."""
+    console = Console()
+    while True:
+        rows, total = fetch_page(student_repo, limit, offset)
+        display_page(student_repo, rows, total, offset)
+        choice = console.input("[dim]" + escape("[n]ext  [p]rev  <id> show  [q]uit ›")
+                               + "[/dim] ").strip().lower()
+        if choice in ("q", "quit", ""):
+            return
+        if choice == "n" and offset + limit < total:
+            offset += limit
+        elif choice == "p":
+            offset = max(offset - limit, 0)
+        elif choice.isdigit():
+            display_submission(*fetch_submission(int(choice)), max_bytes=max_bytes)
+            console.input("[dim]enter to go back ›[/dim] ")
+
+def search(args):
+    """Ranked full-text search (see search_index.py), one page at a time."""
+    conn = db.connect()
+    try:
+        search_index.ensure_schema(conn)
+        hits, more = search_index.search(
+            conn, args.search, scope=args.scope, repo=args.repo,
+            assignment=args.assignment, since=args.since,
+            reviewed=None if args.reviewed is None else args.reviewed == "yes",
+            limit=args.per_page, offset=(args.page - 1) * args.per_page)
+    finally:
+        conn.close()
+    return hits, more
+
+def display_hits(query, page, hits, more):
+    """Display search hits with the matched terms highlighted."""
+    console = Console()
+    console.print(f"\n[bold underline cyan]Results for[/bold underline cyan] "
+                  f"[bold]{escape(query)}[/bold] — page {page}\n")
+    if not hits:
+        console.print("[red]No matches found.[/red]")
+    for h in hits:
+        where = (f"feedback #{h.feedback_id}" if h.kind == "feedback"
+                 else f"code {escape(h.filename)}")
+        console.print(
+            Panel(
+                search_index.highlight(h.snippet, "[bold red]", "[/bold red]", escape),
+                title=f"[bold yellow]{escape(h.repo_name)}[/bold yellow] · "
+                      f"submission {h.submission_id} · {where}",
+                subtitle=f"hw{h.assignment_id} · {h.at} · score {-h.rank:.3g}",
+                border_style="blue" if h.kind == "feedback" else "green",
+            )
+        )
+    if more:
+        console.print(f"[dim]More results: --page {page + 1}[/dim]")
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Display student data from the database.")
-    parser.add_argument("student_repo", help="The student repository (e.g., hw3-LeonardAlmeida)")
+    parser.add_argument("student_repo", nargs="?",
+                        help="The student repository (e.g., hw3-LeonardAlmeida)")
+    v = parser.add_argument_group("viewer")
+    v.add_argument("--limit", type=int, default=20, help="submissions per page")
+    v.add_argument("--offset", type=int, default=0, help="skip this many (newest first)")
+    v.add_argument("--show", type=int, metavar="SID", help="expand one submission")
+    v.add_argument("--max-bytes", type=int, default=MAX_BYTES,
+                   help="cap per field in --show (default %(default)s)")
+    v.add_argument("--full", action="store_true", help="no cap in --show")
+    v.add_argument("-i", "--interactive", action="store_true", help="page interactively")
+    s = parser.add_argument_group("full-text search")
+    s.add_argument("-s", "--search", metavar="QUERY",
+                   help='FTS5 query, e.g. "recursion depth" or \'"import numpy"\'')
+    s.add_argument("--scope", choices=search_index.SCOPES, default="all")
+    s.add_argument("--repo", help="repo name or glob (e.g. 'hw3-*')")
+    s.add_argument("--assignment", type=int, help="assignment id")
+    s.add_argument("--since", help="ISO date, e.g. 2025-02-01")
+    s.add_argument("--reviewed", choices=("yes", "no"), help="feedback review state")
+    s.add_argument("--page", type=int, default=1)
+    s.add_argument("--per-page", type=int, default=20)
     args = parser.parse_args()
+    if not (args.search or args.student_repo or args.show):
+        parser.error("give a student_repo, --show SID or --search QUERY")
+    max_bytes = 0 if args.full else args.max_bytes
 
-    try:
-        # Fetch and display data for the given student repository
-        submissions, feedbacks, autograder_outputs = fetch_data(args.student_repo)
-        display_data(args.student_repo, submissions, feedbacks, autograder_outputs)
-    except Exception as e:
-        Console().print(f"[red]Error:[/red] {e}")
+    if args.search:
+        try:
+            hits, more = search(args)
+            display_hits(args.search, args.page, hits, more)
+        except search_index.SearchError as e:
+            Console().print(f"[red]Bad query:[/red] {escape(str(e))}")
+    else:
+        try:
+            if args.show:
+                display_submission(*fetch_submission(args.show), max_bytes=max_bytes)
+            elif args.interactive:
+                browse(args.student_repo, args.limit, args.offset, max_bytes)
+            else:
+                rows, total = fetch_page(args.student_repo, args.limit, args.offset)
+                display_page(args.student_repo, rows, total, args.offset)
+                if args.offset + len(rows) < total:
+                    Console().print(f"[dim]More: --offset {args.offset + args.limit}"
+                                    f" · expand one: --show <ID>[/dim]")
+        except Exception as e:
+            Console().print(f"[red]Error:[/red] {e}")
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+search_index.py
+────────────────────────────────────────────────────────────
+SQLite FTS5 full-text search over feedback, teacher comments and code.
+
+    fts_feedback   feedback_text, teacher_comments   (external content: feedback)
+    fts_code       body of every stored blob          (external content: blob_text)
+
+Both indexes are kept in sync by triggers on `feedback` and `blobs`; a
+feedback row is indexed once its generation has ended (status 'streaming',
+see feedback_stream.py, is skipped).  Code
+is indexed once per distinct blob, so a file repeated across pushes costs
+one index entry; compressed blobs are read through agllm_blob_text() (see
+db.py).  Legacy inline code_files.code rows are not indexed until
+`blobstore.py --migrate` has moved them into blobs.
+
+Plain words are ANDed (`recursion depth`); anything containing FTS5 syntax
+(quotes, *, OR/NOT/NEAR, column filters) is passed through as-is.
+
+CLI:  python3 search_index.py --rebuild
+"""
+
+import re, sqlite3, argparse
+from dataclasses import dataclass
+
+import db
+
+# ─────────────────────────── config ─────────────────────────────
+SCOPES       = ("all", "feedback", "comments", "code")
+SNIPPET_MARK = ("\x02", "\x03")              # start / end of a highlighted term
+SNIPPET_TOKENS = 16
+
+DDL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS fts_feedback USING fts5(
+  feedback_text, teacher_comments,
+  content='feedback', content_rowid='id',
+  tokenize='porter unicode61'
+);
+-- 'streaming' rows are not indexed: Writer flushes would re-index them
+-- every FLUSH_SECS; the update that ends the stream indexes them once
+CREATE TRIGGER IF NOT EXISTS fts_feedback_ai AFTER INSERT ON feedback
+WHEN new.status <> 'streaming' BEGIN
+  INSERT INTO fts_feedback(rowid, feedback_text, teacher_comments)
+  VALUES (new.id, new.feedback_text, new.teacher_comments);
+END;
+CREATE TRIGGER IF NOT EXISTS fts_feedback_ad AFTER DELETE ON feedback
+WHEN old.status <> 'streaming' BEGIN
+  INSERT INTO fts_feedback(fts_feedback, rowid, feedback_text, teacher_comments)
+  VALUES ('delete', old.id, old.feedback_text, old.teacher_comments);
+END;
+CREATE TRIGGER IF NOT EXISTS fts_feedback_au
+AFTER UPDATE OF feedback_text, teacher_comments, status ON feedback
+WHEN old.status <> 'streaming' OR new.status <> 'streaming' BEGIN
+  INSERT INTO fts_feedback(fts_feedback, rowid, feedback_text, teacher_comments)
+  SELECT 'delete', old.id, old.feedback_text, old.teacher_comments
+   WHERE old.status <> 'streaming';
+  INSERT INTO fts_feedback(rowid, feedback_text, teacher_comments)
+  SELECT new.id, new.feedback_text, new.teacher_comments
+   WHERE new.status <> 'streaming';
+END;
+
+CREATE VIEW IF NOT EXISTS blob_text(rowid, body) AS
+  SELECT rowid, agllm_blob_text(data, compressed) FROM blobs;
+CREATE VIRTUAL TABLE IF NOT EXISTS fts_code USING fts5(
+  body,
+  content='blob_text', content_rowid='rowid',
+  tokenize="unicode61 tokenchars '_'"
+);
+CREATE TRIGGER IF NOT EXISTS fts_code_ai AFTER INSERT ON blobs BEGIN
+  INSERT INTO fts_code(rowid, body)
+  VALUES (new.rowid, agllm_blob_text(new.data, new.compressed));
+END;
+CREATE TRIGGER IF NOT EXISTS fts_code_ad AFTER DELETE ON blobs BEGIN
+  INSERT INTO fts_code(fts_code, rowid, body)
+  VALUES ('delete', old.rowid, agllm_blob_text(old.data, old.compressed));
+END;
+CREATE INDEX IF NOT EXISTS idx_codefiles_blob ON code_files(blob_hash);
+"""
+
+class SearchError(ValueError):
+    """Bad query syntax or arguments."""
+
+@dataclass
+class Hit:
+    kind: str                   # 'feedback' | 'code'
+    submission_id: int
+    repo_name: str
+    assignment_id: int
+    at: str                     # generated_at / submitted_at
+    rank: float                 # bm25, lower is better
+    feedback_id: int = None
+    filename: str = None
+    snippet: str = ""
+
+# ─────────────────────────── schema ─────────────────────────────
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    """Create indexes + triggers; back-fill them the first time."""
+    new = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'fts_feedback'"
+                       ).fetchone() is None
+    conn.executescript(DDL)
+    if new:
+        rebuild(conn)
+    conn.commit()
+
+def rebuild(conn: sqlite3.Connection) -> None:
+    # not 'rebuild': that would index rows that are still streaming
+    conn.execute("INSERT INTO fts_feedback(fts_feedback) VALUES ('delete-all')")
+    conn.execute("INSERT INTO fts_feedback(rowid, feedback_text, teacher_comments) "
+                 "SELECT id, feedback_text, teacher_comments FROM feedback "
+                 "WHERE status <> 'streaming'")
+    conn.execute("INSERT INTO fts_code(fts_code) VALUES ('rebuild')")
+
+# ─────────────────────────── query ──────────────────────────────
+_SYNTAX_RE = re.compile(r'["*():^{}]|\b(?:AND|OR|NOT|NEAR)\b')
+
+def match_expr(text: str, scope: str = "all") -> str:
+    """User input → FTS5 MATCH expression (plain words are quoted and ANDed)."""
+    text = (text or "").strip()
+    if not text:
+        raise SearchError("empty query")
+    if not _SYNTAX_RE.search(text):
+        text = " ".join('"%s"' % w.replace('"', '""') for w in text.split())
+    if scope == "feedback":
+        return f"{{feedback_text}} : ({text})"
+    if scope == "comments":
+        return f"{{teacher_comments}} : ({text})"
+    return text
+
+def _filters(repo_col, at_col, repo, assignment, since):
+    sql, args = "", []
+    if repo:
+        sql += f" AND {repo_col} GLOB ?"
+        args.append(repo)
+    if assignment is not None:
+        sql += " AND s.assignment_id = ?"
+        args.append(assignment)
+    if since:
+        sql += f" AND {at_col} >= ?"
+        args.append(since)
+    return sql, args
+
+def search(conn: sqlite3.Connection, text: str, *, scope: str = "all",
+           repo: str = None, assignment: int = None, reviewed: bool = None,
+           since: str = None, limit: int = 20, offset: int = 0):
+    """
+    Ranked hits for `text` → (hits, more).  `repo` is a GLOB (`hw3-*`);
+    `reviewed` only narrows feedback hits.  Snippets are built for the
+    returned page only, so deep result sets stay cheap.
+    """
+    if scope not in SCOPES:
+        raise SearchError(f"scope must be one of {', '.join(SCOPES)}")
+    parts, args = [], []
+    if scope != "code":
+        f_sql, f_args = _filters("f.repo_name", "f.generated_at", repo, assignment, since)
+        if reviewed is not None:
+            f_sql += " AND f.reviewed = ?"
+            f_args.append(int(reviewed))
+        parts.append(f"""
+            SELECT 'feedback' AS kind, fts_feedback.rowid AS doc, f.submission_id,
+                   f.repo_name, s.assignment_id, f.generated_at AS at,
+                   bm25(fts_feedback) AS score, f.id AS feedback_id, NULL AS filename
+              FROM fts_feedback
+              JOIN feedback f    ON f.id = fts_feedback.rowid
+              JOIN submissions s ON s.id = f.submission_id
+             WHERE fts_feedback MATCH ?{f_sql}""")
+        args += [match_expr(text, scope)] + f_args
+    if scope in ("all", "code"):
+        c_sql, c_args = _filters("s.student_repo", "s.submitted_at", repo, assignment, since)
+        parts.append(f"""
+            SELECT 'code' AS kind, fts_code.rowid AS doc, cf.submission_id,
+                   s.student_repo AS repo_name, s.assignment_id, s.submitted_at AS at,
+                   bm25(fts_code) AS score, NULL AS feedback_id, cf.filename
+              FROM fts_code
+              JOIN blobs b       ON b.rowid = fts_code.rowid
+              JOIN code_files cf ON cf.blob_hash = b.hash
+              JOIN submissions s ON s.id = cf.submission_id
+             WHERE fts_code MATCH ?{c_sql}""")
+        args += [match_expr(text)] + c_args
+
+    sql = " UNION ALL ".join(parts) + " ORDER BY score, at DESC LIMIT ? OFFSET ?"
+    try:
+        rows = conn.execute(sql, args + [limit + 1, offset]).fetchall()
+        page = [Hit(kind=r[0], submission_id=r[2], repo_name=r[3], assignment_id=r[4],
+                    at=r[5], rank=r[6], feedback_id=r[7], filename=r[8])
+                for r in rows[:limit]]
+        docs = [r[1] for r in rows[:limit]]
+        _snippets(conn, text, scope, page, docs)
+    except sqlite3.OperationalError as e:
+        raise SearchError(str(e)) from None
+    return page, len(rows) > limit
+
+def _snippets(conn, text, scope, page, docs) -> None:
+    start, end = SNIPPET_MARK
+    for kind, table, col, expr in (
+            ("feedback", "fts_feedback", -1, lambda: match_expr(text, scope)),
+            ("code", "fts_code", 0, lambda: match_expr(text))):
+        ids = sorted({d for h, d in zip(page, docs) if h.kind == kind})
+        if not ids:
+            continue
+        marks = ",".join("?" * len(ids))
+        snips = dict(conn.execute(
+            f"SELECT rowid, snippet({table}, {col}, ?, ?, '…', {SNIPPET_TOKENS}) "
+            f"FROM {table} WHERE {table} MATCH ? AND rowid IN ({marks})",
+            [start, end, expr()] + ids))
+        for h, d in zip(page, docs):
+            if h.kind == kind:
+                h.snippet = snips.get(d) or ""
+
+def highlight(snippet: str, open_: str, close: str, escape=lambda s: s) -> str:
+    """Escape a snippet for the target format and swap in highlight markup."""
+    start, end = SNIPPET_MARK
+    return (str(escape(snippet or ""))
+            .replace(start, open_).replace(end, close))
+
+# ─────────────────────────── CLI ────────────────────────────────
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Maintain the FTS5 search indexes.")
+    ap.add_argument("--rebuild", action="store_true", required=True,
+                    help="re-index all feedback and blobs")
+    ap.parse_args()
+
+    conn = db.connect()
+    conn.executescript(DDL)
+    rebuild(conn)
+    conn.commit()
+    conn.close()
+    print("✅ search indexes rebuilt")
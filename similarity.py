@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+similarity.py
+────────────────────────────────────────────────────────────
+Cross-repo retrieval of teacher comments for the prompt context.
+
+Every reviewed feedback row with a teacher comment gets a vector of the
+submission's code: token 1–3-grams, feature-hashed (crc32, signed) into
+$AGLLM_SIM_DIM float32 dims, sublinear tf, L2-normalised.  Vectors live in
+`sim_vectors` as raw NumPy bytes; the index is updated from /review/<fid>
+via add() and read into one in-memory matrix per process, so a lookup is a
+single mat-vec product.
+
+context() always starts with the student's own most recent reviewed
+comments (however dissimilar the code), then fills the rest of the token
+budget with the top-k comments on the most similar submissions (any repo;
+the student's own history gets a small boost).  Repo names never enter
+the prompt.
+
+CLI:  python3 similarity.py --rebuild
+"""
+
+import os, re, zlib, sqlite3, argparse, threading
+from collections import Counter
+from typing import NamedTuple
+
+import numpy as np
+
+import archive, blobstore, db
+from prompt_packer import estimate_tokens
+
+# ─────────────────────────── config ─────────────────────────────
+DIM             = int(os.getenv("AGLLM_SIM_DIM", "2048"))
+TOP_K           = int(os.getenv("AGLLM_SIM_TOP_K", "5"))
+TOKEN_BUDGET    = int(os.getenv("AGLLM_SIM_TOKENS", "600"))
+RECENT          = int(os.getenv("AGLLM_SIM_RECENT", "3"))   # own latest comments
+MIN_SCORE       = float(os.getenv("AGLLM_SIM_MIN", "0.2"))
+SAME_REPO_BOOST = 0.1
+NGRAMS          = (1, 2, 3)
+
+TOKEN_RE = re.compile(r"[A-Za-z_]\w*|\d+|[^\s\w]+")
+
+DDL = """
+CREATE TABLE IF NOT EXISTS sim_vectors (
+  feedback_id   INTEGER PRIMARY KEY REFERENCES feedback(id),
+  submission_id INTEGER NOT NULL,
+  repo_name     TEXT    NOT NULL,
+  comment       TEXT    NOT NULL,
+  dim           INTEGER NOT NULL,
+  vec           BLOB    NOT NULL,          -- float32[dim], L2-normalised
+  seq           INTEGER NOT NULL           -- bumped on every write (cache sync)
+);
+CREATE INDEX IF NOT EXISTS idx_sim_vectors_seq ON sim_vectors(seq);
+"""
+
+# ─────────────────────────── vectors ────────────────────────────
+def vectorize(text: str) -> np.ndarray:
+    toks = TOKEN_RE.findall(text or "")
+    grams = Counter()
+    for n in NGRAMS:
+        grams.update(" ".join(toks[i:i + n]) for i in range(len(toks) - n + 1))
+    vec = np.zeros(DIM, dtype=np.float32)
+    if not grams:
+        return vec
+    h = np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams),
+                    dtype=np.uint32, count=len(grams))
+    w = np.log1p(np.fromiter(grams.values(), dtype=np.float32, count=len(grams)))
+    sign = np.where(h & 0x80000000, -1.0, 1.0).astype(np.float32)
+    np.add.at(vec, h % DIM, sign * w)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+def code_text(files) -> str:
+    return "\n".join(text for _, text in files)
+
+# ─────────────────────────── write path ─────────────────────────
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    """Create the table; (re)build when it is new or DIM changed."""
+    new = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sim_vectors'"
+                       ).fetchone() is None
+    conn.executescript(DDL)
+    stale = conn.execute("SELECT 1 FROM sim_vectors WHERE dim <> ? LIMIT 1",
+                         (DIM,)).fetchone()
+    if new or stale:
+        rebuild(conn)
+    conn.commit()
+
+def add(cur, feedback_id: int) -> None:
+    """(Re)index one feedback row after its review was saved."""
+    row = cur.execute(
+        "SELECT submission_id, repo_name, teacher_comments FROM feedback "
+        "WHERE id = ? AND reviewed = 1", (feedback_id,)).fetchone()
+    if row is None or not (row[2] or "").strip():
+        cur.execute("DELETE FROM sim_vectors WHERE feedback_id = ?", (feedback_id,))
+        return
+    sid, repo, comment = row
+    _store(cur, feedback_id, sid, repo, comment, blobstore.submission_files(cur, sid))
+
+def _store(cur, feedback_id: int, sid: int, repo: str, comment: str, files) -> None:
+    vec = vectorize(code_text(files))
+    cur.execute(
+        "INSERT OR REPLACE INTO sim_vectors"
+        "(feedback_id, submission_id, repo_name, comment, dim, vec, seq) "
+        "VALUES (?,?,?,?,?,?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM sim_vectors))",
+        (feedback_id, sid, repo, comment.strip(), DIM, vec.tobytes()))
+
+def rebuild(conn: sqlite3.Connection) -> int:
+    """Re-vectorize every reviewed comment, archived ones (archive.py) included."""
+    ids = [r[0] for r in conn.execute("SELECT id FROM feedback WHERE reviewed = 1")]
+    hot_subs = {r[0] for r in conn.execute("SELECT id FROM submissions")}
+    cold = []                            # (feedback_id, sid, repo, comment, files)
+    for rec in archive.records():
+        sid = rec["submission"]["id"]
+        if sid in hot_subs:              # hot copy wins
+            continue
+        files = [(f["filename"], f["code"]) for f in rec["files"]]
+        cold += [(f["id"], sid, f["repo_name"], f["teacher_comments"], files)
+                 for f in rec["feedback"] if (f.get("teacher_comments") or "").strip()]
+    # rows are replaced rather than truncated so `seq` keeps growing
+    keep = set(ids) | {c[0] for c in cold}
+    conn.executemany("DELETE FROM sim_vectors WHERE feedback_id = ?",
+                     [(fid,) for (fid,) in conn.execute("SELECT feedback_id FROM sim_vectors")
+                      if fid not in keep])
+    for fid in ids:
+        add(conn, fid)
+    for c in cold:
+        _store(conn, *c)
+    _index.clear()
+    return conn.execute("SELECT COUNT(*) FROM sim_vectors").fetchone()[0]
+
+# ─────────────────────────── read path ──────────────────────────
+class _Snapshot(NamedTuple):
+    seq: int
+    pos: dict                 # feedback_id → row
+    fids: tuple
+    repos: np.ndarray
+    comments: tuple
+    matrix: np.ndarray
+
+_EMPTY = _Snapshot(0, {}, (), np.array([], dtype=object), (),
+                   np.zeros((0, DIM), dtype=np.float32))
+
+
+class _Index:
+    """Per-process copy of sim_vectors, topped up by `seq`.
+
+    Grading threads share it: sync() builds a new immutable snapshot under
+    a lock and swaps it in, readers score one snapshot from start to end."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.snap = _EMPTY
+
+    def clear(self):
+        with self._lock:
+            self.snap = _EMPTY
+
+    def sync(self, cur) -> _Snapshot:
+        with self._lock:
+            self.snap = self._synced(cur, self.snap)
+            return self.snap
+
+    def _synced(self, cur, snap: _Snapshot) -> _Snapshot:
+        live, top = cur.execute("SELECT COUNT(*), COALESCE(MAX(seq), 0) FROM sim_vectors "
+                                "WHERE dim = ?", (DIM,)).fetchone()
+        if top < snap.seq or (top == snap.seq and live != len(snap.fids)):
+            snap = _EMPTY                             # rows removed / table rebuilt
+        rows = cur.execute(
+            "SELECT feedback_id, repo_name, comment, vec, seq FROM sim_vectors "
+            "WHERE seq > ? AND dim = ? ORDER BY seq", (snap.seq, DIM)).fetchall()
+        if not rows:
+            return snap
+        pos, fids = dict(snap.pos), list(snap.fids)
+        repos, comments = list(snap.repos), list(snap.comments)
+        matrix, fresh, seq = snap.matrix, [], snap.seq
+        for fid, repo, comment, vec, seq in rows:
+            v = np.frombuffer(vec, dtype=np.float32)
+            if fid in pos:                            # re-review: overwrite a copy
+                i = pos[fid]                          # (feedback_id is unique per batch)
+                if matrix is snap.matrix:
+                    matrix = matrix.copy()
+                repos[i], comments[i], matrix[i] = repo, comment, v
+            else:
+                pos[fid] = len(fids)
+                fids.append(fid); repos.append(repo); comments.append(comment)
+                fresh.append(v)
+        if fresh:
+            matrix = np.vstack([matrix, np.stack(fresh)])
+        snap = _Snapshot(seq, pos, tuple(fids), np.array(repos, dtype=object),
+                         tuple(comments), matrix)
+        if len(snap.fids) != live:                    # deletes mixed with writes
+            return self._synced(cur, _EMPTY)
+        return snap
+
+_index = _Index()
+
+def similar(cur, files, repo_name: str = None, k: int = TOP_K):
+    """[(score, feedback_id, comment)] best first, at most k."""
+    snap = _index.sync(cur)
+    if not snap.fids:
+        return []
+    scores = snap.matrix @ vectorize(code_text(files))
+    if repo_name is not None:
+        scores = scores + SAME_REPO_BOOST * (snap.repos == repo_name)
+    n = min(k * 3, len(scores))                   # spare room for duplicates
+    top = np.argpartition(-scores, n - 1)[:n]
+    top = top[np.argsort(-scores[top])]
+    out, seen = [], set()
+    for i in top:
+        if scores[i] < MIN_SCORE or len(out) == k:
+            break
+        c = snap.comments[i]
+        if c in seen:
+            continue
+        seen.add(c)
+        out.append((float(scores[i]), snap.fids[i], c))
+    return out
+
+def recent(cur, repo_name: str, k: int = RECENT) -> list:
+    """The repo's k latest reviewed teacher comments, newest first."""
+    return [r[0] for r in cur.execute(
+        "SELECT teacher_comments FROM feedback "
+        "WHERE repo_name = ? AND reviewed = 1 AND COALESCE(teacher_comments, '') <> '' "
+        "ORDER BY reviewed_at DESC LIMIT ?", (repo_name, k))]
+
+def context(cur, files, repo_name: str = None, budget: int = TOKEN_BUDGET) -> str:
+    """Own recent comments, then top-k similar ones, joined for the prompt ("" if none fit)."""
+    own = recent(cur, repo_name) if repo_name is not None else []
+    picked, used = [], 0
+    for comment in own + [c for _, _, c in similar(cur, files, repo_name)]:
+        t = estimate_tokens(comment)
+        if comment in picked or used + t > budget:
+            continue
+        picked.append(comment)
+        used += t
+    return "\n\n".join(picked)
+
+# ─────────────────────────── CLI ────────────────────────────────
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Teacher-comment similarity index.")
+    ap.add_argument("--rebuild", action="store_true", required=True,
+                    help="re-vectorize every reviewed feedback row")
+    ap.parse_args()
+
+    conn = db.connect()
+    conn.executescript(DDL)
+    n = rebuild(conn)
+    conn.commit()
+    conn.close()
+    print(f"✅ {n} reviewed comments indexed ({DIM} dims)")
@@ -1,97 +1,203 @@
 #!/usr/bin/env python3
-import os, sqlite3, markdown
+import os, hashlib
 from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import (Flask, Response, abort, flash, make_response, redirect,
+                   render_template, request, stream_with_context, url_for)
+from markupsafe import escape
 
-DB = os.getenv("AGLLM_DB",
-               os.path.join(os.getenv("HOME"), "agllmdatabase.db"))
+import analytics, autograder, blobstore, db, feedback_stream, metrics, migrations, near_dupes, repo_summary, rendering, search_index, similarity
 
-def q(sql, args=()):
-    with sqlite3.connect(DB) as c:
-        c.row_factory = sqlite3.Row
-        return c.execute(sql, args).fetchall()
+PAGE_SIZE = int(os.getenv("AGLLM_PAGE_SIZE", "10"))
 
-def md(txt):
-    return markdown.markdown(txt, extensions=["fenced_code", "codehilite", "tables"])
+q = db.query                     # per-thread WAL connection, rows are sqlite3.Row
+
+md = rendering.md                # uncached; pages use rendering.*_html
 
 def create_app() -> Flask:
     app = Flask(__name__)
     app.secret_key = "replace-me-in-prod"
 
-    # 1️⃣  home – repo list with red/green badge
+    migrations.migrate(db.get())
+    with db.transaction(immediate=True) as c:
+        repo_summary.ensure_schema(c)
+        rendering.ensure_schema(c)
+        search_index.ensure_schema(c)
+        similarity.ensure_schema(c)
+
+    # Prometheus scrape target (see metrics.py)
+    @app.route("/metrics")
+    def prometheus_metrics():
+        return Response(metrics.prometheus(db.get()),
+                        mimetype="text/plain; version=0.0.4")
+
+    @app.route("/pygments.css")
+    def pygments_css():
+        return app.response_class(rendering.stylesheet(), mimetype="text/css")
+
+    # 1️⃣  home – repo list with red/green badge + closest other repo
     @app.route("/")
     def choose_student():
+        # aggregates maintained on write, see repo_summary.py / near_dupes.py
         repos = q("""
-            WITH repeated AS (
-              SELECT repo_name,
-                     submission_id,
-                     SUM(hit) AS hits
-                FROM (
-                     SELECT f.repo_name,
-                            f.submission_id,
-                            /* hit = 1 if the comment contains the keyword */
-                            CASE
-                              WHEN instr(lower(f.teacher_comments), lower(value)) > 0
-                              THEN 1 ELSE 0
-                            END AS hit
-                       FROM feedback  f
-                  CROSS JOIN
-                       json_each(json_array('memory','leak','edge','case'))
-                     )
-            GROUP BY repo_name, submission_id
-            HAVING hits >= 3             -- same keyword group ≥3 times
-            )
-            SELECT r.repo_name,
-                   COUNT(*)                   AS cnt,
-                   EXISTS ( SELECT 1
-                              FROM repeated bad
-                             WHERE bad.repo_name = r.repo_name
-                         )                   AS red_flag
-              FROM feedback r
-             WHERE r.reviewed = 0
-          GROUP BY r.repo_name
-          ORDER BY r.repo_name;
+            SELECT r.repo_name, r.unreviewed AS cnt, r.red_flag,
+                   d.score AS similarity, d.match_repo
+              FROM repo_summary r
+         LEFT JOIN dupe_repos d ON d.repo_name = r.repo_name
+             WHERE r.unreviewed > 0
+          ORDER BY r.repo_name
         """)
-        return render_template("students.html", students=repos)
+        return render_template("students.html", students=repos,
+                               flag_score=near_dupes.FLAG_SCORE)
 
-    # ---------- the rest of the file is unchanged -----------------
     @app.route("/repo/<repo>")
     def student_detail(repo):
-        rows = q("""
-            SELECT f.*, cf.filename, cf.code, s.code AS legacy_code
-              FROM feedback   f
-              JOIN submissions s  ON s.id = f.submission_id
-         LEFT JOIN code_files cf ON cf.submission_id = s.id
-             WHERE f.reviewed = 0 AND f.repo_name = ?
-          ORDER BY f.generated_at DESC, cf.filename
-        """, (repo,))
+        # keyset pagination: ?before=<generated_at>|<id> of the last card shown
+        cursor = request.args.get("before", "")
+        ts, _, last_id = cursor.rpartition("|")
+        if cursor:
+            rows = q("""
+                SELECT * FROM feedback
+                 WHERE reviewed = 0 AND repo_name = ?
+                   AND (generated_at, id) < (?, ?)
+              ORDER BY generated_at DESC, id DESC
+                 LIMIT ?
+            """, (repo, ts, int(last_id or 0), PAGE_SIZE + 1))
+        else:
+            rows = q("""
+                SELECT * FROM feedback
+                 WHERE reviewed = 0 AND repo_name = ?
+              ORDER BY generated_at DESC, id DESC
+                 LIMIT ?
+            """, (repo, PAGE_SIZE + 1))
 
+        # reads and rendering hold no lock; cache misses are written at the end
+        c, pending = db.get(), []
+        reports = autograder.results_for(c, {r["submission_id"] for r in rows[:PAGE_SIZE]})
         items = []
-        for r in rows:
-            fb = next((x for x in items if x["id"] == r["id"]), None)
-            if not fb:
-                fb = dict(r)
-                fb["feedback_html"] = md(r["feedback_text"])
-                fb["code_files"] = []
-                items.append(fb)
-            if r["filename"]:
-                fb["code_files"].append({"filename": r["filename"], "code": r["code"]})
-
-        for fb in items:
-            if not fb["code_files"] and fb["legacy_code"]:
-                fb["code_files"].append({"filename": "submission.py", "code": fb["legacy_code"]})
-
-        return render_template("review_feedback.html", repo=repo, feedbacks=items)
+        for r in rows[:PAGE_SIZE]:
+            fb = dict(r)
+            # a streaming row is shown as live text; its partial Markdown
+            # would only fill the cache with entries never read again
+            if r["status"] != "streaming":
+                fb["feedback_html"] = rendering.markdown_html(c, r["feedback_text"], pending)
+            fb["autograder"] = reports.get(r["submission_id"])
+            items.append(fb)
+        rendering.store(pending)
+
+        next_cursor = None
+        if len(rows) > PAGE_SIZE:
+            last = items[-1]
+            next_cursor = f"{last['generated_at']}|{last['id']}"
+        return render_template("review_feedback.html", repo=repo, feedbacks=items,
+                               next_cursor=next_cursor, first_page=not cursor)
+
+    # code files of one submission, fetched when a card is expanded
+    @app.route("/submission/<int:sid>/files")
+    def submission_files(sid):
+        sub = db.query_one("SELECT submitted_at, code FROM submissions WHERE id = ?", (sid,))
+        if sub is None:
+            abort(404)
+        keys = q("SELECT filename, COALESCE(blob_hash, '') FROM code_files "
+                 "WHERE submission_id = ? ORDER BY filename", (sid,))
+
+        # submissions never change: ETag = file list + renderer version
+        etag = hashlib.sha256(repr(
+            ([tuple(k) for k in keys], sub["code"] is not None,
+             rendering.RENDER_VERSION)).encode()).hexdigest()
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers={"ETag": f'"{etag}"'})
+
+        # reads and rendering hold no lock; cache misses are written at the end
+        c, pending, files = db.get(), [], []
+        for r in q("""
+                SELECT cf.filename, cf.code, cf.blob_hash, b.data, b.compressed
+                  FROM code_files cf
+             LEFT JOIN blobs b ON b.hash = cf.blob_hash
+                 WHERE cf.submission_id = ?
+              ORDER BY cf.filename""", (sid,)):
+            text = blobstore.file_code(r["code"], r["data"], r["compressed"])
+            files.append({"filename": r["filename"],
+                          "html": rendering.code_html(c, r["filename"], text,
+                                                      r["blob_hash"], pending)})
+        if not files and sub["code"]:
+            files.append({"filename": "submission.py",
+                          "html": rendering.code_html(c, "submission.py", sub["code"],
+                                                      pending=pending)})
+        rendering.store(pending)
+
+        resp = make_response(render_template("_code_files.html", code_files=files))
+        resp.set_etag(etag)
+        try:
+            resp.last_modified = datetime.fromisoformat(sub["submitted_at"].rstrip("Z"))
+        except (TypeError, ValueError):
+            pass
+        resp.cache_control.private = True
+        resp.cache_control.no_cache = True        # revalidate, then 304
+        return resp
+
+    # full-text search over feedback, comments and code (search_index.py)
+    @app.route("/search")
+    def search():
+        text  = request.args.get("q", "").strip()
+        scope = request.args.get("scope", "all")
+        repo  = request.args.get("repo", "").strip() or None
+        page  = max(request.args.get("page", 1, type=int), 1)
+        hits, more, error = [], False, None
+        if text:
+            try:
+                hits, more = search_index.search(
+                    db.get(), text, scope=scope, repo=repo,
+                    limit=PAGE_SIZE, offset=(page - 1) * PAGE_SIZE)
+            except search_index.SearchError as e:
+                error = str(e)
+        for h in hits:
+            h.snippet = search_index.highlight(h.snippet, "<mark>", "</mark>", escape)
+        return render_template("search.html", q=text, scope=scope, repo=repo or "",
+                               scopes=search_index.SCOPES, hits=hits, page=page,
+                               more=more, error=error)
+
+    # per-assignment rollups (analytics.py) – a few dozen rows, any history size
+    @app.route("/dashboard")
+    def dashboard():
+        conn = db.get()
+        choices = analytics.assignments(conn)
+        aid = request.args.get("assignment", type=int)
+        if aid is None and choices:
+            aid = choices[-1][0]
+        data = analytics.dashboard(conn, aid) if aid is not None else None
+        return render_template("dashboard.html", choices=choices, aid=aid, d=data)
+
+    # live text of a generation in progress (Server-Sent Events, feedback_stream.py)
+    @app.route("/feedback/<int:fid>/stream")
+    def feedback_events(fid):
+        if db.query_one("SELECT 1 FROM feedback WHERE id = ?", (fid,)) is None:
+            abort(404)
+        # characters the client already has (reconnect header, else the page's)
+        sent = (request.headers.get("Last-Event-ID", type=int)
+                or request.args.get("sent", 0, type=int))
+        return Response(stream_with_context(feedback_stream.events(fid, sent)),
+                        mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
     @app.post("/review/<int:fid>")
     def mark_reviewed(fid):
         comments = request.form.get("teacher_comments", "")
-        q("""UPDATE feedback
-                SET reviewed = 1,
-                    reviewed_at = ?,
-                    teacher_comments = ?
-              WHERE id = ?""",
-          (datetime.utcnow().isoformat(), comments, fid))
+        with db.transaction(immediate=True) as c:
+            # a row still 'streaming' holds half an answer: not reviewable yet
+            done = c.execute("""UPDATE feedback
+                                   SET reviewed = 1,
+                                       reviewed_at = ?,
+                                       teacher_comments = ?
+                                 WHERE id = ? AND status <> 'streaming'""",
+                             (datetime.utcnow().isoformat(), comments, fid)).rowcount
+            row = c.execute("SELECT repo_name, submission_id FROM feedback WHERE id = ?",
+                            (fid,)).fetchone()
+            if done and row:
+                repo_summary.refresh(c, *row)
+                similarity.add(c, fid)
+        if row and not done:
+            flash("Still generating – review it once it is done")
+            return redirect(request.referrer or url_for("choose_student"))
         flash("Saved ✔")
         return redirect(url_for("choose_student"))
 
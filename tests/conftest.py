@@ -0,0 +1,36 @@
+"""
+Shared fixtures.  Every AGLLM module reads its paths from the environment
+at import time, so a throw-away HOME / $AGLLM_DB is set before the first
+import; `hot_db` then points the modules at a fresh database per test.
+"""
+
+import os, sys, tempfile
+from pathlib import Path
+
+_SCRATCH = tempfile.mkdtemp(prefix="agllm-tests-")
+os.environ.update({
+    "HOME": _SCRATCH,
+    "AGLLM_DB": os.path.join(_SCRATCH, "agllmdatabase.db"),
+    "AGLLM_SPOOL_DIR": os.path.join(_SCRATCH, "spool"),
+})
+# appended, not prepended: the repo's CloudLab profile.py must not shadow
+# the stdlib `profile`
+ROOT = str(Path(__file__).resolve().parent.parent)
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+import pytest
+
+import archive, db, job_queue, similarity
+
+
+@pytest.fixture
+def hot_db(tmp_path, monkeypatch):
+    """Path of an empty database every module (and its archive) now uses."""
+    path = tmp_path / "agllmdatabase.db"
+    monkeypatch.setattr(db, "DB_PATH", str(path))
+    monkeypatch.setattr(archive, "ARCHIVE_DB", str(path.with_suffix(".archive.db")))
+    monkeypatch.setattr(job_queue, "SPOOL_DIR", tmp_path / "spool")
+    similarity._index.clear()               # per-process matrix of the last db
+    yield path
+    db.close()
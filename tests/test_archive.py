@@ -0,0 +1,57 @@
+import pytest
+
+import archive, blobstore, db, search_db
+from bench import cohort
+
+REPO = "hw101-student0000"
+
+
+@pytest.fixture
+def cohort_db(hot_db):
+    conn = db.connect()
+    cohort.generate(conn, repos=3, subs=6, files=3, functions=3)
+    yield conn
+    conn.close()
+
+def test_moves_reviewed_pushes_and_keeps_the_newest(cohort_db):
+    before = {sid: blobstore.submission_files(cohort_db, sid) for (sid,) in cohort_db.execute(
+        "SELECT id FROM submissions WHERE student_repo = ?", (REPO,))}
+
+    stats = archive.run(cohort_db, days=0, keep=0)
+
+    # the last push of every repo is unreviewed (and the newest): it stays hot
+    assert stats["submissions"] == 3 * 5
+    assert cohort_db.execute("SELECT COUNT(*) FROM submissions").fetchone()[0] == 3
+    assert cohort_db.execute(
+        "SELECT COUNT(*) FROM blobs WHERE hash NOT IN "
+        "(SELECT blob_hash FROM code_files WHERE blob_hash IS NOT NULL)").fetchone()[0] == 0
+    assert archive.ids(REPO) == set(before) - {max(before)}
+    for sid in archive.ids(REPO):
+        rec = archive.load(sid)
+        assert [(f["filename"], f["code"]) for f in rec["files"]] == before[sid]
+        assert rec["feedback"][0]["reviewed"] == 1
+
+def test_rerun_after_interrupted_delete_is_idempotent(cohort_db):
+    sid = archive.eligible(cohort_db, days=0, keep=0)[0]
+    with archive.connect(create=True) as arc:       # archived, hot rows not deleted yet
+        arc.execute("INSERT INTO archived_submissions VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                    archive._summary_row(archive._record(cohort_db, [sid])[0], "then"))
+    rows, total = search_db.fetch_page(REPO, limit=100)
+    assert total == 6 and len({r[0] for r in rows}) == 6
+    assert archive.run(cohort_db, days=0, keep=0)["submissions"] == 15
+
+def test_fetch_page_merges_both_tiers(cohort_db):
+    def page(**kw):
+        rows, total = search_db.fetch_page(REPO, **kw)
+        return [tuple(r[:5]) for r in rows], total
+
+    full, total = page(limit=100)
+    first, second = page(limit=4), page(limit=4, offset=4)
+
+    archive.run(cohort_db, days=0, keep=0)
+
+    assert page(limit=100) == (full, total) and total == 6
+    assert page(limit=4) == first
+    assert page(limit=4, offset=4) == second
+    meta, files, feedbacks, _ = search_db.fetch_submission(full[-1][0])
+    assert meta[1] == REPO and files and feedbacks
@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+import job_queue
+
+
+@pytest.fixture
+def queue(hot_db, tmp_path):
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    (logs / "autograder_output.txt").write_text("Points 7/10\n")
+    conn = job_queue.connect()
+    job_queue.ensure_schema(conn)
+    yield conn, logs
+    conn.close()
+
+def status(conn, jid):
+    return conn.execute("SELECT status FROM jobs WHERE id = ?", (jid,)).fetchone()[0]
+
+def test_claim_is_exclusive(queue):
+    conn, logs = queue
+    jid = job_queue.enqueue("repo1", logs)
+
+    job = job_queue.claim(conn, "w1")
+    assert (job["id"], job["attempts"]) == (jid, 0)
+    assert status(conn, jid) == "running"
+    assert job_queue.claim(conn, "w2") is None
+
+def test_newer_push_supersedes_queued_one(queue):
+    conn, logs = queue
+    old = job_queue.enqueue("repo1", logs)
+    other = job_queue.enqueue("repo2", logs)
+    new = job_queue.enqueue("repo1", logs)
+
+    assert status(conn, old) == "superseded"
+    assert job_queue.wait(old, logs) == "superseded"
+    assert [job_queue.claim(conn, "w")["id"] for _ in range(2)] == [other, new]
+
+def test_expired_lease_is_fenced(queue, monkeypatch):
+    conn, logs = queue
+    jid = job_queue.enqueue("repo1", logs)
+    stale = job_queue.claim(conn, "w1")
+
+    monkeypatch.setattr(job_queue, "LEASE_SECS", -1)     # every lease has run out
+    fresh = job_queue.claim(conn, "w2")
+    assert (fresh["id"], fresh["attempts"] + 1) == (jid, 2)
+
+    # the first holder can no longer finish the job, the new one can
+    assert not job_queue._finish(conn, stale, "w1", "status = 'done'", ())
+    assert job_queue._finish(conn, fresh, "w2", "status = 'done'", ())
+    assert status(conn, jid) == "done"
+
+def test_heartbeat_keeps_the_lease(queue, monkeypatch):
+    conn, logs = queue
+    job_queue.enqueue("repo1", logs)
+    job_queue.claim(conn, "w1")
+
+    monkeypatch.setattr(job_queue, "LEASE_SECS", 60)
+    conn.execute("UPDATE jobs SET started_at = ?, heartbeat_at = ?",
+                 (job_queue._now(-3600), job_queue._now()))
+    assert job_queue.claim(conn, "w2") is None
+
+def test_last_attempt_fails_instead_of_requeueing(queue, monkeypatch):
+    conn, logs = queue
+    jid = job_queue.enqueue("repo1", logs)
+    monkeypatch.setattr(job_queue, "MAX_ATTEMPTS", 1)
+    spool = job_queue.claim(conn, "w1")["spool_dir"]
+
+    monkeypatch.setattr(job_queue, "LEASE_SECS", -1)
+    assert job_queue.claim(conn, "w2") is None
+    assert status(conn, jid) == "failed"
+    assert not os.path.exists(spool)
+    assert job_queue.wait(jid, logs) == "failed"
+
+def test_wait_on_unknown_job(queue):
+    _, logs = queue
+    assert job_queue.wait(12345, logs) == "missing"
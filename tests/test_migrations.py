@@ -0,0 +1,98 @@
+import sqlite3
+
+import pytest
+
+import db, migrations
+
+# the schema create_database.py shipped before versioning, with its demo rows
+BASELINE = """
+CREATE TABLE students (student_repo TEXT PRIMARY KEY, additional_data TEXT);
+CREATE TABLE assignments (id INTEGER PRIMARY KEY, description TEXT NOT NULL);
+CREATE TABLE submissions (
+  id INTEGER PRIMARY KEY, student_repo TEXT NOT NULL REFERENCES students(student_repo),
+  assignment_id INTEGER NOT NULL REFERENCES assignments(id), code TEXT,
+  submitted_at TEXT NOT NULL);
+CREATE TABLE code_files (
+  id INTEGER PRIMARY KEY, submission_id INTEGER NOT NULL REFERENCES submissions(id),
+  filename TEXT NOT NULL, code TEXT NOT NULL);
+CREATE TABLE feedback (
+  id INTEGER PRIMARY KEY, submission_id INTEGER NOT NULL REFERENCES submissions(id),
+  repo_name TEXT NOT NULL, feedback_text TEXT NOT NULL, generated_at TEXT NOT NULL,
+  reviewed INTEGER NOT NULL DEFAULT 0, teacher_comments TEXT, reviewed_at TEXT);
+CREATE TABLE autograder_outputs (
+  id INTEGER PRIMARY KEY, submission_id INTEGER NOT NULL REFERENCES submissions(id),
+  output TEXT NOT NULL, generated_at TEXT NOT NULL);
+CREATE INDEX idx_feedback_repo  ON feedback(repo_name, reviewed);
+CREATE INDEX idx_codefiles_sub  ON code_files(submission_id);
+
+INSERT INTO students VALUES ('repo1', '{"name":"Sample"}');
+INSERT INTO assignments VALUES (1, 'Demo');
+INSERT INTO submissions VALUES (1, 'repo1', 1, 'print(123)', '2025-01-01T00:00:00Z');
+INSERT INTO code_files VALUES (1, 1, 'main.py', 'print("Hello")');
+INSERT INTO code_files VALUES (2, 1, 'utils.py', 'def add(a,b): return a+b');
+INSERT INTO feedback VALUES (1, 1, 'repo1', 'Great start – think about edge cases.',
+                             '2025-01-01T00:00:00Z', 1, 'Check empty input', '2025-01-02');
+INSERT INTO autograder_outputs VALUES (1, 1, 'Points 7/10', '2025-01-01T00:00:00Z');
+"""
+
+@pytest.fixture
+def baseline(hot_db):
+    conn = db.connect(str(hot_db))
+    conn.executescript(BASELINE)
+    yield conn
+    conn.close()
+
+def test_upgrades_baseline_in_place(baseline):
+    applied = migrations.migrate(baseline)
+
+    assert applied == [ver for ver, _, _ in migrations.MIGRATIONS]
+    assert migrations.version(baseline) == migrations.LATEST
+    assert migrations.pending_backfills(baseline) == []
+    # rows survive, new columns get their defaults
+    assert baseline.execute(
+        "SELECT feedback_text, status FROM feedback WHERE id = 1").fetchone() == (
+        "Great start – think about edge cases.", "done")
+    assert baseline.execute(
+        "SELECT points, max_points FROM autograder_outputs").fetchone() == (7, 10)
+    # back-fills ran against the migrated rows
+    assert baseline.execute(
+        "SELECT rowid FROM fts_feedback WHERE fts_feedback MATCH 'edge'").fetchall() == [(1,)]
+    assert baseline.execute("SELECT COUNT(*) FROM sim_vectors").fetchone()[0] == 1
+    assert migrations.check_plans(baseline) == {}
+
+def test_migrate_is_a_noop_once_current(baseline):
+    migrations.migrate(baseline)
+    assert migrations.migrate(baseline) == []
+
+def test_stops_at_target(baseline):
+    assert migrations.migrate(baseline, target=3) == [1, 2, 3]
+    assert migrations.version(baseline) == 3
+    assert migrations.migrate(baseline) == list(range(4, migrations.LATEST + 1))
+
+def test_failed_backfill_is_retried(baseline, monkeypatch):
+    backfills = migrations.BACKFILLS
+    name, ver, rebuild = backfills[-1]
+
+    def broken(conn):
+        rebuild(conn)
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(migrations, "BACKFILLS",
+                        backfills[:-1] + [(name, ver, broken)])
+    with pytest.raises(sqlite3.OperationalError):
+        migrations.migrate(baseline)
+    assert migrations.version(baseline) == migrations.LATEST
+    assert [b[0] for b in migrations.pending_backfills(baseline)] == [name]
+
+    monkeypatch.setattr(migrations, "BACKFILLS", backfills)
+    assert migrations.migrate(baseline) == []
+    assert migrations.pending_backfills(baseline) == []
+
+def test_backfill_version_bump_reruns_it(baseline, monkeypatch):
+    migrations.migrate(baseline)
+    name, ver, rebuild = migrations.BACKFILLS[0]
+    monkeypatch.setattr(migrations, "BACKFILLS",
+                        [(name, ver + 1, rebuild)] + migrations.BACKFILLS[1:])
+    assert migrations.backfill(baseline) == [name]
+    assert baseline.execute("SELECT version FROM schema_backfills WHERE name = ?",
+                            (name,)).fetchone() == (ver + 1,)
@@ -0,0 +1,54 @@
+import prompt_packer
+from prompt_packer import estimate_tokens, pack, rank
+
+def source(name: str, lines: int) -> tuple:
+    body = "".join(f"def f{i}(x):\n    return x * {i}  # padding padding padding\n"
+                   for i in range(lines))
+    return name, body
+
+def test_rank_tiers():
+    files = [("package-lock.json", "{}"), ("util.py", ""), ("src/data.csv", ""),
+             ("node_modules/x/index.js", ""), ("solver.py", ""), ("helpers.py", "")]
+    ranked = [n for n, _ in rank(files, autograder_out="FAILED tests/test_solver.py::"
+                                 "test_big - solver.py:12 AssertionError",
+                                 readme="Put your helpers in helpers.py.")]
+    assert ranked == ["solver.py", "helpers.py", "util.py",
+                      "package-lock.json", "src/data.csv", "node_modules/x/index.js"]
+
+def test_failing_output_only_counts_when_failing():
+    files = [("a.py", ""), ("b.py", "")]
+    assert [n for n, _ in rank(files, autograder_out="b.py", failing=False)] == ["a.py", "b.py"]
+    assert [n for n, _ in rank(files, autograder_out="b.py", failing=True)] == ["b.py", "a.py"]
+
+def test_everything_fits_untouched():
+    files = [source("a.py", 3), source("b.py", 3)]
+    code, omitted = pack(files, budget=10_000)
+    assert omitted == []
+    assert all(text in code for _, text in files)
+
+def test_overflow_is_summarized_then_dropped():
+    budget = prompt_packer.MIN_CODE_TOKENS
+    files = [source("main.py", 60), source("big.py", 200), ("notes.txt", "x" * 20_000)]
+    code, omitted = pack(files, budget=budget)
+
+    assert "File: main.py\n" in code                          # whole, ranked first
+    assert "File: big.py  (summarized – signatures only)" in code
+    assert [(o.filename, o.action) for o in omitted] == [("big.py", "summarized"),
+                                                         ("notes.txt", "dropped")]
+    assert omitted[1].est_tokens == estimate_tokens("File: notes.txt\n" + "x" * 20_000 + "\n\n")
+    # the code section stays inside the budget (the omission note aside)
+    assert estimate_tokens(code.split("(Omitted to fit")[0]) <= budget
+
+def test_other_sections_shrink_the_code_budget():
+    files = [source("a.py", 120)]           # more than MIN_CODE_TOKENS
+    need = estimate_tokens(f"File: a.py\n{files[0][1]}\n\n")
+    assert pack(files, budget=need + 2000)[1] == []
+    _, omitted = pack(files, budget=need + 2000, other_sections="y" * 4 * 2000 + "y")
+    assert [o.action for o in omitted] == ["summarized"]
+
+def test_budget_leaves_room_for_the_answer():
+    assert prompt_packer.LLM_OPTIONS == {"num_ctx": prompt_packer.NUM_CTX}
+    assert (prompt_packer.PROMPT_TOKENS + prompt_packer.OUTPUT_TOKENS
+            + prompt_packer.SYSTEM_TOKENS <= prompt_packer.NUM_CTX)
+    assert prompt_packer._modelfile_int({"num_predict": ["-1"]}, "num_predict", 1024) == 1024
+    assert prompt_packer._modelfile_int({"num_ctx": ["16384"]}, "num_ctx", 8192) == 16384
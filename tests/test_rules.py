@@ -0,0 +1,94 @@
+import textwrap
+
+import pytest
+
+import rules
+
+def ruleset(tmp_path, body: str) -> rules.RuleSet:
+    (tmp_path / "agllm.ini").write_text(textwrap.dedent(body), encoding="utf-8")
+    return rules.load_rules(tmp_path)
+
+def found(findings) -> list:
+    return [(f.rule, f.subject, f.filename, f.line) for f in findings]
+
+def test_load_rules(tmp_path):
+    rs = ruleset(tmp_path, """
+        [rules]
+        banned_imports     = numpy, collections.Counter
+        required_functions = merge_sort,
+                             main
+        forbidden          = While, recursion, eval
+        short_circuit      = no
+        perfect_message    = Full marks{score}! Checked: {checks}.
+    """)
+    assert rs.banned_imports == ["numpy", "collections.Counter"]
+    assert rs.required_functions == ["merge_sort", "main"]
+    assert rs.forbidden == ["while", "recursion", "eval"]
+    assert not rs.short_circuit
+    assert rs.perfect_message == "Full marks{score}! Checked: {checks}."
+
+def test_no_rules_means_no_checks_and_no_shortcut(tmp_path):
+    rs = ruleset(tmp_path, "[other]\nx = 1\n")
+    assert rs.empty and not rs.short_circuit
+    assert rules.check([("a.py", "import numpy\n")], rs) == []
+    assert rules.load_rules(None).empty
+
+def test_python_is_checked_on_the_ast(tmp_path):
+    rs = ruleset(tmp_path, """
+        [rules]
+        banned_imports     = numpy, collections.Counter
+        required_functions = merge_sort, main
+        forbidden          = while, recursion, eval
+    """)
+    code = textwrap.dedent('''\
+        import numpy as np
+        from collections import Counter
+        # while eval numpy: only in a comment
+        def merge_sort(xs):
+            """while recursion"""
+            return merge_sort(xs[1:]) if xs else []
+        while False:
+            eval("1")
+    ''')
+    assert found(rules.check([("sort.py", code)], rs)) == [
+        ("banned_import", "numpy", "sort.py", 1),
+        ("banned_import", "collections.Counter", "sort.py", 2),
+        ("forbidden", "recursion", "sort.py", 4),
+        ("forbidden", "while", "sort.py", 7),
+        ("forbidden", "eval", "sort.py", 8),
+        ("missing_function", "main", None, None),
+    ]
+
+def test_other_languages_are_token_scanned(tmp_path):
+    rs = ruleset(tmp_path, """
+        [rules]
+        banned_imports     = stdlib.h
+        required_functions = main
+        forbidden          = goto, recursion
+    """)
+    code = textwrap.dedent('''\
+        #include <stdio.h>
+        #include <stdlib.h>
+        /* goto is banned */
+        int main(void) {
+            puts("goto");
+            goto done;
+        done: return 0;
+        }
+    ''')
+    assert found(rules.check([("main.c", code), ("README.md", "goto")], rs)) == [
+        ("banned_import", "stdlib.h", "main.c", 2),
+        ("forbidden", "goto", "main.c", 6),
+    ]
+
+def test_unparsable_python_falls_back_to_tokens(tmp_path):
+    rs = ruleset(tmp_path, "[rules]\nforbidden = eval\n")
+    assert found(rules.check([("bad.py", "def f(:\n    eval(x)\n")], rs)) == [
+        ("forbidden", "eval", "bad.py", 2)]
+
+@pytest.mark.parametrize("flag, env, expected", [
+    ("yes", True, True), ("off", True, False), ("yes", False, False)])
+def test_short_circuit(tmp_path, monkeypatch, flag, env, expected):
+    monkeypatch.setattr(rules, "SHORT_CIRCUIT", env)
+    rs = ruleset(tmp_path, f"[rules]\nforbidden = eval\nshort_circuit = {flag}\n")
+    assert rs.short_circuit is expected
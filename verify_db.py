@@ -1,14 +1,19 @@
-import sqlite3
-import os
+import sys
 
-db_path = os.path.join(os.getenv("HOME"), "agllmdatabase.db")
-conn = sqlite3.connect(db_path)
+import db, migrations
+
+conn = db.connect()
 cursor = conn.cursor()
 
 cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
 tables = cursor.fetchall()
 print("Tables in the database:", tables)
+print(f"Schema version: v{migrations.version(conn)} (latest v{migrations.LATEST})")
 
-conn.close()
-
+# every hot query must be answered from an index (see migrations.PLAN_CHECKS)
+bad = migrations.check_plans(conn)
+for name, scanned in bad.items():
+    print(f"❌ {name}: full table scan of {', '.join(scanned)}")
 
+conn.close()
+sys.exit(1 if bad else 0)